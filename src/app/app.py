@@ -1,12 +1,46 @@
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.app.open_subsonic_api import open_subsonic_router
 from src.app.frontend_endpoints import frontend_router
 from src.app.auth import auth_router
+from src.app.health import health_router
+from src.app.db_metrics import metrics_router, collect_request_stats, instrument
+from src.app.database import engine, init_db
+from src.app.service_layer import create_default_user
+from src.app import db_loading
+from src.app.watcher import WATCH_LIBRARY, LibraryWatcher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    init_db()
+    create_default_user()
+
+    watcher = LibraryWatcher() if WATCH_LIBRARY else None
+    if watcher is not None:
+        watcher.start()
 
+    # Сервер начинает отвечать сразу, а библиотека сверяется с диском в фоне
+    scan = asyncio.get_running_loop().run_in_executor(
+        None, partial(db_loading.scan_and_load, incremental=True)
+    )
 
-app = FastAPI()
+    yield
+
+    db_loading.scan_stop.set()
+    if watcher is not None:
+        watcher.stop()
+    await scan
+    db_loading.scan_stop.clear()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -23,3 +57,9 @@ app.add_middleware(
 app.include_router(open_subsonic_router)
 app.include_router(frontend_router)
 app.include_router(auth_router)
+app.include_router(health_router)
+app.include_router(metrics_router)
+
+# Число и время запросов к БД для каждого HTTP-запроса
+instrument(engine)
+app.middleware("http")(collect_request_stats)
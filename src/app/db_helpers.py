@@ -1,9 +1,194 @@
+import math
+import os
+import random
 from datetime import datetime
-from sqlalchemy import asc, desc, func
-from sqlmodel import Session, select
-from typing import List, Optional, Sequence
+from sqlalchemy import Select, and_, asc, delete, desc, exists, func, literal, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import object_session, selectinload
+from sqlalchemy.orm.attributes import instance_state
+from sqlmodel import Session, SQLModel, col, select
+from typing import Any, List, Optional, Sequence
 
 from . import database as db
+from . import search_index
+
+# Связи, которые читают функции fill_* из service_layer. Для списка строк они
+# загружаются несколькими запросами selectinload на весь список, а не
+# отдельным ленивым запросом на каждую строку
+TRACK_RELATIONS = ["album", "artists", "genres", "track_favourites"]
+TRACK_OPTIONS = [
+    selectinload(db.Track.album),  # type: ignore[arg-type]
+    selectinload(db.Track.artists),  # type: ignore[arg-type]
+    selectinload(db.Track.genres),  # type: ignore[arg-type]
+    selectinload(db.Track.track_favourites),  # type: ignore[arg-type]
+]
+# Длительность и жанры альбома хранятся в нём самом, треки нужны только
+# для ответов со списком песен
+ALBUM_RELATIONS = ["artists", "genres"]
+ALBUM_OPTIONS = [
+    selectinload(db.Album.artists),  # type: ignore[arg-type]
+    selectinload(db.Album.genres),  # type: ignore[arg-type]
+]
+ALBUM_TRACKS_OPTIONS = [
+    selectinload(db.Album.tracks).options(*TRACK_OPTIONS),  # type: ignore[arg-type]
+]
+ARTIST_RELATIONS = ["albums"]
+ARTIST_OPTIONS = [
+    selectinload(db.Artist.albums).options(*ALBUM_OPTIONS),  # type: ignore[arg-type]
+]
+PLAYLIST_RELATIONS = ["user", "playlist_tracks"]
+PLAYLIST_OPTIONS = [
+    selectinload(db.Playlist.user),  # type: ignore[arg-type]
+    selectinload(db.Playlist.playlist_tracks)  # type: ignore[arg-type]
+    .selectinload(db.PlaylistTrack.track)  # type: ignore[arg-type]
+    .options(*TRACK_OPTIONS),
+]
+
+
+def load_relations(
+    rows: Sequence[SQLModel], relations: Sequence[str], options: Sequence[Any]
+) -> None:
+    rows = [
+        row
+        for row in rows
+        if object_session(row) is not None
+        and any(relation in instance_state(row).unloaded for relation in relations)
+    ]
+    if len(rows) == 0:
+        return
+    session = object_session(rows[0])
+    model: Any = type(rows[0])
+    if session is not None:
+        session.execute(
+            select(model)
+            .where(col(model.id).in_([row.id for row in rows]))  # type: ignore[attr-defined]
+            .options(*options)
+        ).all()
+
+
+def load_track_relations(tracks: Sequence[db.Track]) -> None:
+    load_relations(tracks, TRACK_RELATIONS, TRACK_OPTIONS)
+
+
+def load_album_relations(albums: Sequence[db.Album], with_songs: bool = False) -> None:
+    if with_songs:
+        load_relations(
+            albums, ALBUM_RELATIONS + ["tracks"], ALBUM_OPTIONS + ALBUM_TRACKS_OPTIONS
+        )
+    else:
+        load_relations(albums, ALBUM_RELATIONS, ALBUM_OPTIONS)
+
+
+def load_artist_relations(
+    artists: Sequence[db.Artist], with_songs: bool = False
+) -> None:
+    load_relations(artists, ARTIST_RELATIONS, ARTIST_OPTIONS)
+    # Треки альбомов всех исполнителей загружаются вместе, а не по исполнителю
+    if with_songs:
+        load_album_relations(
+            [album for artist in artists for album in artist.albums], with_songs
+        )
+
+
+def load_playlist_relations(playlists: Sequence[db.Playlist]) -> None:
+    load_relations(playlists, PLAYLIST_RELATIONS, PLAYLIST_OPTIONS)
+
+
+# Порядок списков альбомов: столбец и признак сортировки по убыванию. Последний
+# столбец (id) делает порядок однозначным, поэтому следующую страницу можно
+# выбрать по ключу последней строки, а не через OFFSET
+KeyOrder = Sequence[tuple[Any, bool]]
+
+ALBUMS_BY_NAME: KeyOrder = [(db.Album.name, False), (db.Album.id, False)]
+ALBUMS_BY_YEAR: KeyOrder = [
+    (db.Album.year, False),
+    (db.Album.name, False),
+    (db.Album.id, False),
+]
+ALBUMS_BY_YEAR_REVERSED: KeyOrder = [
+    (db.Album.year, True),
+    (db.Album.name, False),
+    (db.Album.id, False),
+]
+ALBUMS_BY_ARTIST: KeyOrder = [
+    (db.Album.artist_name, False),
+    (db.Album.name, False),
+    (db.Album.id, False),
+]
+ALBUMS_BY_FREQUENCY: KeyOrder = [
+    (db.Album.play_count, True),
+    (db.Album.name, False),
+    (db.Album.id, False),
+]
+
+
+def order_by_key(order: KeyOrder) -> list[Any]:
+    return [desc(column) if descending else asc(column) for column, descending in order]
+
+
+def after_key(order: KeyOrder, key: Sequence[Any]) -> Any:
+    # (a, b) > (x, y) записывается как a >= x AND (a != x OR b > y), чтобы
+    # первый столбец ограничивал диапазон в индексе
+    (column, descending), value = order[0], key[0]
+    if len(order) == 1:
+        return column < value if descending else column > value
+    return and_(
+        column <= value if descending else column >= value,
+        or_(column != value, after_key(order[1:], key[1:])),
+    )
+
+
+def get_key(row: SQLModel, order: KeyOrder) -> list[Any]:
+    return [getattr(row, column.key) for column, _ in order]
+
+
+# Случайная выборка без чтения всей таблицы: из диапазона id выбираются
+# случайные числа, и берутся строки, id которых с ними совпал и которые
+# подходят под фильтр. Каждая подходящая строка попадает с одинаковой
+# вероятностью, а поиск идёт по первичному ключу, поэтому стоимость растёт
+# с size и редкостью фильтра, а не с размером таблицы
+SAMPLE_ROUNDS = 4
+# Случайных id в одном запросе, в пределах ограничения на число параметров
+SAMPLE_MAX_IDS = 1000
+
+
+def sample_ids(session: Session, query: Select[Any], id: Any, size: int) -> list[int]:
+    low, high = session.execute(
+        select(
+            select(func.min(id)).scalar_subquery(),
+            select(func.max(id)).scalar_subquery(),
+        )
+    ).one()
+    if low is None or size <= 0:
+        return []
+
+    ids: dict[int, None] = {}
+    tried = 0
+    found = 0
+    for _ in range(SAMPLE_ROUNDS):
+        # Доля совпавших id из прошлых раундов задаёт число id в следующем
+        hit_rate = found / tried if tried > 0 else 1.0
+        count = min(
+            SAMPLE_MAX_IDS,
+            high - low + 1,
+            math.ceil(2 * (size - len(ids)) / max(hit_rate, 1 / SAMPLE_MAX_IDS)),
+        )
+        candidates = random.sample(range(low, high + 1), count)
+        hits = session.execute(query.where(id.in_(candidates))).scalars().all()
+        tried = tried + count
+        found = found + len(hits)
+        ids.update(dict.fromkeys(hits))
+        if len(ids) >= size:
+            return random.sample(list(ids), size)
+
+    # Подходящих строк мало относительно диапазона id: оставшиеся выбираются
+    # из всех подходящих строк
+    rest = session.execute(
+        query.where(id.not_in(ids)).order_by(func.random()).limit(size - len(ids))
+    ).scalars()
+    result = list(ids) + list(rest)
+    random.shuffle(result)
+    return result
 
 
 class ArtistDBHelper:
@@ -13,61 +198,119 @@ class ArtistDBHelper:
     def get_all_artists(self, filter_name: str | None = None) -> Sequence[db.Artist]:
         query = select(db.Artist)
         if filter_name:
-            query = query.where(
-                func.lower(db.Artist.name).like(f"%{filter_name.lower()}%")
-            )
+            query = query.where(col(db.Artist.name).ilike(f"%{filter_name}%"))
         return self.session.exec(query).all()
 
     def get_artists(
         self, size: int, offset: int, filter_name: str | None = None
     ) -> Sequence[db.Artist]:
-        query = select(db.Artist)
+        # Без явного порядка PostgreSQL не гарантирует одинаковые страницы
+        query = select(db.Artist).order_by(col(db.Artist.id))
         if filter_name:
-            query = query.where(
-                func.lower(db.Artist.name).like(f"%{filter_name.lower()}%")
-            )
+            query = query.where(col(db.Artist.name).ilike(f"%{filter_name}%"))
         query = query.limit(size).offset(offset)
         return self.session.exec(query).all()
 
+    def search_artists(self, query: str, size: int, offset: int) -> Sequence[db.Artist]:
+        index = search_index.artists_search
+        return self.session.exec(
+            select(db.Artist)
+            .join(index, index.c.rowid == db.Artist.id)
+            .where(search_index.match(index, query))
+            .order_by(index.c.rank, db.Artist.name)
+            .limit(size)
+            .offset(offset)
+        ).all()
+
     def get_artist_by_id(self, id: int) -> db.Artist | None:
         return self.session.exec(
             select(db.Artist).where(db.Artist.id == id)
         ).one_or_none()
 
+    def get_artist_index(self) -> Sequence[tuple[int, str, str, int]]:
+        return self.session.exec(
+            select(
+                db.Artist.id,
+                db.Artist.name,
+                db.ArtistIndexEntry.letter,
+                db.ArtistIndexEntry.album_count,
+            )
+            .join(
+                db.ArtistIndexEntry,
+                db.ArtistIndexEntry.artist_id == db.Artist.id,  # type: ignore[arg-type]
+            )
+            .order_by(
+                db.ArtistIndexEntry.letter,
+                db.ArtistIndexEntry.sort_name,
+                col(db.ArtistIndexEntry.artist_id),
+            )
+        ).all()
+
+    def get_library_last_modified(self) -> int:
+        return (
+            self.session.exec(select(db.LibraryState.last_modified)).one_or_none() or 0
+        )
+
 
 class AlbumDBHelper:
     def __init__(self, session: Session):
         self.session = session
         self.track_db_helper = TrackDBHelper(session)
 
+    def get_random_albums(self, size: int) -> List[db.Album]:
+        ids = sample_ids(self.session, select(db.Album.id), col(db.Album.id), size)
+        albums = self.session.exec(
+            select(db.Album).where(col(db.Album.id).in_(ids))
+        ).all()
+        by_id = {album.id: album for album in albums}
+        return [by_id[id] for id in ids]
+
     def get_all_albums(self, filter_name: str | None = None) -> Sequence[db.Album]:
         query = select(db.Album)
         if filter_name:
-            query = query.where(
-                func.lower(db.Album.name).like(f"%{filter_name.lower()}%")
-            )
+            query = query.where(col(db.Album.name).ilike(f"%{filter_name}%"))
         return self.session.exec(query).all()
 
     def get_albums(
         self, size: int, offset: int, filter_name: str | None = None
     ) -> Sequence[db.Album]:
-        query = select(db.Album)
+        query = select(db.Album).order_by(col(db.Album.id))
         if filter_name:
-            query = query.where(
-                func.lower(db.Album.name).like(f"%{filter_name.lower()}%")
-            )
+            query = query.where(col(db.Album.name).ilike(f"%{filter_name}%"))
         query = query.limit(size).offset(offset)
         return self.session.exec(query).all()
 
+    def search_albums(self, query: str, size: int, offset: int) -> Sequence[db.Album]:
+        index = search_index.albums_search
+        return self.session.exec(
+            select(db.Album)
+            .join(index, index.c.rowid == db.Album.id)
+            .where(search_index.match(index, query))
+            .order_by(index.c.rank, db.Album.name)
+            .limit(size)
+            .offset(offset)
+        ).all()
+
     def get_album_by_id(self, id: int) -> db.Album | None:
         return self.session.exec(
             select(db.Album).where(db.Album.id == id)
         ).one_or_none()
 
-    def get_albums_by_name(self, size: int, offset: int) -> Sequence[db.Album]:
-        return self.session.exec(
-            select(db.Album).order_by(db.Album.name).limit(size).offset(offset)
-        ).all()
+    def get_albums_by_name(
+        self, size: int, offset: int, after: Sequence[Any] | None = None
+    ) -> Sequence[db.Album]:
+        query = select(db.Album).order_by(*order_by_key(ALBUMS_BY_NAME))
+        if after is not None:
+            query = query.where(after_key(ALBUMS_BY_NAME, after))
+        return self.session.exec(query.limit(size).offset(offset)).all()
+
+    def get_albums_by_artist(
+        self, size: int, offset: int, after: Sequence[Any] | None = None
+    ) -> Sequence[db.Album]:
+        query = select(db.Album).order_by(*order_by_key(ALBUMS_BY_ARTIST))
+        if after is not None:
+            query = query.where(after_key(ALBUMS_BY_ARTIST, after))
+        return self.session.exec(query.limit(size).offset(offset)).all()
 
     def get_first_track(self, albumId: int) -> db.Track | None:
         return self.session.exec(
@@ -102,68 +345,120 @@ class AlbumDBHelper:
         size: int,
         offset: int,
         reversed_order: bool = False,
+        after: Sequence[Any] | None = None,
     ) -> Sequence[db.Album]:
-        order = asc if not reversed_order else desc
-        return self.session.exec(
+        order = ALBUMS_BY_YEAR if not reversed_order else ALBUMS_BY_YEAR_REVERSED
+        query = (
             select(db.Album)
             .where(db.Album.year >= min_year)  # type: ignore
             .where(db.Album.year <= max_year)  # type: ignore
-            .order_by(order(db.Album.year))  # type: ignore
-            .order_by(db.Album.name)
-            .limit(size)
-            .offset(offset)
-        ).all()
+            .order_by(*order_by_key(order))
+        )
+        if after is not None:
+            query = query.where(after_key(order, after))
+        return self.session.exec(query.limit(size).offset(offset)).all()
 
     def get_albums_by_genre(
-        self, genre: str, size: int, offset: int
+        self,
+        genre: str,
+        size: int,
+        offset: int,
+        after: Sequence[Any] | None = None,
     ) -> Sequence[db.Album]:
-        return self.session.exec(
+        query = (
             select(db.Album)
             .distinct()
-            .join(db.Track, db.Track.album_id == db.Album.id)  # type: ignore
-            .join(db.GenreTrack, db.GenreTrack.track_id == db.Track.id)  # type: ignore
-            .join(db.Genre, db.Genre.id == db.GenreTrack.genre_id)  # type: ignore
-            .where(func.lower(db.Genre.name).like(genre))
-            .order_by(db.Album.name)
-            .limit(size)
-            .offset(offset)
-        ).all()
+            .join(db.GenreAlbum, db.GenreAlbum.album_id == db.Album.id)  # type: ignore
+            .join(db.Genre, db.Genre.id == db.GenreAlbum.genre_id)  # type: ignore
+            .where(col(db.Genre.name).ilike(genre))
+            .order_by(*order_by_key(ALBUMS_BY_NAME))
+        )
+        if after is not None:
+            query = query.where(after_key(ALBUMS_BY_NAME, after))
+        return self.session.exec(query.limit(size).offset(offset)).all()
 
     def get_sorted_albums_by_frequency(
-        self, size: int, offset: int
+        self, size: int, offset: int, after: Sequence[Any] | None = None
     ) -> Sequence[db.Album]:
-        return self.session.exec(
-            select(db.Album)
-            .order_by(desc(db.Album.play_count))  # type: ignore
-            .order_by(db.Album.name)
-            .limit(size)
-            .offset(offset)
-        ).all()
+        query = select(db.Album).order_by(*order_by_key(ALBUMS_BY_FREQUENCY))
+        if after is not None:
+            query = query.where(after_key(ALBUMS_BY_FREQUENCY, after))
+        return self.session.exec(query.limit(size).offset(offset)).all()
 
 
 class TrackDBHelper:
     def __init__(self, session: Session):
         self.session = session
 
+    def get_random_tracks(
+        self,
+        size: int,
+        genre: str | None = None,
+        from_year: str | None = None,
+        to_year: str | None = None,
+    ) -> List[db.Track]:
+        query = select(db.Track.id)
+        if genre is not None:
+            genre_ids = select(db.Genre.id).where(db.Genre.name == genre)
+            query = query.where(
+                exists().where(
+                    col(db.GenreTrack.track_id) == db.Track.id,
+                    col(db.GenreTrack.genre_id).in_(genre_ids),
+                )
+            )
+        if from_year is not None:
+            query = query.where(col(db.Track.year) >= from_year)
+        if to_year is not None:
+            query = query.where(col(db.Track.year) <= to_year)
+
+        ids = sample_ids(self.session, query, col(db.Track.id), size)
+        tracks = self.session.exec(
+            select(db.Track).where(col(db.Track.id).in_(ids))
+        ).all()
+        by_id = {track.id: track for track in tracks}
+        return [by_id[id] for id in ids]
+
     def get_all_tracks(self, filter_title: str | None = None) -> Sequence[db.Track]:
         query = select(db.Track)
         if filter_title:
-            query = query.where(
-                func.lower(db.Track.title).like(f"%{filter_title.lower()}%")
+            query = query.where(col(db.Track.title).ilike(f"%{filter_title}%"))
+        return self.session.exec(query).all()
+
+    # Треки из самого каталога, без его подкаталогов
+    def get_directory_tracks(self, directory_path: str) -> Sequence[db.Track]:
+        prefix = os.path.join(directory_path, "")
+        query = (
+            select(db.Track)
+            .where(
+                col(db.Track.file_path).startswith(prefix, autoescape=True),
+                ~func.substr(col(db.Track.file_path), len(prefix) + 1).contains(
+                    os.sep, autoescape=True
+                ),
             )
+            .order_by(col(db.Track.id))
+        )
         return self.session.exec(query).all()
 
     def get_tracks(
         self, size: int, offset: int, filter_title: str | None = None
     ) -> Sequence[db.Track]:
-        query = select(db.Track)
+        query = select(db.Track).order_by(col(db.Track.id))
         if filter_title:
-            query = query.where(
-                func.lower(db.Track.title).like(f"%{filter_title.lower()}%")
-            )
+            query = query.where(col(db.Track.title).ilike(f"%{filter_title}%"))
         query = query.limit(size).offset(offset)
         return self.session.exec(query).all()
 
+    def search_tracks(self, query: str, size: int, offset: int) -> Sequence[db.Track]:
+        index = search_index.tracks_search
+        return self.session.exec(
+            select(db.Track)
+            .join(index, index.c.rowid == db.Track.id)
+            .where(search_index.match(index, query))
+            .order_by(index.c.rank, db.Track.title)
+            .limit(size)
+            .offset(offset)
+        ).all()
+
     def get_track_by_id(self, id: int) -> db.Track | None:
         return self.session.exec(
             select(db.Track).where(db.Track.id == id)
@@ -199,6 +494,7 @@ class TrackDBHelper:
             .join(db.Genre)
             .where(db.GenreTrack.genre_id == db.Genre.id)
             .where(db.Genre.name == genre_name)
+            .order_by(col(db.Track.id))
         )
         if size:
             query = query.limit(size)
@@ -214,111 +510,107 @@ class GenresDBHelper:
     def get_all_genres(self) -> Sequence[db.Genre]:
         return self.session.exec(select(db.Genre)).all()
 
+    def get_genre_stats(self) -> Sequence[tuple[str, int, int]]:
+        # Имя жанра, число треков и число альбомов одним запросом: счётчики
+        # берутся по индексам таблиц связи, сами треки не читаются
+        song_count = (
+            select(func.count())
+            .where(db.GenreTrack.genre_id == db.Genre.id)
+            .scalar_subquery()
+        )
+        album_count = (
+            select(func.count())
+            .where(db.GenreAlbum.genre_id == db.Genre.id)
+            .scalar_subquery()
+        )
+        return self.session.exec(
+            select(db.Genre.name, song_count, album_count).order_by(db.Genre.name)
+        ).all()
+
 
 class FavouriteDBHelper:
     def __init__(self, session: Session):
         self.session = session
 
-    def star_track(self, id: int, user_id: int) -> None:
-        track = TrackDBHelper(self.session).get_track_by_id(id)
-
-        if track:
-            if (id, user_id) in [
-                (t.track_id, t.user_id) for t in track.track_favourites
-            ]:
-                return
-            self.session.add(
-                db.FavouriteTrack(
-                    user_id=user_id, track_id=id, added_at=datetime.today()
-                )
-            )
-            self.session.commit()
-
-    def star_album(self, id: int, user_id: int) -> None:
-        album = AlbumDBHelper(self.session).get_album_by_id(id)
-        if album:
-            if (id, user_id) in [
-                (a.album_id, a.user_id) for a in album.album_favourites
-            ]:
-                return
-            self.session.add(
-                db.FavouriteAlbum(
-                    user_id=user_id, album_id=id, added_at=datetime.today()
-                )
-            )
-            self.session.commit()
-
-    def star_artist(self, id: int, user_id: int) -> None:
-        artist = ArtistDBHelper(self.session).get_artist_by_id(id)
-        if artist:
-            if (id, user_id) in [
-                (a.artist_id, a.user_id) for a in artist.artist_favourites
-            ]:
-                return
-            self.session.add(
-                db.FavouriteArtist(
-                    user_id=user_id, artist_id=id, added_at=datetime.today()
+    def favourite_tables(
+        self,
+        track_ids: Sequence[int],
+        album_ids: Sequence[int],
+        artist_ids: Sequence[int],
+        playlist_ids: Sequence[int],
+    ) -> list[tuple[Any, Any, Any, Sequence[int]]]:
+        # Таблица избранного, её колонка, id отмечаемого объекта и список id
+        return [
+            (db.FavouriteTrack, db.FavouriteTrack.track_id, db.Track.id, track_ids),
+            (db.FavouriteAlbum, db.FavouriteAlbum.album_id, db.Album.id, album_ids),
+            (
+                db.FavouriteArtist,
+                db.FavouriteArtist.artist_id,
+                db.Artist.id,
+                artist_ids,
+            ),
+            (
+                db.FavouritePlaylist,
+                db.FavouritePlaylist.playlist_id,
+                db.Playlist.id,
+                playlist_ids,
+            ),
+        ]
+
+    def star(
+        self,
+        user_id: int,
+        track_ids: Sequence[int],
+        album_ids: Sequence[int],
+        artist_ids: Sequence[int],
+        playlist_ids: Sequence[int],
+    ) -> None:
+        # Один INSERT ... SELECT на тип: несуществующие id отбрасывает выборка
+        # из таблицы объектов, уже отмеченные — ON CONFLICT DO NOTHING
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            insert = postgresql.insert
+        elif dialect == "sqlite":
+            insert = sqlite.insert  # type: ignore[assignment]
+        else:
+            raise NotImplementedError(f"star is not supported for {dialect}")
+        added_at = str(datetime.today())
+        for table, column, object_id, ids in self.favourite_tables(
+            track_ids, album_ids, artist_ids, playlist_ids
+        ):
+            if len(ids) == 0:
+                continue
+            self.session.execute(
+                insert(table)
+                .from_select(
+                    ["user_id", column.key, "added_at"],
+                    select(literal(user_id), object_id, literal(added_at)).where(
+                        col(object_id).in_(set(ids))
+                    ),
                 )
+                .on_conflict_do_nothing()
             )
-            self.session.commit()
+        self.session.commit()
 
-    def star_playlist(self, id: int, user_id: int) -> None:
-        playlist = PlaylistDBHelper(self.session).get_playlist(id)
-        if playlist:
-            if (id, user_id) in [
-                (a.playlist_id, a.user_id) for a in playlist.playlist_favourites
-            ]:
-                return
-            self.session.add(
-                db.FavouritePlaylist(
-                    user_id=user_id, playlist_id=id, added_at=datetime.today()
+    def unstar(
+        self,
+        user_id: int,
+        track_ids: Sequence[int],
+        album_ids: Sequence[int],
+        artist_ids: Sequence[int],
+        playlist_ids: Sequence[int],
+    ) -> None:
+        for table, column, _, ids in self.favourite_tables(
+            track_ids, album_ids, artist_ids, playlist_ids
+        ):
+            if len(ids) == 0:
+                continue
+            self.session.execute(
+                delete(table).where(
+                    col(table.user_id) == user_id, col(column).in_(set(ids))
                 )
             )
-            self.session.commit()
-
-    def unstar_track(self, id: int, user_id: int) -> None:
-        fav_track = self.session.exec(
-            select(db.FavouriteTrack).where(
-                (db.FavouriteTrack.track_id == id)
-                & (db.FavouriteTrack.user_id == user_id)
-            )
-        ).one_or_none()
-        if fav_track:
-            self.session.delete(fav_track)
-            self.session.commit()
-
-    def unstar_album(self, id: int, user_id: int) -> None:
-        fav_album = self.session.exec(
-            select(db.FavouriteAlbum).where(
-                (db.FavouriteAlbum.album_id == id)
-                & (db.FavouriteAlbum.user_id == user_id)
-            )
-        ).one_or_none()
-        if fav_album:
-            self.session.delete(fav_album)
-            self.session.commit()
-
-    def unstar_artist(self, id: int, user_id: int) -> None:
-        fav_artist = self.session.exec(
-            select(db.FavouriteArtist).where(
-                (db.FavouriteArtist.artist_id == id)
-                & (db.FavouriteArtist.user_id == user_id)
-            )
-        ).one_or_none()
-        if fav_artist:
-            self.session.delete(fav_artist)
-            self.session.commit()
-
-    def unstar_playlist(self, id: int, user_id: int) -> None:
-        fav_playlist = self.session.exec(
-            select(db.FavouritePlaylist).where(
-                (db.FavouritePlaylist.playlist_id == id)
-                & (db.FavouritePlaylist.user_id == user_id)
-            )
-        ).one_or_none()
-        if fav_playlist:
-            self.session.delete(fav_playlist)
-            self.session.commit()
+        self.session.commit()
 
     def get_starred_tracks(self, user_id: int) -> Sequence[db.Track]:
         return self.session.exec(
@@ -450,3 +742,13 @@ class UserDBHelper:
         return self.session.exec(
             select(db.User).where(db.User.login == username)
         ).one_or_none()
+
+
+class CoverDBHelper:
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get_cover_by_hash(self, hash: str) -> db.Cover | None:
+        return self.session.exec(
+            select(db.Cover).where(db.Cover.hash == hash)
+        ).one_or_none()
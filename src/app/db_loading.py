@@ -1,12 +1,21 @@
+import hashlib
 import logging
+import multiprocessing
 import os
 import re
+import tempfile
+import threading
 
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Iterator
 from mutagen.flac import FLAC
 from mutagen.mp3 import MP3
-from sqlmodel import Session, select
+from sqlalchemy import Connection, delete, exists, func, insert, update
+from sqlmodel import Session, SQLModel, col, create_engine, select
 
 from src.app import database as db
 from src.app import utils
@@ -17,10 +26,53 @@ logging.basicConfig(level=logging.DEBUG)
 
 scanStatus = {"scanning": True, "count": 0}
 
+SUPPORTED_EXTENSIONS = (".mp3", ".flac")
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", os.cpu_count() or 1))
+SCAN_QUEUE_SIZE = 4
+LOAD_BATCH_SIZE = int(os.environ.get("LOAD_BATCH_SIZE", 200))
+DELETE_CHUNK_SIZE = 500
+# Пул разбора создаётся из потока сканирования в многопоточном процессе
+# сервера, а fork копирует блокировки, захваченные другими потоками
+SCAN_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# Сканирование и обновления от наблюдателя за каталогом не должны идти одновременно
+scan_lock = threading.Lock()
+# Прерывает текущее сканирование при остановке приложения
+scan_stop = threading.Event()
+
+# Таблицы каталога, которые полностью собираются при пересканировании
+CATALOG_TABLES = [
+    "Covers",
+    "Artists",
+    "Genres",
+    "CustomTags",
+    "Albums",
+    "Tracks",
+    "Artist_Tracks",
+    "Genre_Tracks",
+    "CustomTag_Tracks",
+    "Artist_Albums",
+    "Genre_Albums",
+]
+# Пользовательские данные, ссылающиеся на каталог: (таблица, колонка, таблица
+# каталога, колонка, по которой строки каталога сопоставляются между поколениями)
+CATALOG_REFERENCES = [
+    ("Playlist_Tracks", "track_id", "Tracks", "file_path"),
+    ("Favourite_Tracks", "track_id", "Tracks", "file_path"),
+    ("Favourite_Albums", "album_id", "Albums", "name"),
+    ("Favourite_Artists", "artist_id", "Artists", "name"),
+]
+
+# Файлы, которые не удалось разобрать: путь -> (размер, время изменения)
+unreadable_files: dict[str, tuple[int, float]] = {}
+
 
 class AudioInfo:
     file_path: str
     file_size: int
+    file_mtime: float | None
     type: str
     title: str
     artists: list[str]
@@ -38,9 +90,14 @@ class AudioInfo:
     channels: int
     duration: int
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, file_stat: os.stat_result | None = None):
         self.file_path = file_path
-        self.file_size = os.path.getsize(file_path)
+        if file_stat is None:
+            self.file_size = os.path.getsize(file_path)
+            self.file_mtime = None
+        else:
+            self.file_size = file_stat.st_size
+            self.file_mtime = file_stat.st_mtime
 
 
 def extract_metadata_mp3(audio_file: MP3, audio_info: AudioInfo) -> None:
@@ -109,237 +166,940 @@ def extract_metadata_flac(audio_file: FLAC, audio_info: AudioInfo) -> None:
     audio_info.custom_tags = utils.get_custom_tags(audio_file)
 
 
-def scan_directory_for_audio_files(dir: str) -> list[AudioInfo]:
-    data = []
+def parse_audio_file(file_path: str) -> AudioInfo | None:
+    try:
+        audio_info = AudioInfo(file_path, os.stat(file_path))
+
+        audio_file: MP3 | FLAC | None = None
+
+        if file_path.lower().endswith(".mp3"):
+            audio_file = MP3(file_path)
+            extract_metadata_mp3(audio_file, audio_info)
+            audio_info.bits_per_sample = int(
+                audio_file.info.bitrate
+                / (audio_file.info.sample_rate * audio_file.info.channels)
+            )
+
+            logger.info(f"Parsed mp3 file {file_path}")
+        elif file_path.lower().endswith(".flac"):
+            audio_file = FLAC(file_path)
+            extract_metadata_flac(audio_file, audio_info)
+            audio_info.bits_per_sample = audio_file.info.bits_per_sample
+
+            logger.info(f"Parsed flac file {file_path}")
+        else:
+            raise Exception("Unsupported file")
+
+        audio_info.bit_rate = audio_file.info.bitrate
+        audio_info.sample_rate = audio_file.info.sample_rate
+        audio_info.channels = audio_file.info.channels
+        audio_info.duration = audio_file.info.length
+
+        return audio_info
+
+    except Exception as e:
+        logger.warning(f"Error while parsing file {file_path}: {e}")
+        return None
+
+
+def walk_directory(dir: str) -> Iterator[str]:
+    for root, dirs, files in os.walk(dir):
+        # Сортируем, чтобы порядок загрузки не зависел от файловой системы
+        dirs.sort()
+        for file in sorted(files):
+            yield os.path.join(root, file)
+
+
+def scan_directory_for_audio_files(
+    dir: str, workers: int = SCAN_WORKERS
+) -> Iterator[AudioInfo]:
+    return parse_audio_files(walk_directory(dir), workers)
+
+
+def parse_audio_files(
+    file_paths: Iterable[str], workers: int = SCAN_WORKERS
+) -> Iterator[AudioInfo]:
+    if workers <= 1:
+        for file_path in file_paths:
+            audio_info = parse_audio_file(file_path)
+            if audio_info is not None:
+                yield audio_info
+        return
 
-    for root, _, files in os.walk(dir):
-        for file in files:
-            file_path = os.path.join(root, file)
+    # Не больше SCAN_QUEUE_SIZE файлов на воркер в работе одновременно:
+    # обход каталога не убегает вперёд загрузки в БД, а результаты
+    # выдаются в порядке обхода
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=SCAN_MP_CONTEXT
+    ) as executor:
+        pending: deque[tuple[str, Future[AudioInfo | None] | None]] = deque()
+        for file_path in file_paths:
+            future: Future[AudioInfo | None] | None = None
             try:
-                audio_info = AudioInfo(file_path)
+                future = executor.submit(parse_audio_file, file_path)
+            except BrokenProcessPool:
+                pass
+            pending.append((file_path, future))
 
-                audio_file: MP3 | FLAC | None = None
+            if len(pending) >= workers * SCAN_QUEUE_SIZE:
+                audio_info = get_parse_result(*pending.popleft())
+                if audio_info is not None:
+                    yield audio_info
 
-                if file.lower().endswith(".mp3"):
-                    audio_file = MP3(file_path)
-                    extract_metadata_mp3(audio_file, audio_info)
-                    audio_info.bits_per_sample = int(
-                        audio_file.info.bitrate
-                        / (audio_file.info.sample_rate * audio_file.info.channels)
-                    )
+        while pending:
+            audio_info = get_parse_result(*pending.popleft())
+            if audio_info is not None:
+                yield audio_info
 
-                    logger.info(f"Parsed mp3 file {file_path}")
-                elif file.lower().endswith(".flac"):
-                    audio_file = FLAC(file_path)
-                    extract_metadata_flac(audio_file, audio_info)
-                    audio_info.bits_per_sample = audio_file.info.bits_per_sample
 
-                    logger.info(f"Parsed flac file {file_path}")
-                else:
-                    raise Exception("Unsupported file")
+def get_parse_result(
+    file_path: str, future: Future[AudioInfo | None] | None
+) -> AudioInfo | None:
+    if future is not None:
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            logger.warning(f"Scan worker crashed, parse {file_path} in-process: {e}")
+    return parse_audio_file(file_path)
 
-                audio_info.bit_rate = audio_file.info.bitrate
-                audio_info.sample_rate = audio_file.info.sample_rate
-                audio_info.channels = audio_file.info.channels
-                audio_info.duration = audio_file.info.length
 
-                data.append(audio_info)
+@dataclass
+class LoadedAlbum:
+    id: int
+    album_artist_id: int | None
+    total_tracks: int
+    artist_ids: set[int]
 
-            except Exception as e:
-                logger.warning(f"Error while parsing file {file_path}: {e}")
 
-    return data
+# id строк текущего каталога по их ключу (путь к файлу, имя), чтобы при
+# пересборке каталога те же треки, альбомы и исполнители получали прежние id,
+# а новые строки получали id больше всех существующих
+class CatalogIds:
+    def __init__(self, session: Session):
+        self.ids: dict[type[SQLModel], dict[Any, int]] = {
+            db.Track: dict(session.exec(select(db.Track.file_path, db.Track.id)).all()),
+            db.Album: dict(session.exec(select(db.Album.name, db.Album.id)).all()),
+            db.Artist: dict(session.exec(select(db.Artist.name, db.Artist.id)).all()),
+            db.Genre: dict(session.exec(select(db.Genre.name, db.Genre.id)).all()),
+            db.CustomTag: {
+                (name, value): id
+                for name, value, id in session.exec(
+                    select(db.CustomTag.name, db.CustomTag.value, db.CustomTag.id)
+                ).all()
+            },
+        }
+        self.next_ids = {
+            table: max(ids.values(), default=0) + 1 for table, ids in self.ids.items()
+        }
 
+    def get_id(self, table: type[SQLModel], key: Any) -> int:
+        if key not in self.ids[table]:
+            self.ids[table][key] = self.next_ids[table]
+            self.next_ids[table] = self.next_ids[table] + 1
+        return self.ids[table][key]
 
-def load_audio_data(audio_info: AudioInfo, session: Session) -> None:
-    artists = []
-    for name in audio_info.artists:
-        artist = session.exec(
-            select(db.Artist).where(db.Artist.name == name)
-        ).one_or_none()
-        if artist is None:
-            artist = db.Artist(name=name)
-            session.add(artist)
-            session.commit()
-            session.refresh(artist)
-        artists.append(artist)
-
-    album_artists = []
-    album_artist_id: int | None = None
-    if (
-        audio_info.album_artist is not None
-        and audio_info.album_artist != "Various Artists"
+
+# Загрузка треков в БД пачками по batch_size файлов: исполнители, альбомы,
+# жанры и теги кэшируются по имени на всё время сканирования, а строки
+# таблиц связи копятся и вставляются одним executemany на пачку
+class BulkLoader:
+    def __init__(
+        self,
+        session: Session,
+        batch_size: int = LOAD_BATCH_SIZE,
+        track_ids: dict[str, int] | None = None,
+        catalog_ids: CatalogIds | None = None,
     ):
-        album_artist = session.exec(
-            select(db.Artist).where(db.Artist.name == audio_info.album_artist)
-        ).one_or_none()
-        if album_artist is None:
-            album_artist = db.Artist(name=audio_info.album_artist)
-            session.add(album_artist)
-            session.commit()
-            session.refresh(album_artist)
-        album_artist_id = album_artist.id
-        album_artists = [album_artist]
-    else:
-        album_artists = artists
-
-    album = session.exec(
-        select(db.Album).where(db.Album.name == audio_info.album)
-    ).one_or_none()
-    if album is None:
-        album = db.Album(
-            name=audio_info.album,
-            album_artist_id=album_artist_id,
-            total_tracks=0,
-            year=audio_info.year,
-            cover=audio_info.cover,
-            artists=album_artists,
-        )
-        session.add(album)
-        session.commit()
-        session.refresh(album)
-    elif album.album_artist_id is None:
-        if album_artist_id is not None:
-            album.album_artist_id = album_artist_id
-        else:
-            album.artists = list(set(album.artists).union(artists))
-    elif album_artist_id is not None and album.album_artist_id != album_artist_id:
-        album.album_artist_id = album_artist_id
-
-    genres = []
-    for name in audio_info.genres:
-        genre = session.exec(
-            select(db.Genre).where(db.Genre.name == name)
-        ).one_or_none()
-        if genre is None:
-            genre = db.Genre(name=name)
-            session.add(genre)
-            session.commit()
-            session.refresh(genre)
-        genres.append(genre)
-
-    custom_tags: list[db.CustomTag] = []
-    for name, value in audio_info.custom_tags:
-        tag = session.exec(
-            select(db.CustomTag)
-            .where(db.CustomTag.name == name)
-            .where(db.CustomTag.value == value)
-        ).one_or_none()
-        if tag is None:
-            tag = db.CustomTag(name=name, value=value, updated=False)
-            session.add(tag)
-            session.commit()
-            session.refresh(tag)
-        custom_tags.append(tag)
-
-    track = session.exec(
-        select(db.Track).where(db.Track.file_path == audio_info.file_path)
-    ).one_or_none()
-    if track is None:
-        track = db.Track(
-            file_path=audio_info.file_path,
-            file_size=audio_info.file_size,
-            type=audio_info.type,
-            title=audio_info.title,
-            album_id=album.id,
-            album_artist_id=album_artist_id,
-            album_position=audio_info.track_number,
-            year=audio_info.year,
-            plays_count=0,
-            cover=audio_info.cover,
-            cover_type=audio_info.cover_type,
-            bit_rate=audio_info.bit_rate,
-            bits_per_sample=audio_info.bits_per_sample,
-            sample_rate=audio_info.sample_rate,
-            channels=audio_info.channels,
-            duration=audio_info.duration,
-            genres=genres,
-            artists=artists,
-            custom_tags=custom_tags,
-        )
-        album.total_tracks = album.total_tracks + 1
-    else:
-        track.title = audio_info.title
-        track.artists = artists
-        track.album_id = album.id
-        track.album_artist_id = album_artist_id
-        track.album_position = audio_info.track_number
-        track.year = audio_info.year
-        track.genres = genres
-        track.custom_tags = custom_tags
-
-    session.add(track)
-    session.commit()
-    session.refresh(track)
-
-
-def load_starred_data(starred_data: list[Any], session: Session) -> None:
-    for (
-        user_id,
-        starred_tracks,
-        starred_artists,
-        starred_albums,
-        starred_playlists,
-    ) in starred_data:
-        for title, added_at in starred_tracks:
-            track = session.exec(
-                select(db.Track).where(db.Track.title == title)
-            ).one_or_none()
-            if track is not None:
-                session.add(
-                    db.FavouriteTrack(
-                        user_id=user_id, track_id=track.id, added_at=added_at
-                    )
-                )
+        self.session = session
+        self.batch_size = batch_size
+        self.pending_files = 0
 
-        for name, added_at in starred_artists:
-            artist = session.exec(
-                select(db.Artist).where(db.Artist.name == name)
-            ).one_or_none()
-            if artist is not None:
-                session.add(
-                    db.FavouriteArtist(
-                        user_id=user_id, artist_id=artist.id, added_at=added_at
-                    )
+        # Если track_ids передан, он должен содержать все треки из БД
+        self.track_ids = track_ids
+        self.catalog_ids = catalog_ids
+        self.artist_ids: dict[str, int] = {}
+        self.genre_ids: dict[str, int] = {}
+        self.custom_tag_ids: dict[tuple[str, str], int] = {}
+        self.albums: dict[str, LoadedAlbum] = {}
+        self.cover_hashes: set[str] = set()
+        self.dirty_albums: set[str] = set()
+        # Альбомы, сводные данные которых нужно пересчитать при фиксации пачки
+        self.changed_album_ids: set[int] = set()
+        # Новые исполнители и исполнители с новыми альбомами для индекса
+        self.changed_artist_ids: set[int] = set()
+        # Исполнители, жанры и теги перезаписанных треков: удаляются при
+        # фиксации пачки, если у них не осталось связей
+        self.old_artist_ids: set[int] = set()
+        self.old_genre_ids: set[int] = set()
+        self.old_custom_tag_ids: set[int] = set()
+
+        self.artist_tracks: list[dict[str, int]] = []
+        self.genre_tracks: list[dict[str, int]] = []
+        self.custom_tag_tracks: list[dict[str, int]] = []
+        self.artist_albums: list[dict[str, int]] = []
+
+    def insert(self, table: type[SQLModel], key: Any, **values: Any) -> int:
+        if self.catalog_ids is not None:
+            values["id"] = self.catalog_ids.get_id(table, key)
+        result = self.session.connection().execute(insert(table).values(**values))
+        return int(result.inserted_primary_key[0])
+
+    def get_artist_id(self, name: str) -> int:
+        if name not in self.artist_ids:
+            artist_id = self.session.exec(
+                select(db.Artist.id).where(db.Artist.name == name)
+            ).first()
+            if artist_id is None:
+                artist_id = self.insert(db.Artist, name, name=name)
+                self.changed_artist_ids.add(artist_id)
+            self.artist_ids[name] = artist_id
+        return self.artist_ids[name]
+
+    def get_genre_id(self, name: str) -> int:
+        if name not in self.genre_ids:
+            genre_id = self.session.exec(
+                select(db.Genre.id).where(db.Genre.name == name)
+            ).first()
+            if genre_id is None:
+                genre_id = self.insert(db.Genre, name, name=name)
+            self.genre_ids[name] = genre_id
+        return self.genre_ids[name]
+
+    def get_custom_tag_id(self, name: str, value: str) -> int:
+        if (name, value) not in self.custom_tag_ids:
+            tag_id = self.session.exec(
+                select(db.CustomTag.id)
+                .where(db.CustomTag.name == name)
+                .where(db.CustomTag.value == value)
+            ).first()
+            if tag_id is None:
+                tag_id = self.insert(
+                    db.CustomTag, (name, value), name=name, value=value, updated=False
                 )
+            self.custom_tag_ids[(name, value)] = tag_id
+        return self.custom_tag_ids[(name, value)]
 
-        for name, added_at in starred_albums:
-            album = session.exec(
+    def get_album(self, name: str) -> LoadedAlbum | None:
+        if name not in self.albums:
+            album = self.session.exec(
                 select(db.Album).where(db.Album.name == name)
-            ).one_or_none()
-            if album is not None:
-                session.add(
-                    db.FavouriteAlbum(
-                        user_id=user_id, album_id=album.id, added_at=added_at
+            ).first()
+            if album is None:
+                return None
+            artist_ids = self.session.exec(
+                select(db.ArtistAlbum.artist_id).where(
+                    db.ArtistAlbum.album_id == album.id
+                )
+            ).all()
+            self.albums[name] = LoadedAlbum(
+                album.id, album.album_artist_id, album.total_tracks, set(artist_ids)
+            )
+        return self.albums[name]
+
+    def add_album_artists(self, album: LoadedAlbum, artist_ids: list[int]) -> None:
+        for artist_id in artist_ids:
+            if artist_id not in album.artist_ids:
+                self.artist_albums.append(
+                    {"artist_id": artist_id, "album_id": album.id}
+                )
+                album.artist_ids.add(artist_id)
+                self.changed_artist_ids.add(artist_id)
+
+    def get_cover_hash(self, audio_info: AudioInfo) -> str | None:
+        if not audio_info.cover:
+            return None
+        cover_hash = hashlib.sha256(audio_info.cover).hexdigest()
+        if cover_hash not in self.cover_hashes:
+            if self.session.get(db.Cover, cover_hash) is None:
+                self.session.connection().execute(
+                    insert(db.Cover).values(
+                        hash=cover_hash,
+                        data=audio_info.cover,
+                        type=audio_info.cover_type,
                     )
                 )
+            self.cover_hashes.add(cover_hash)
+        return cover_hash
+
+    def load_album(
+        self,
+        audio_info: AudioInfo,
+        artist_ids: list[int],
+        album_artist_id: int | None,
+        cover_hash: str | None,
+    ) -> LoadedAlbum:
+        album = self.get_album(audio_info.album)
+        if album is None:
+            album_id = self.insert(
+                db.Album,
+                audio_info.album,
+                name=audio_info.album,
+                album_artist_id=album_artist_id,
+                total_tracks=0,
+                year=audio_info.year,
+                cover_hash=cover_hash,
+                play_count=0,
+            )
+            album = LoadedAlbum(album_id, album_artist_id, 0, set())
+            self.albums[audio_info.album] = album
+            self.add_album_artists(
+                album, [album_artist_id] if album_artist_id is not None else artist_ids
+            )
+        elif album.album_artist_id is None:
+            if album_artist_id is not None:
+                album.album_artist_id = album_artist_id
+                self.dirty_albums.add(audio_info.album)
+            else:
+                self.add_album_artists(album, artist_ids)
+        elif album_artist_id is not None and album.album_artist_id != album_artist_id:
+            album.album_artist_id = album_artist_id
+            self.dirty_albums.add(audio_info.album)
+        return album
+
+    def change_album_tracks(self, album_id: int, delta: int) -> None:
+        name = self.session.exec(
+            select(db.Album.name).where(db.Album.id == album_id)
+        ).first()
+        album = self.get_album(name) if name is not None else None
+        if name is not None and album is not None:
+            album.total_tracks = album.total_tracks + delta
+            self.dirty_albums.add(name)
+
+    def get_track(self, file_path: str) -> tuple[int, int | None] | None:
+        if self.track_ids is not None and file_path not in self.track_ids:
+            return None
+        return self.session.exec(
+            select(db.Track.id, db.Track.album_id).where(
+                db.Track.file_path == file_path
+            )
+        ).first()
+
+    def load(self, audio_info: AudioInfo) -> None:
+        artist_ids = list(dict.fromkeys(map(self.get_artist_id, audio_info.artists)))
+
+        album_artist_id: int | None = None
+        if (
+            audio_info.album_artist is not None
+            and audio_info.album_artist != "Various Artists"
+        ):
+            album_artist_id = self.get_artist_id(audio_info.album_artist)
+
+        cover_hash = self.get_cover_hash(audio_info)
+        album = self.load_album(audio_info, artist_ids, album_artist_id, cover_hash)
+
+        genre_ids = list(dict.fromkeys(map(self.get_genre_id, audio_info.genres)))
+        custom_tag_ids = list(
+            dict.fromkeys(
+                self.get_custom_tag_id(name, value)
+                for name, value in audio_info.custom_tags
+            )
+        )
+
+        track_values = {
+            "file_size": audio_info.file_size,
+            "file_mtime": audio_info.file_mtime,
+            "type": audio_info.type,
+            "title": audio_info.title,
+            "album_id": album.id,
+            "album_artist_id": album_artist_id,
+            "album_position": audio_info.track_number,
+            "year": audio_info.year,
+            "cover_hash": cover_hash,
+            "bit_rate": audio_info.bit_rate,
+            "bits_per_sample": audio_info.bits_per_sample,
+            "sample_rate": audio_info.sample_rate,
+            "channels": audio_info.channels,
+            "duration": audio_info.duration,
+        }
+
+        track = self.get_track(audio_info.file_path)
+        if track is None:
+            track_id = self.insert(
+                db.Track,
+                audio_info.file_path,
+                file_path=audio_info.file_path,
+                plays_count=0,
+                **track_values,
+            )
+            if self.track_ids is not None:
+                self.track_ids[audio_info.file_path] = track_id
+
+            album.total_tracks = album.total_tracks + 1
+            self.dirty_albums.add(audio_info.album)
+        else:
+            track_id, old_album_id = track
+            if old_album_id != album.id:
+                if old_album_id is not None:
+                    self.change_album_tracks(old_album_id, -1)
+                    self.changed_album_ids.add(old_album_id)
+                album.total_tracks = album.total_tracks + 1
+                self.dirty_albums.add(audio_info.album)
+
+            old_artist_ids, old_genre_ids, old_custom_tag_ids = get_track_links(
+                self.session, [track_id]
+            )
+            self.old_artist_ids.update(old_artist_ids)
+            self.old_genre_ids.update(old_genre_ids)
+            self.old_custom_tag_ids.update(old_custom_tag_ids)
+
+            self.session.execute(
+                update(db.Track)
+                .where(col(db.Track.id) == track_id)
+                .values(**track_values)
+            )
+            for link_table in [db.ArtistTrack, db.GenreTrack, db.CustomTagTrack]:
+                self.session.execute(
+                    delete(link_table).where(col(link_table.track_id) == track_id)  # type: ignore[attr-defined]
+                )
+
+        self.changed_album_ids.add(album.id)
+        self.artist_tracks.extend(
+            {"artist_id": id, "track_id": track_id} for id in artist_ids
+        )
+        self.genre_tracks.extend(
+            {"genre_id": id, "track_id": track_id} for id in genre_ids
+        )
+        self.custom_tag_tracks.extend(
+            {"custom_tag_id": id, "track_id": track_id} for id in custom_tag_ids
+        )
+
+        self.pending_files = self.pending_files + 1
+        if self.pending_files >= self.batch_size:
+            self.commit()
+
+    def commit(self) -> None:
+        for table, rows in [
+            (db.ArtistTrack, self.artist_tracks),
+            (db.GenreTrack, self.genre_tracks),
+            (db.CustomTagTrack, self.custom_tag_tracks),
+            (db.ArtistAlbum, self.artist_albums),
+        ]:
+            if len(rows) > 0:
+                self.session.connection().execute(insert(table), rows)
+                rows.clear()
+
+        for name in self.dirty_albums:
+            album = self.albums[name]
+            self.session.execute(
+                update(db.Album)
+                .where(col(db.Album.id) == album.id)
+                .values(
+                    album_artist_id=album.album_artist_id,
+                    total_tracks=album.total_tracks,
+                )
+            )
+        self.dirty_albums.clear()
+
+        # Альбом, из которого перенесли все треки, удаляется
+        deleted_album_ids, album_artist_ids = delete_empty_albums(
+            self.session, self.changed_album_ids
+        )
+        if len(deleted_album_ids) > 0:
+            self.albums = {
+                name: album
+                for name, album in self.albums.items()
+                if album.id not in deleted_album_ids
+            }
+            self.changed_album_ids.difference_update(deleted_album_ids)
+            self.changed_artist_ids.update(album_artist_ids)
+            self.old_artist_ids.update(album_artist_ids)
+
+        if len(self.changed_album_ids) > 0:
+            db.update_album_aggregates(
+                self.session.connection(), self.changed_album_ids
+            )
+            self.changed_album_ids.clear()
+
+        deleted_artist_ids, deleted_genre_ids, deleted_custom_tag_ids = delete_unlinked(
+            self.session,
+            self.old_artist_ids,
+            self.old_genre_ids,
+            self.old_custom_tag_ids,
+        )
+        self.artist_ids = {
+            name: id
+            for name, id in self.artist_ids.items()
+            if id not in deleted_artist_ids
+        }
+        self.genre_ids = {
+            name: id
+            for name, id in self.genre_ids.items()
+            if id not in deleted_genre_ids
+        }
+        self.custom_tag_ids = {
+            key: id
+            for key, id in self.custom_tag_ids.items()
+            if id not in deleted_custom_tag_ids
+        }
+        self.changed_artist_ids.update(deleted_artist_ids)
+        self.old_artist_ids.clear()
+        self.old_genre_ids.clear()
+        self.old_custom_tag_ids.clear()
+
+        # Индекс обновляется с каждой пачкой, чтобы исполнители появлялись
+        # до окончания сканирования, а lastModified менялся только вместе
+        # с библиотекой
+        if self.pending_files > 0:
+            db.update_artist_index(self.session.connection(), self.changed_artist_ids)
+            self.changed_artist_ids.clear()
+
+        self.session.commit()
+        self.pending_files = 0
+
+
+def load_audio_data(audio_info: AudioInfo, session: Session) -> None:
+    BulkLoader(session, batch_size=1).load(audio_info)
+
 
-        for name, added_at in starred_playlists:
-            playlist = session.exec(
-                select(db.Playlist).where(db.Playlist.name == name)
-            ).one_or_none()
-            if playlist is not None:
-                session.add(
-                    db.FavouritePlaylist(
-                        user_id=user_id, playlist_id=playlist.id, added_at=added_at
+# При full в изменённые попадают все файлы каталога
+def get_changed_audio_files(
+    dir: str, session: Session, full: bool = False, within_dir: bool = False
+) -> tuple[list[str], list[int]]:
+    # within_dir: сравнивать только с треками из этого каталога (для
+    # подкаталога библиотеки, а не всей библиотеки)
+    query = select(
+        db.Track.id, db.Track.file_path, db.Track.file_size, db.Track.file_mtime
+    )
+    if within_dir:
+        query = query.where(
+            col(db.Track.file_path).startswith(os.path.join(dir, ""), autoescape=True)
+        )
+    known_tracks = {
+        file_path: (id, file_size, file_mtime)
+        for id, file_path, file_size, file_mtime in session.exec(query).all()
+    }
+
+    changed_files = []
+    for file_path in walk_directory(dir):
+        if not file_path.lower().endswith(SUPPORTED_EXTENSIONS):
+            continue
+        try:
+            file_stat = os.stat(file_path)
+        except OSError as e:
+            logger.warning(f"Error while reading file {file_path}: {e}")
+            continue
+
+        file_key = (file_stat.st_size, file_stat.st_mtime)
+        known_track = known_tracks.pop(file_path, None)
+        if full:
+            changed_files.append(file_path)
+        elif known_track is not None:
+            if known_track[1:] != file_key:
+                changed_files.append(file_path)
+        elif unreadable_files.get(file_path) != file_key:
+            changed_files.append(file_path)
+
+    vanished_track_ids = [id for id, _, _ in known_tracks.values()]
+    return changed_files, vanished_track_ids
+
+
+def remember_unreadable_files(file_paths: list[str], parsed_paths: set[str]) -> None:
+    for file_path in file_paths:
+        if file_path in parsed_paths:
+            unreadable_files.pop(file_path, None)
+            continue
+        try:
+            file_stat = os.stat(file_path)
+            unreadable_files[file_path] = (file_stat.st_size, file_stat.st_mtime)
+        except OSError:
+            unreadable_files.pop(file_path, None)
+
+
+# Исполнители (в том числе исполнители альбомов), жанры и теги треков
+def get_track_links(
+    session: Session, track_ids: list[int]
+) -> tuple[set[int], set[int], set[int]]:
+    artist_ids = set(
+        session.exec(
+            select(db.ArtistTrack.artist_id).where(
+                col(db.ArtistTrack.track_id).in_(track_ids)
+            )
+        ).all()
+    )
+    artist_ids.update(
+        id
+        for id in session.exec(
+            select(db.Track.album_artist_id).where(col(db.Track.id).in_(track_ids))
+        ).all()
+        if id is not None
+    )
+    genre_ids = set(
+        session.exec(
+            select(db.GenreTrack.genre_id).where(
+                col(db.GenreTrack.track_id).in_(track_ids)
+            )
+        ).all()
+    )
+    custom_tag_ids = set(
+        session.exec(
+            select(db.CustomTagTrack.custom_tag_id).where(
+                col(db.CustomTagTrack.track_id).in_(track_ids)
+            )
+        ).all()
+    )
+    return artist_ids, genre_ids, custom_tag_ids
+
+
+# Исполнители, жанры и теги из переданных, на которые больше ничего не
+# ссылается, удаляются вместе с избранным и строками индекса исполнителей.
+# Возвращает id удалённых исполнителей, жанров и тегов
+def delete_unlinked(
+    session: Session,
+    artist_ids: set[int],
+    genre_ids: set[int],
+    custom_tag_ids: set[int],
+) -> tuple[set[int], set[int], set[int]]:
+    # (таблица, проверяемые id, ссылающиеся колонки, зависимые строки)
+    catalog: list[tuple[Any, set[int], list[Any], list[Any]]] = [
+        (
+            db.Artist,
+            artist_ids,
+            [
+                db.ArtistTrack.artist_id,
+                db.ArtistAlbum.artist_id,
+                db.Track.album_artist_id,
+                db.Album.album_artist_id,
+            ],
+            [db.FavouriteArtist.artist_id, db.ArtistIndexEntry.artist_id],
+        ),
+        (
+            db.Genre,
+            genre_ids,
+            [db.GenreTrack.genre_id, db.GenreAlbum.genre_id],
+            [],
+        ),
+        (db.CustomTag, custom_tag_ids, [db.CustomTagTrack.custom_tag_id], []),
+    ]
+    deleted: list[set[int]] = []
+    for table, ids, references, dependent_columns in catalog:
+        unlinked_ids: set[int] = set()
+        if len(ids) > 0:
+            unlinked_ids = set(
+                session.exec(
+                    select(table.id).where(
+                        col(table.id).in_(ids),
+                        *[~exists().where(column == table.id) for column in references],
                     )
+                ).all()
+            )
+        if len(unlinked_ids) > 0:
+            for column in dependent_columns:
+                session.execute(delete(column.class_).where(column.in_(unlinked_ids)))
+            session.execute(delete(table).where(col(table.id).in_(unlinked_ids)))
+        deleted.append(unlinked_ids)
+    return deleted[0], deleted[1], deleted[2]
+
+
+# Альбомы из переданных, у которых не осталось треков, удаляются вместе со
+# связями. Возвращает id удалённых альбомов и их исполнителей
+def delete_empty_albums(
+    session: Session, album_ids: Iterable[int | None]
+) -> tuple[set[int], set[int]]:
+    empty_album_ids = set(
+        session.exec(
+            select(db.Album.id).where(
+                col(db.Album.id).in_([id for id in album_ids if id is not None]),
+                ~exists().where(col(db.Track.album_id) == db.Album.id),
+            )
+        ).all()
+    )
+    if len(empty_album_ids) == 0:
+        return set(), set()
+
+    artist_ids = set(
+        session.exec(
+            select(db.ArtistAlbum.artist_id).where(
+                col(db.ArtistAlbum.album_id).in_(empty_album_ids)
+            )
+        ).all()
+    )
+    for link_table in [db.ArtistAlbum, db.GenreAlbum, db.FavouriteAlbum]:
+        session.execute(
+            delete(link_table).where(col(link_table.album_id).in_(empty_album_ids))  # type: ignore[attr-defined]
+        )
+    session.execute(delete(db.Album).where(col(db.Album.id).in_(empty_album_ids)))
+    return empty_album_ids, artist_ids
+
+
+def delete_tracks(track_ids: list[int], session: Session) -> None:
+    # Ограничение SQLite на число параметров в одном запросе
+    for i in range(0, len(track_ids), DELETE_CHUNK_SIZE):
+        chunk = track_ids[i : i + DELETE_CHUNK_SIZE]
+
+        album_ids = set(
+            session.exec(
+                select(db.Track.album_id).where(col(db.Track.id).in_(chunk))
+            ).all()
+        )
+        playlist_ids = set(
+            session.exec(
+                select(db.PlaylistTrack.playlist_id).where(
+                    col(db.PlaylistTrack.track_id).in_(chunk)
                 )
+            ).all()
+        )
+        old_artist_ids, genre_ids, custom_tag_ids = get_track_links(session, chunk)
+
+        for link_table in [
+            db.GenreTrack,
+            db.ArtistTrack,
+            db.CustomTagTrack,
+            db.PlaylistTrack,
+            db.FavouriteTrack,
+        ]:
+            session.execute(
+                delete(link_table).where(col(link_table.track_id).in_(chunk))  # type: ignore[attr-defined]
+            )
+        session.execute(delete(db.Track).where(col(db.Track.id).in_(chunk)))
+
+        for playlist in session.exec(
+            select(db.Playlist).where(col(db.Playlist.id).in_(playlist_ids))
+        ).all():
+            playlist.total_tracks = len(playlist.playlist_tracks)
 
+        session.flush()
+        deleted_album_ids, artist_ids = delete_empty_albums(session, album_ids)
+        album_ids.difference_update(deleted_album_ids)
+        session.execute(
+            update(db.Album)
+            .where(col(db.Album.id).in_(album_ids))
+            .values(
+                total_tracks=select(func.count())
+                .where(db.Track.album_id == db.Album.id)
+                .scalar_subquery()
+            )
+        )
+        db.update_album_aggregates(
+            session.connection(), [id for id in album_ids if id is not None]
+        )
+        # Исполнители, жанры и теги без оставшихся треков и альбомов удаляются
+        deleted_artist_ids, _, _ = delete_unlinked(
+            session, old_artist_ids | artist_ids, genre_ids, custom_tag_ids
+        )
+        db.update_artist_index(session.connection(), artist_ids | deleted_artist_ids)
+        session.commit()
+
+    logger.info(f"Deleted {len(track_ids)} vanished tracks")
+
+
+def delete_unused_covers(session: Session) -> None:
+    used_hashes = (
+        select(db.Track.cover_hash)
+        .where(col(db.Track.cover_hash).is_not(None))
+        .union(select(db.Album.cover_hash).where(col(db.Album.cover_hash).is_not(None)))
+    )
+    session.execute(delete(db.Cover).where(col(db.Cover.hash).not_in(used_hashes)))
     session.commit()
 
 
+def load_changed_paths(paths: Iterable[str]) -> None:
+    with scan_lock, db.process_lock(db.SCAN_LOCK), Session(db.engine) as session:
+        changed_files: list[str] = []
+        vanished_track_ids: list[int] = []
+        for path in sorted(set(paths)):
+            if os.path.isdir(path):
+                # Созданный или перемещённый каталог: разбираются только новые
+                # и изменившиеся файлы, как при инкрементальном сканировании
+                dir_files, dir_vanished = get_changed_audio_files(
+                    path, session, within_dir=True
+                )
+                changed_files.extend(dir_files)
+                vanished_track_ids.extend(dir_vanished)
+            elif os.path.isfile(path):
+                if path.lower().endswith(SUPPORTED_EXTENSIONS):
+                    changed_files.append(path)
+            else:
+                # Удалён файл или целый каталог
+                vanished_track_ids.extend(
+                    session.exec(
+                        select(db.Track.id).where(
+                            (col(db.Track.file_path) == path)
+                            | col(db.Track.file_path).startswith(
+                                os.path.join(path, ""), autoescape=True
+                            )
+                        )
+                    ).all()
+                )
+
+        delete_tracks(sorted(set(vanished_track_ids)), session)
+
+        changed_files = sorted(set(changed_files))
+        loader = BulkLoader(session)
+        parsed_paths: set[str] = set()
+        for audio_info in parse_audio_files(changed_files, workers=1):
+            loader.load(audio_info)
+            parsed_paths.add(audio_info.file_path)
+        loader.commit()
+        remember_unreadable_files(changed_files, parsed_paths)
+        delete_unused_covers(session)
+
+
+# Если каталог библиотеки не смонтирован, все треки выглядели бы удалёнными
+def is_library_available(directory_path: str) -> bool:
+    if os.path.isdir(directory_path):
+        return True
+    logger.warning(f"Library directory {directory_path} is not available, skip scan")
+    return False
+
+
 def scan_and_load(
     directory_path: str = "./tracks/",
-    starred_data: list[Any] | None = None,
+    workers: int = SCAN_WORKERS,
+    incremental: bool = False,
+    batch_size: int = LOAD_BATCH_SIZE,
+    full: bool = False,
 ) -> None:
-    audio_files = scan_directory_for_audio_files(directory_path)
+    if not is_library_available(directory_path):
+        scanStatus["scanning"] = False
+        return
 
-    with Session(db.engine) as session:
+    incremental = incremental or full
+    with scan_lock, db.process_lock(db.SCAN_LOCK), Session(db.engine) as session:
+        changed_files: list[str] = []
+        audio_files: Iterator[AudioInfo]
+        if incremental:
+            changed_files, vanished_track_ids = get_changed_audio_files(
+                directory_path, session, full
+            )
+            delete_tracks(vanished_track_ids, session)
+            audio_files = parse_audio_files(changed_files, workers)
+        else:
+            audio_files = scan_directory_for_audio_files(directory_path, workers)
+
+        # Файлы загружаются сразу после разбора и фиксируются пачками,
+        # поэтому треки становятся доступны до окончания сканирования
+        track_ids = dict(session.exec(select(db.Track.file_path, db.Track.id)).all())
+        loader = BulkLoader(session, batch_size, track_ids)
+        parsed_paths: set[str] = set()
         for file in audio_files:
-            load_audio_data(file, session)
+            if scan_stop.is_set():
+                logger.info("Scan stopped")
+                break
+            loader.load(file)
             scanStatus["count"] = scanStatus["count"] + 1
+            if incremental:
+                parsed_paths.add(file.file_path)
+        loader.commit()
+        delete_unused_covers(session)
+
+        if incremental:
+            remember_unreadable_files(changed_files, parsed_paths)
 
-        if starred_data is not None:
-            load_starred_data(starred_data, session)
+    scanStatus["scanning"] = False
+
+
+def get_generation_ids(connection: Connection, table: str, key: str) -> dict[int, int]:
+    # id строки в текущем каталоге -> id той же строки в новом
+    rows = connection.exec_driver_sql(
+        f'SELECT current."id", new."id" FROM main."{table}" AS current '
+        f'JOIN shadow."{table}" AS new ON new."{key}" = current."{key}"'
+    )
+    return {current_id: new_id for current_id, new_id in rows.all()}
+
+
+def swap_library(connection: Connection) -> None:
+    # Счётчики прослушиваний переносятся в новое поколение
+    for table, count, key in [
+        ("Tracks", "plays_count", "file_path"),
+        ("Albums", "play_count", "name"),
+    ]:
+        connection.exec_driver_sql(
+            f'UPDATE shadow."{table}" SET "{count}" = COALESCE((SELECT current."{count}" '
+            f'FROM main."{table}" AS current WHERE current."{key}" = shadow."{table}"."{key}"), 0)'
+        )
+
+    references: list[tuple[str, list[dict[str, Any]]]] = []
+    for table, column, catalog_table, key in CATALOG_REFERENCES:
+        ids = get_generation_ids(connection, catalog_table, key)
+        result = connection.exec_driver_sql(f'SELECT * FROM main."{table}"')
+        references.append(
+            (
+                table,
+                [
+                    {**row, column: ids[row[column]]}
+                    for row in result.mappings().all()
+                    if row[column] in ids
+                ],
+            )
+        )
+        connection.exec_driver_sql(f'DELETE FROM main."{table}"')
+
+    for table in CATALOG_TABLES:
+        columns = ", ".join(
+            f'"{column}"' for column in SQLModel.metadata.tables[table].columns.keys()
+        )
+        connection.exec_driver_sql(f'DELETE FROM main."{table}"')
+        connection.exec_driver_sql(
+            f'INSERT INTO main."{table}" ({columns}) SELECT {columns} FROM shadow."{table}"'
+        )
+
+    for table, rows in references:
+        if len(rows) > 0:
+            connection.execute(insert(SQLModel.metadata.tables[table]), rows)
+
+    connection.execute(
+        update(db.Playlist).values(
+            total_tracks=select(func.count())
+            .where(db.PlaylistTrack.playlist_id == db.Playlist.id)
+            .scalar_subquery()
+        )
+    )
+    db.update_artist_index(connection)
+
+
+# Полное пересканирование собирает новое поколение каталога в отдельной БД
+# и подменяет им текущий одной транзакцией, поэтому до её завершения запросы
+# видят прежний каталог целиком. Уже известные треки, альбомы и исполнители
+# сохраняют свои id, поэтому закэшированные клиентами ссылки остаются верными
+def rebuild_library(
+    directory_path: str = "./tracks/",
+    workers: int = SCAN_WORKERS,
+    batch_size: int = LOAD_BATCH_SIZE,
+) -> None:
+    # Пустое поколение из несмонтированного каталога стёрло бы избранное и
+    # плейлисты
+    if not is_library_available(directory_path):
+        scanStatus["scanning"] = False
+        return
+
+    if db.engine.dialect.name != "sqlite":
+        # Отдельное поколение подключается к БД через ATTACH, это есть только
+        # в SQLite. В других СУБД все файлы перечитываются в текущий каталог
+        scan_and_load(directory_path, workers, full=True, batch_size=batch_size)
+        return
+
+    with scan_lock, tempfile.TemporaryDirectory() as dir:
+        shadow_path = os.path.join(dir, "shadow.db")
+        shadow_engine = create_engine(f"sqlite:///{shadow_path}")
+        SQLModel.metadata.create_all(shadow_engine)
+
+        with Session(db.engine) as session:
+            catalog_ids = CatalogIds(session)
+
+        with Session(shadow_engine) as session:
+            loader = BulkLoader(session, batch_size, {}, catalog_ids)
+            for file in scan_directory_for_audio_files(directory_path, workers):
+                if scan_stop.is_set():
+                    break
+                loader.load(file)
+                scanStatus["count"] = scanStatus["count"] + 1
+            loader.commit()
+        shadow_engine.dispose()
+
+        if scan_stop.is_set():
+            logger.info("Scan stopped, keeping the current library")
+        else:
+            with db.engine.connect() as connection:
+                connection.exec_driver_sql(
+                    "ATTACH DATABASE ? AS shadow", (shadow_path,)
+                )
+                connection.commit()
+                try:
+                    swap_library(connection)
+                    connection.commit()
+                finally:
+                    connection.rollback()
+                    connection.exec_driver_sql("DETACH DATABASE shadow")
+            logger.info("Switched to the rescanned library")
 
     scanStatus["scanning"] = False
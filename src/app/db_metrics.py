@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import Engine, event
+
+logger = logging.getLogger(__name__)
+
+# Запросы к БД дольше порога (мс) пишутся в лог вместе с параметрами, 0 — не писать
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 500))
+# Отладочный заголовок Server-Timing с числом и временем запросов к БД.
+# Без него /metrics/db тоже выключен
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+# Текст самого медленного запроса в /metrics/db
+METRICS_SQL = os.environ.get("METRICS_SQL", "0") == "1"
+
+metrics_router = APIRouter(prefix="/metrics")
+
+
+@dataclass
+class QueryStats:
+    queries: int = 0
+    time: float = 0.0
+    slowest_time: float = 0.0
+    slowest: str = ""
+
+    def add(self, statement: str, duration: float) -> None:
+        self.queries = self.queries + 1
+        self.time = self.time + duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest = statement
+
+
+@dataclass
+class EndpointStats(QueryStats):
+    requests: int = 0
+    max_queries: int = 0
+
+    def add_request(self, stats: QueryStats) -> None:
+        self.requests = self.requests + 1
+        self.queries = self.queries + stats.queries
+        self.time = self.time + stats.time
+        self.max_queries = max(self.max_queries, stats.queries)
+        if stats.slowest_time > self.slowest_time:
+            self.slowest_time = stats.slowest_time
+            self.slowest = stats.slowest
+
+
+# Синхронные обработчики выполняются в пуле потоков с копией контекста
+# запроса, поэтому запросы к БД попадают в статистику своего HTTP-запроса
+request_stats: ContextVar[QueryStats | None] = ContextVar("request_stats", default=None)
+endpoint_stats: dict[str, EndpointStats] = {}
+endpoint_stats_lock = threading.Lock()
+
+
+def before_cursor_execute(conn: Any, *args: Any) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    stats = request_stats.get()
+    if stats is not None:
+        stats.add(statement, duration)
+    if SLOW_QUERY_MS > 0 and duration * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            f"Slow query ({duration * 1000:.1f} ms): {statement} {parameters!r}"
+        )
+
+
+def handle_error(exception_context: Any) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start"):
+        connection.info["query_start"].pop()
+
+
+def instrument(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+async def collect_request_stats(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    stats = QueryStats()
+    token = request_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        request_stats.reset(token)
+
+    # Ненайденные пути не учитываются, чтобы не копить их в статистике
+    route = getattr(request.scope.get("route"), "path", None)
+    if route is not None:
+        with endpoint_stats_lock:
+            endpoint_stats.setdefault(route, EndpointStats()).add_request(stats)
+
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = (
+            f'db;dur={stats.time * 1000:.1f};desc="{stats.queries} queries", '
+            f"db-slowest;dur={stats.slowest_time * 1000:.1f}"
+        )
+    return response
+
+
+@metrics_router.get("/db")
+def db_metrics() -> JSONResponse:
+    if not SERVER_TIMING:
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+
+    with endpoint_stats_lock:
+        metrics: dict[str, dict[str, Any]] = {
+            route: {
+                "requests": stats.requests,
+                "queries": stats.queries,
+                "avgQueries": stats.queries / stats.requests,
+                "maxQueries": stats.max_queries,
+                "dbTimeMs": stats.time * 1000,
+                "avgDbTimeMs": stats.time * 1000 / stats.requests,
+                "slowestMs": stats.slowest_time * 1000,
+            }
+            for route, stats in sorted(endpoint_stats.items())
+        }
+        if METRICS_SQL:
+            for route, stats in endpoint_stats.items():
+                metrics[route]["slowest"] = stats.slowest
+    return JSONResponse(metrics)
@@ -79,6 +79,7 @@ class Artist:
     name: str
     artist_image_url: str | None = None
     starred: datetime | None = None
+    album_count: int | None = None
     albums: List[Album] = field(default_factory=list)
 
 
@@ -2,13 +2,12 @@ from typing import Any
 from fastapi import APIRouter, Body, HTTPException, Depends
 from fastapi.responses import JSONResponse, Response
 from sqlmodel import Session, select
-from mutagen.mp3 import MP3
-from mutagen.flac import FLAC
 
 from src.app.open_subsonic_formatter import OpenSubsonicFormatter
 from .subsonic_response import SubsonicResponse
 from .auth import authenticate_user
 
+from . import db_helpers
 from . import db_loading
 from . import database as db
 from . import service_layer
@@ -51,7 +50,18 @@ def get_cover_art_preview(
     if track is None:
         return JSONResponse({"detail": "No such id"}, status_code=404)
 
-    return Response(content=track.cover, media_type=f"image/{track.cover_type}")
+    cover = None
+    if track.cover_hash is not None:
+        cover = db_helpers.CoverDBHelper(session).get_cover_by_hash(track.cover_hash)
+    if cover is None:
+        image_bytes, image_type = utils.get_cover_preview(None)
+        return Response(content=image_bytes, media_type=f"image/{image_type}")
+
+    return Response(
+        content=cover.data,
+        media_type=f"image/{cover.type}",
+        headers={"ETag": f'"{cover.hash}"'},
+    )
 
 
 @frontend_router.get("/getTags")
@@ -73,15 +83,12 @@ def update_tags(
     if track is None:
         return JSONResponse({"detail": "No such id"}, status_code=404)
 
-    audio, audio_type = utils.update_tags(track, data)
+    audio, _ = utils.update_tags(track, data)
     audio.save()
 
-    audio_info = db_loading.AudioInfo(track.file_path)
-    match audio_type:
-        case utils.AudioType.MP3:
-            db_loading.extract_metadata_mp3(MP3(track.file_path), audio_info)
-        case utils.AudioType.FLAC:
-            db_loading.extract_metadata_flac(FLAC(track.file_path), audio_info)
+    audio_info = db_loading.parse_audio_file(track.file_path)
+    if audio_info is None:
+        return JSONResponse({"detail": "Failed to read updated file"}, status_code=500)
 
     db_loading.load_audio_data(audio_info, session)
 
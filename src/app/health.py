@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlmodel import Session
+
+from . import database as db
+from . import db_loading
+
+health_router = APIRouter(prefix="/health")
+
+
+@health_router.get("/live")
+def live() -> JSONResponse:
+    return JSONResponse({"status": "ok"})
+
+
+# Сервер готов, как только отвечает БД: пока идёт сканирование,
+# клиенты видят уже загруженную часть библиотеки
+@health_router.get("/ready")
+def ready(session: Session = Depends(db.get_session)) -> JSONResponse:
+    try:
+        session.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(
+            {"status": "unavailable", "detail": str(e)}, status_code=503
+        )
+
+    return JSONResponse({"status": "ok", "scanStatus": db_loading.scanStatus})
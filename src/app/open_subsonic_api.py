@@ -1,4 +1,5 @@
 from typing import Optional, List
+from functools import partial
 import asyncio
 
 from fastapi import APIRouter, Depends, HTTPException, Query
@@ -18,6 +19,9 @@ from . import db_helpers
 from . import db_loading
 from . import utils
 
+# Обработчики, которые обращаются к синхронной сессии БД, объявлены через def:
+# FastAPI выполняет их в пуле потоков, а не в цикле событий, который иначе
+# простаивал бы на каждом запросе к SQLite
 open_subsonic_router = APIRouter(prefix="/rest")
 
 
@@ -128,7 +132,7 @@ async def ping() -> JSONResponse:
 
 
 @open_subsonic_router.get("/getPlaylists")
-async def get_playlists(
+def get_playlists(
     username: str = "",
     current_user: db.User = Depends(authenticate_user),
     session: Session = Depends(db.get_session),
@@ -171,7 +175,7 @@ def get_songs_by_genre(
 
 
 @open_subsonic_router.get("/download")
-async def download(id: int, session: Session = Depends(db.get_session)) -> Response:
+def download(id: int, session: Session = Depends(db.get_session)) -> Response:
     track = session.exec(select(db.Track).where(db.Track.id == id)).first()
     if track is None:
         return JSONResponse({"detail": "No such id"}, status_code=404)
@@ -180,7 +184,7 @@ async def download(id: int, session: Session = Depends(db.get_session)) -> Respo
 
 
 @open_subsonic_router.get("/stream")
-async def stream(id: int, session: Session = Depends(db.get_session)) -> Response:
+def stream(id: int, session: Session = Depends(db.get_session)) -> Response:
     track = session.exec(select(db.Track).where(db.Track.id == id)).first()
     if track is None:
         return JSONResponse({"detail": "No such id"}, status_code=404)
@@ -189,7 +193,7 @@ async def stream(id: int, session: Session = Depends(db.get_session)) -> Respons
 
 
 @open_subsonic_router.get("/search2")
-async def search2(
+def search2(
     query: str = Query(),
     artistCount: int = Query(default=20),
     artistOffset: int = Query(default=0),
@@ -220,7 +224,7 @@ async def search2(
 
 
 @open_subsonic_router.get("/search3")
-async def search3(
+def search3(
     query: str = Query(),
     artistCount: int = Query(default=20),
     artistOffset: int = Query(default=0),
@@ -251,7 +255,7 @@ async def search3(
 
 
 @open_subsonic_router.get("/getGenres")
-async def get_genres(session: Session = Depends(db.get_session)) -> JSONResponse:
+def get_genres(session: Session = Depends(db.get_session)) -> JSONResponse:
     service = service_layer.GenreService(session)
     genres: List[dto.Genre] = service.get_genres()
 
@@ -501,16 +505,20 @@ def get_starred2(
 
 
 @open_subsonic_router.get("/startScan")
-async def start_scan(session: Session = Depends(db.get_session)) -> JSONResponse:
+async def start_scan(fullScan: bool = Query(default=True)) -> JSONResponse:
     db_loading.scanStatus["scanning"] = True
     db_loading.scanStatus["count"] = 0
 
-    starred_data = utils.get_user_starred_data(session)
-
-    utils.clear_tables(session)
-    asyncio.get_running_loop().run_in_executor(
-        None, db_loading.scan_and_load, "./tracks/", starred_data
-    )
+    if fullScan:
+        # Пока собирается новый каталог, запросы обслуживаются старым
+        asyncio.get_running_loop().run_in_executor(
+            None, db_loading.rebuild_library, "./tracks/"
+        )
+    else:
+        asyncio.get_running_loop().run_in_executor(
+            None,
+            partial(db_loading.scan_and_load, "./tracks/", incremental=True),
+        )
 
     rsp = SubsonicResponse()
     rsp.data["scanStatus"] = db_loading.scanStatus
@@ -533,6 +541,7 @@ def get_album_list(
     toYear: Optional[str] = None,
     genre: Optional[str] = None,
     musicFolderId: Optional[str] = None,
+    cursor: Optional[str] = None,
     session: Session = Depends(db.get_session),
 ) -> JSONResponse:
     album_service = service_layer.AlbumService(session)
@@ -557,14 +566,17 @@ def get_album_list(
         case _:
             return JSONResponse({"detail": "Invalid arguments"}, status_code=400)
 
-    albums = album_service.get_album_list(
-        request_type, size, offset, fromYear, toYear, genre, musicFolderId
+    page = album_service.get_album_list_page(
+        request_type, size, offset, fromYear, toYear, genre, musicFolderId, cursor
     )
-    if albums is None:
+    if page is None:
         return JSONResponse({"detail": "Invalid arguments"}, status_code=400)
 
+    albums, next_cursor = page
     rsp = SubsonicResponse()
     rsp.data["albumList"] = OpenSubsonicFormatter.format_albums(albums)
+    if next_cursor is not None:
+        rsp.data["albumList"]["nextCursor"] = next_cursor
     return rsp.to_json_rsp()
 
 
@@ -577,6 +589,7 @@ def get_album_list2(
     toYear: Optional[str] = None,
     genre: Optional[str] = None,
     musicFolderId: Optional[str] = None,
+    cursor: Optional[str] = None,
     session: Session = Depends(db.get_session),
 ) -> JSONResponse:
     album_service = service_layer.AlbumService(session)
@@ -601,14 +614,17 @@ def get_album_list2(
         case _:
             return JSONResponse({"detail": "Invalid arguments"}, status_code=400)
 
-    albums = album_service.get_album_list(
-        request_type, size, offset, fromYear, toYear, genre, musicFolderId
+    page = album_service.get_album_list_page(
+        request_type, size, offset, fromYear, toYear, genre, musicFolderId, cursor
     )
-    if albums is None:
+    if page is None:
         return JSONResponse({"detail": "Invalid arguments"}, status_code=400)
 
+    albums, next_cursor = page
     rsp = SubsonicResponse()
     rsp.data["albumList2"] = OpenSubsonicFormatter.format_albums(albums)
+    if next_cursor is not None:
+        rsp.data["albumList2"]["nextCursor"] = next_cursor
     return rsp.to_json_rsp()
 
 
@@ -651,6 +667,31 @@ def get_lyrics_by_song_id(
     return rsp.to_json_rsp()
 
 
+# Маленькие обложки отдаются из таблицы Covers без чтения аудиофайла
+def get_cover_preview(
+    cover_hash: str | None, size: int | None, session: Session
+) -> Response | None:
+    if cover_hash is None or size is None:
+        return None
+    if not 0 < size <= utils.MAX_COVER_PREVIEW_SIZE:
+        return None
+    cover = db_helpers.CoverDBHelper(session).get_cover_by_hash(cover_hash)
+    if cover is None:
+        return None
+
+    image = utils.bytes_to_image(cover.data)
+    if max(image.size) <= size:
+        image_bytes = cover.data
+    else:
+        image.thumbnail((size, size))
+        image_bytes = utils.image_to_bytes(image)
+    return Response(
+        content=image_bytes,
+        media_type=f"image/{cover.type}",
+        headers={"ETag": f'"{cover.hash}-{size}"'},
+    )
+
+
 @open_subsonic_router.get("/getCoverArt")
 def get_cover_art(
     id: str, size: int | None = None, session: Session = Depends(db.get_session)
@@ -667,6 +708,8 @@ def get_cover_art(
         track = track_helper.get_track_by_id(parsed_id)
         if track is None:
             return JSONResponse({"detail": "No such track id"}, status_code=404)
+        if (preview := get_cover_preview(track.cover_hash, size, session)) is not None:
+            return preview
         audio, _ = utils.get_audio_object(track)
         image_bytes = utils.get_cover_from_audio(audio)
 
@@ -675,6 +718,8 @@ def get_cover_art(
         album = album_helper.get_album_by_id(parsed_id)
         if album is None:
             return JSONResponse({"detail": "No such album id"}, status_code=404)
+        if (preview := get_cover_preview(album.cover_hash, size, session)) is not None:
+            return preview
 
         track = album_helper.get_first_track(album.id)
         if track is None:
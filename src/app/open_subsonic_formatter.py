@@ -186,6 +186,7 @@ class OpenSubsonicFormatter:
         }
 
         add_if_not_none(result, "artistImageUrl", artist.artist_image_url)
+        add_if_not_none(result, "albumCount", artist.album_count)
 
         add_datetime_if_not_none(result, "starred", artist.starred)
 
@@ -248,7 +249,7 @@ class OpenSubsonicFormatter:
     def format_indexes(indexes: Indexes) -> dict[str, Any]:
         result = {
             "ignoredArticles": " ".join(indexes.ignored_articles),
-            "lastModified": int(indexes.last_modified.timestamp()) * 1000,
+            "lastModified": int(indexes.last_modified.timestamp() * 1000),
         }
 
         add_list_if_not_empty(
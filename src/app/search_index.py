@@ -0,0 +1,143 @@
+import re
+
+from sqlalchemy import Connection, Engine, TableClause, TextClause, column, table, text
+
+# Полнотекстовый индекс (SQLite FTS5) для search2/search3. Индексы артистов и
+# альбомов ссылаются на основные таблицы, индекс треков хранит название,
+# альбом, исполнителей и жанры. Все индексы обновляются триггерами, поэтому
+# сканер, наблюдатель за каталогом и updateTags поддерживают их без
+# дополнительного кода
+TOKENIZE = "unicode61 remove_diacritics 2"
+
+artists_search = table("Artists_Search", column("rowid"), column("rank"))
+albums_search = table("Albums_Search", column("rowid"), column("rank"))
+tracks_search = table("Tracks_Search", column("rowid"), column("rank"))
+
+TRACK_ARTISTS = """(SELECT group_concat("Artists".name, ' ') FROM "Artist_Tracks"
+    JOIN "Artists" ON "Artists".id = "Artist_Tracks".artist_id
+    WHERE "Artist_Tracks".track_id = {track_id})"""
+TRACK_GENRES = """(SELECT group_concat("Genres".name, ' ') FROM "Genre_Tracks"
+    JOIN "Genres" ON "Genres".id = "Genre_Tracks".genre_id
+    WHERE "Genre_Tracks".track_id = {track_id})"""
+TRACK_ALBUM = """(SELECT name FROM "Albums" WHERE id = {album_id})"""
+
+NAME_INDEXES = [("Artists_Search", "Artists"), ("Albums_Search", "Albums")]
+
+
+def get_name_index_ddl(index: str, content: str) -> list[str]:
+    return [
+        f"""CREATE VIRTUAL TABLE "{index}" USING fts5(
+            name, content='{content}', content_rowid='id', tokenize='{TOKENIZE}'
+        )""",
+        f"""CREATE TRIGGER "{index}_insert" AFTER INSERT ON "{content}" BEGIN
+            INSERT INTO "{index}"(rowid, name) VALUES (new.id, new.name);
+        END""",
+        f"""CREATE TRIGGER "{index}_delete" AFTER DELETE ON "{content}" BEGIN
+            INSERT INTO "{index}"("{index}", rowid, name)
+            VALUES ('delete', old.id, old.name);
+        END""",
+        f"""CREATE TRIGGER "{index}_update" AFTER UPDATE OF name ON "{content}" BEGIN
+            INSERT INTO "{index}"("{index}", rowid, name)
+            VALUES ('delete', old.id, old.name);
+            INSERT INTO "{index}"(rowid, name) VALUES (new.id, new.name);
+        END""",
+        f"""INSERT INTO "{index}"("{index}") VALUES ('rebuild')""",
+    ]
+
+
+def get_link_triggers_ddl(link_table: str, field: str, value: str) -> list[str]:
+    return [
+        f"""CREATE TRIGGER "Tracks_Search_{link_table}_{event}"
+        AFTER {event.upper()} ON "{link_table}" BEGIN
+            UPDATE "Tracks_Search"
+            SET {field} = {value.format(track_id=f"{row}.track_id")}
+            WHERE rowid = {row}.track_id;
+        END"""
+        for event, row in [("insert", "new"), ("delete", "old")]
+    ]
+
+
+TRACKS_INDEX_DDL = [
+    f"""CREATE VIRTUAL TABLE "Tracks_Search" USING fts5(
+        title, album, artists, genres, tokenize='{TOKENIZE}'
+    )""",
+    # Совпадение в названии трека важнее совпадения в альбоме, исполнителе и жанре
+    """INSERT INTO "Tracks_Search"("Tracks_Search", rank)
+    VALUES ('rank', 'bm25(10.0, 3.0, 3.0, 1.0)')""",
+    f"""CREATE TRIGGER "Tracks_Search_insert" AFTER INSERT ON "Tracks" BEGIN
+        INSERT INTO "Tracks_Search"(rowid, title, album, artists, genres)
+        VALUES (
+            new.id,
+            new.title,
+            {TRACK_ALBUM.format(album_id="new.album_id")},
+            {TRACK_ARTISTS.format(track_id="new.id")},
+            {TRACK_GENRES.format(track_id="new.id")}
+        );
+    END""",
+    f"""CREATE TRIGGER "Tracks_Search_update" AFTER UPDATE OF title, album_id
+    ON "Tracks" BEGIN
+        UPDATE "Tracks_Search"
+        SET title = new.title, album = {TRACK_ALBUM.format(album_id="new.album_id")}
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER "Tracks_Search_delete" AFTER DELETE ON "Tracks" BEGIN
+        DELETE FROM "Tracks_Search" WHERE rowid = old.id;
+    END""",
+    *get_link_triggers_ddl("Artist_Tracks", "artists", TRACK_ARTISTS),
+    *get_link_triggers_ddl("Genre_Tracks", "genres", TRACK_GENRES),
+    f"""INSERT INTO "Tracks_Search"(rowid, title, album, artists, genres)
+    SELECT
+        "Tracks".id,
+        "Tracks".title,
+        {TRACK_ALBUM.format(album_id='"Tracks".album_id')},
+        {TRACK_ARTISTS.format(track_id='"Tracks".id')},
+        {TRACK_GENRES.format(track_id='"Tracks".id')}
+    FROM "Tracks"
+    """,
+]
+
+
+# В других СУБД поиск идёт по вхождению подстроки в название
+def is_available(bind: Engine | Connection) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def get_tables(connection: Connection) -> set[str]:
+    return set(
+        connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).scalars()
+    )
+
+
+def create_search_index(connection: Connection) -> None:
+    if connection.dialect.name != "sqlite":
+        return
+    tables = get_tables(connection)
+    for index, content in NAME_INDEXES:
+        if index not in tables:
+            for statement in get_name_index_ddl(index, content):
+                connection.exec_driver_sql(statement)
+    if "Tracks_Search" not in tables:
+        for statement in TRACKS_INDEX_DDL:
+            connection.exec_driver_sql(statement)
+
+
+def drop_search_index(connection: Connection) -> None:
+    if connection.dialect.name != "sqlite":
+        return
+    # Триггеры удаляются вместе с таблицами, к которым они привязаны
+    for index in ["Artists_Search", "Albums_Search", "Tracks_Search"]:
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS "{index}"')
+
+
+def make_match_query(query: str) -> str | None:
+    # Каждое слово запроса ищется как префикс: "ark hea" -> "ark"* "hea"*
+    words = re.findall(r"\w+", query)
+    if len(words) == 0:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def match(index: TableClause, query: str) -> TextClause:
+    return text(f'"{index.name}" MATCH :match_query').bindparams(match_query=query)
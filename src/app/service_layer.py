@@ -1,10 +1,13 @@
+import base64
+import binascii
+import json
 import random
 import py_avataaars as pa  # type: ignore
 from enum import Enum
 from dataclasses import dataclass
 from datetime import datetime
 from functools import partial
-from typing import List, Optional, Dict, Sequence, Set, Tuple, Union, Any, cast
+from typing import List, Optional, Dict, Sequence, Tuple, Union, Any, cast
 
 from sqlmodel import Session, select
 from mutagen.id3 import USLT  # type: ignore
@@ -13,6 +16,7 @@ from src.app import dto
 
 from . import database as db
 from . import db_helpers
+from . import search_index
 from .utils import get_audio_object, AudioType
 
 
@@ -41,6 +45,7 @@ def fill_artist(
         starred=None,
     )
     if with_albums:
+        db_helpers.load_artist_relations([db_artist], with_songs)
         result.albums = fill_albums(db_artist.albums, None, with_songs=with_songs)
     return result
 
@@ -48,12 +53,13 @@ def fill_artist(
 def fill_album(
     db_album: db.Album, db_user: db.User | None, with_songs: bool = False
 ) -> dto.Album:
-    album_genres: List[db.Genre] = list(get_album_genres(db_album))
+    db_helpers.load_album_relations([db_album], with_songs)
+    album_genres: List[db.Genre] = db_album.genres
     album = dto.Album(
         id=db_album.id,
         name=db_album.name,
         song_count=db_album.total_tracks,
-        duration=get_tracklist_duration(db_album.tracks),
+        duration=db_album.duration,
         created=datetime.now(),
         artist=join_artist_names(db_album.artists),
         artist_id=get_album_artist_id_by_album(db_album),
@@ -71,14 +77,17 @@ def fill_album(
 
 
 def fill_albums(
-    db_albums: Sequence[db.Album], db_user: db.User | None, with_songs: bool
+    db_albums: Sequence[db.Album],
+    db_user: db.User | None,
+    with_songs: bool,
+    sort_by_id: bool = True,
 ) -> List[dto.Album]:
-    return list(
-        sorted(
-            map(partial(fill_album, db_user=db_user, with_songs=with_songs), db_albums),
-            key=lambda album: album.id,
-        )
-    )
+    db_helpers.load_album_relations(db_albums, with_songs)
+    albums = map(partial(fill_album, db_user=db_user, with_songs=with_songs), db_albums)
+    # Списки, отсортированные запросом, сохраняют его порядок
+    if not sort_by_id:
+        return list(albums)
+    return list(sorted(albums, key=lambda album: album.id))
 
 
 def fill_artist_item(artist: db.Artist) -> dto.ArtistItem:
@@ -112,13 +121,14 @@ def set_track_starred(db_track: db.Track, db_user: db.User | None) -> datetime |
 
 
 def fill_track(db_track: db.Track, db_user: db.User | None) -> dto.Track:
+    db_helpers.load_track_relations([db_track])
     return dto.Track(
         id=db_track.id,
         title=db_track.title,
         album=db_track.album.name,
         album_id=db_track.album_id,
         artist=join_artist_names(db_track.artists),
-        artist_id=get_album_artist_id_by_artist(get_album_artist(db_track)),
+        artist_id=db_track.album.artist_id,
         track_number=db_track.album_position,
         disc_number=None,
         year=extract_year(db_track.year),
@@ -145,6 +155,7 @@ def fill_track(db_track: db.Track, db_user: db.User | None) -> dto.Track:
 def fill_tracks(
     db_tracks: Sequence[db.Track], db_user: db.User | None
 ) -> List[dto.Track]:
+    db_helpers.load_track_relations(db_tracks)
     return list(
         sorted(
             map(partial(fill_track, db_user=db_user), db_tracks),
@@ -153,22 +164,14 @@ def fill_tracks(
     )
 
 
-def fill_genre(db_genre: db.Genre) -> dto.Genre:
-    albumCount = len(set([t.album_id for t in db_genre.tracks]))
-    songCount = len(db_genre.tracks)
-    return dto.Genre(albumCount=albumCount, songCount=songCount, name=db_genre.name)
-
-
-def fill_genres(db_genres: Sequence[db.Genre]) -> List[dto.Genre]:
-    return list(sorted(map(fill_genre, db_genres), key=lambda genre: genre.name))
-
-
 def fill_artists(
     db_artists: Sequence[db.Artist],
     db_user: db.User | None,
     with_albums: bool = True,
     with_songs: bool = False,
 ) -> List[dto.Artist]:
+    if with_albums:
+        db_helpers.load_artist_relations(db_artists, with_songs)
     return list(
         sorted(
             map(
@@ -188,6 +191,7 @@ def fill_artists(
 def fill_playlist(
     db_playlist: db.Playlist, db_user: db.User | None, with_songs: bool = False
 ) -> dto.Playlist:
+    db_helpers.load_playlist_relations([db_playlist])
     now = datetime.now()
     playlist = dto.Playlist(
         id=db_playlist.id,
@@ -213,6 +217,7 @@ def fill_playlists(
     db_user: db.User | None,
     with_songs: bool = False,
 ) -> List[dto.Playlist]:
+    db_helpers.load_playlist_relations(db_playlists)
     return list(
         sorted(
             map(
@@ -233,10 +238,8 @@ def get_album_artist_id_by_track(track: db.Track) -> int:
 
 
 def get_album_artist_id_by_album(album: db.Album) -> int:
-    if album.album_artist_id:
-        return album.album_artist_id
-    if len(album.artists) > 0:
-        return album.artists[0].id
+    if album.artist_id is not None:
+        return album.artist_id
     return -1
 
 
@@ -252,13 +255,40 @@ def get_album_genre(db_album: db.Album) -> Optional[str]:
     return join_genre_names(db_album.tracks[0].genres)
 
 
-def get_album_genres(db_album: db.Album) -> Set[db.Genre]:
-    genres: Set[db.Genre] = set()
-    if len(db_album.tracks) == 0:
-        return genres
-    for track in db_album.tracks:
-        genres.update(track.genres)
-    return genres
+# Порядок, по ключу которого строится курсор каждого списка альбомов
+CURSOR_ORDERS: dict[RequestType, db_helpers.KeyOrder] = {
+    RequestType.BY_NAME: db_helpers.ALBUMS_BY_NAME,
+    RequestType.BY_ARTIST: db_helpers.ALBUMS_BY_ARTIST,
+    RequestType.BY_YEAR: db_helpers.ALBUMS_BY_YEAR,
+    RequestType.BY_GENRE: db_helpers.ALBUMS_BY_NAME,
+    RequestType.FREQUENT: db_helpers.ALBUMS_BY_FREQUENCY,
+}
+
+
+def encode_cursor(type: RequestType, key: Sequence[Any]) -> str:
+    data = json.dumps([type.value, *key]).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(type: RequestType, cursor: str) -> Optional[List[Any]]:
+    # Курсор другого типа списка или повреждённый курсор не принимается
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    order = CURSOR_ORDERS.get(type)
+    if (
+        order is None
+        or not isinstance(data, list)
+        or len(data) != len(order) + 1
+        or data[0] != type.value
+    ):
+        return None
+    # Ключ сравнивается со столбцами в SQL, поэтому допускаются только скаляры
+    key = data[1:]
+    if not all(value is None or isinstance(value, (str, int, float)) for value in key):
+        return None
+    return key
 
 
 class AlbumService:
@@ -285,47 +315,84 @@ class AlbumService:
         genre: Optional[str] = None,
         music_folder_id: Optional[str] = None,
     ) -> Optional[List[dto.Album]]:
+        page = self.get_album_list_page(
+            type, size, offset, from_year, to_year, genre, music_folder_id
+        )
+        return None if page is None else page[0]
+
+    def get_album_list_page(
+        self,
+        type: RequestType,
+        size: int = 10,
+        offset: int = 0,
+        from_year: Optional[str] = None,
+        to_year: Optional[str] = None,
+        genre: Optional[str] = None,
+        music_folder_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+    ) -> Optional[Tuple[List[dto.Album], Optional[str]]]:
+        # Вместе с альбомами возвращается курсор следующей страницы: страница
+        # по курсору выбирается по индексу, без пропуска offset строк
+        after: Optional[List[Any]] = None
+        if cursor is not None:
+            after = decode_cursor(type, cursor)
+            if after is None:
+                return None
+
         result: Sequence[db.Album] = []
+        order: Optional[db_helpers.KeyOrder] = None
         match type:
-            case RequestType.RANDOM:
-                albums = self.album_db_helper.get_all_albums()
-                result = random.sample(albums, min(size, len(albums)))
+            case RequestType.RANDOM if cursor is None:
+                result = self.album_db_helper.get_random_albums(size)
             case RequestType.BY_NAME:
-                result = list(self.album_db_helper.get_albums_by_name(size, offset))
+                order = db_helpers.ALBUMS_BY_NAME
+                result = list(
+                    self.album_db_helper.get_albums_by_name(size, offset, after)
+                )
             case RequestType.BY_ARTIST:
-                albums = list(self.album_db_helper.get_all_albums())
-                albums.sort(key=lambda album: self.compare_albums_by_artist(album.id))
-                result = albums[offset : offset + size]
+                order = db_helpers.ALBUMS_BY_ARTIST
+                result = self.album_db_helper.get_albums_by_artist(size, offset, after)
             case RequestType.BY_YEAR if from_year is not None and to_year is not None:
                 min_year: str = min(from_year, to_year)
                 max_year: str = max(from_year, to_year)
                 reversed_order = from_year > to_year
 
+                order = (
+                    db_helpers.ALBUMS_BY_YEAR_REVERSED
+                    if reversed_order
+                    else db_helpers.ALBUMS_BY_YEAR
+                )
                 result = self.album_db_helper.get_sorted_by_year_albums(
-                    min_year, max_year, size, offset, reversed_order
+                    min_year, max_year, size, offset, reversed_order, after
                 )
             case RequestType.BY_GENRE if genre is not None:
-                result = self.album_db_helper.get_albums_by_genre(genre, size, offset)
+                order = db_helpers.ALBUMS_BY_NAME
+                result = self.album_db_helper.get_albums_by_genre(
+                    genre, size, offset, after
+                )
             case RequestType.FREQUENT:
+                order = db_helpers.ALBUMS_BY_FREQUENCY
                 result = self.album_db_helper.get_sorted_albums_by_frequency(
-                    size, offset
+                    size, offset, after
                 )
             case RequestType.NEWEST | RequestType.HIGHEST | RequestType.RECENT:
                 raise NotImplementedError()
             case _:  # validation error
                 return None
 
-        return fill_albums(result, None, with_songs=False)
-
-    def compare_albums_by_artist(self, album_id: int) -> str:
-        artist: Optional[db.Artist] = self.album_db_helper.get_album_artist(album_id)
-        return "" if artist is None else artist.name
+        next_cursor: Optional[str] = None
+        if order is not None and size > 0 and len(result) == size:
+            next_cursor = encode_cursor(type, db_helpers.get_key(result[-1], order))
+        return (
+            fill_albums(result, None, with_songs=False, sort_by_id=False),
+            next_cursor,
+        )
 
     def get_sorted_artist_albums(
         self, artistId: int, size: int = 10, offset: int = 0
     ) -> List[dto.Album]:
         albums = self.album_db_helper.get_sorted_artist_albums(artistId, size, offset)
-        return fill_albums(albums, None, with_songs=False)
+        return fill_albums(albums, None, with_songs=False, sort_by_id=False)
 
 
 def join_artist_names(artists: Sequence[db.Artist]) -> Optional[str]:
@@ -340,19 +407,6 @@ def join_genre_names(genres: Sequence[db.Genre]) -> Optional[str]:
     return ", ".join(sorted(g.name for g in genres))
 
 
-def get_album_artist(db_track: db.Track) -> Optional[db.Artist]:
-    # TODO MUS-206 Use db_track.album_artist
-    if len(db_track.album.artists) > 0:
-        return db_track.album.artists[0]
-    return None
-
-
-def get_album_artist_id_by_artist(db_artist: Optional[db.Artist]) -> Optional[int]:
-    if db_artist:
-        return db_artist.id
-    return None
-
-
 def extract_year(str_year: str | None) -> int | None:
     if str_year and len(str_year) == 4 and str_year.isnumeric():
         return int(str_year)
@@ -394,19 +448,10 @@ class TrackService:
     ) -> List[dto.Track]:
         if size < 0:
             return []
-        tracks = self.track_db_helper.get_all_tracks()
-        if genre:
-            tracks = self.track_db_helper.get_tracks_by_genre_name(genre)
-        if from_year:
-            tracks = list(
-                filter(lambda track: track.year and track.year >= from_year, tracks)
-            )
-        if to_year:
-            tracks = list(
-                filter(lambda track: track.year and track.year <= to_year, tracks)
-            )
-        random_tracks = random.sample(tracks, min(size, len(tracks)))
-        return fill_tracks(random_tracks, db_user)
+        tracks = self.track_db_helper.get_random_tracks(
+            size, genre or None, from_year or None, to_year or None
+        )
+        return fill_tracks(tracks, db_user)
 
     def extract_lyrics(self, id: int) -> Optional[List[Dict[str, Any]]]:
         track = self.track_db_helper.get_track_by_id(id)
@@ -435,9 +480,10 @@ class GenreService:
         self.DBHelper = db_helpers.GenresDBHelper(session)
 
     def get_genres(self) -> List[dto.Genre]:
-        db_genres = self.DBHelper.get_all_genres()
-        genres = fill_genres(db_genres)
-        return genres
+        return [
+            dto.Genre(albumCount=album_count, songCount=song_count, name=name)
+            for name, song_count, album_count in self.DBHelper.get_genre_stats()
+        ]
 
 
 class ArtistService:
@@ -457,6 +503,7 @@ class ArtistService:
 
 class SearchService:
     def __init__(self, session: Session):
+        self.full_text = search_index.is_available(session.get_bind())
         self.artist_db_helper = db_helpers.ArtistDBHelper(session)
         self.album_db_helper = db_helpers.AlbumDBHelper(session)
         self.track_db_helper = db_helpers.TrackDBHelper(session)
@@ -472,16 +519,33 @@ class SearchService:
         song_offset: int,
         db_user: db.User | None = None,
     ) -> Tuple[Sequence[dto.Artist], Sequence[dto.Album], Sequence[dto.Track]]:
-
-        db_artists = self.artist_db_helper.get_artists(
-            artist_count, artist_offset, filter_name=query
-        )
-        db_albums = self.album_db_helper.get_albums(
-            album_count, album_offset, filter_name=query
-        )
-        db_tracks = self.track_db_helper.get_tracks(
-            song_count, song_offset, filter_title=query
-        )
+        db_artists: Sequence[db.Artist]
+        db_albums: Sequence[db.Album]
+        db_tracks: Sequence[db.Track]
+
+        match_query = search_index.make_match_query(query)
+        if match_query is not None and self.full_text:
+            db_artists = self.artist_db_helper.search_artists(
+                match_query, artist_count, artist_offset
+            )
+            db_albums = self.album_db_helper.search_albums(
+                match_query, album_count, album_offset
+            )
+            db_tracks = self.track_db_helper.search_tracks(
+                match_query, song_count, song_offset
+            )
+        else:
+            # В запросе нет слов (например, только знаки препинания) или нет
+            # полнотекстового индекса
+            db_artists = self.artist_db_helper.get_artists(
+                artist_count, artist_offset, filter_name=query
+            )
+            db_albums = self.album_db_helper.get_albums(
+                album_count, album_offset, filter_name=query
+            )
+            db_tracks = self.track_db_helper.get_tracks(
+                song_count, song_offset, filter_title=query
+            )
 
         return (
             fill_artists(db_artists, None, with_albums=False, with_songs=False),
@@ -540,14 +604,9 @@ class StarService:
         playlist_ids: Sequence[int],
         user: db.User,
     ) -> None:
-        for id in track_ids:
-            self.favourite_db_helper.star_track(id, user.id)
-        for id in artist_ids:
-            self.favourite_db_helper.star_artist(id, user.id)
-        for id in album_ids:
-            self.favourite_db_helper.star_album(id, user.id)
-        for id in playlist_ids:
-            self.favourite_db_helper.star_playlist(id, user.id)
+        self.favourite_db_helper.star(
+            user.id, track_ids, album_ids, artist_ids, playlist_ids
+        )
 
     def unstar(
         self,
@@ -557,14 +616,9 @@ class StarService:
         playlist_ids: Sequence[int],
         user: db.User,
     ) -> None:
-        for id in track_ids:
-            self.favourite_db_helper.unstar_track(id, user.id)
-        for id in artist_ids:
-            self.favourite_db_helper.unstar_artist(id, user.id)
-        for id in album_ids:
-            self.favourite_db_helper.unstar_album(id, user.id)
-        for id in playlist_ids:
-            self.favourite_db_helper.unstar_playlist(id, user.id)
+        self.favourite_db_helper.unstar(
+            user.id, track_ids, album_ids, artist_ids, playlist_ids
+        )
 
     def get_starred(
         self, user: db.User
@@ -631,34 +685,31 @@ class IndexService:
         music_folder_id: str = "",
         if_modified_since_ms: int = 0,
         with_childs: bool = False,
+        library_path: str = "./tracks/",
     ) -> dto.Indexes:
+        last_modified = self.artist_db_helper.get_library_last_modified()
         indexes: dto.Indexes = dto.Indexes(
-            last_modified=datetime.now()
-        )  #  TODO MUS-208 fill last_modified
-        artists: List[dto.Artist] = fill_artists(
-            self.artist_db_helper.get_all_artists(),
-            None,
-            with_albums=True,
-            with_songs=with_childs,
+            last_modified=datetime.fromtimestamp(last_modified / 1000),
+            ignored_articles=db.IGNORED_ARTICLES,
         )
-        sorted_artists = sorted(artists, key=lambda a: a.name)
-
-        letter: str = ""
-        letter_artists: List[dto.Artist] = []
-        for a in sorted_artists:
-            if len(a.name) > 0 and a.name[0] != letter:
-                if len(letter_artists) > 0:
-                    indexes.artist_index.append(dto.ArtistIndex(letter, letter_artists))
-                letter = a.name[0]
-                letter_artists = []
-            letter_artists.append(a)
-
-        if len(letter_artists) > 0:
-            indexes.artist_index.append(dto.ArtistIndex(letter, letter_artists))
-
+        # Библиотека не менялась с прошлого запроса клиента
+        if if_modified_since_ms > 0 and if_modified_since_ms >= last_modified:
+            return indexes
+
+        # Буквы, порядок и число альбомов предрасчитаны при сканировании
+        for id, name, letter, album_count in self.artist_db_helper.get_artist_index():
+            artist = dto.Artist(id=id, name=name, album_count=album_count)
+            if (
+                len(indexes.artist_index) == 0
+                or indexes.artist_index[-1].name != letter
+            ):
+                indexes.artist_index.append(dto.ArtistIndex(letter, []))
+            indexes.artist_index[-1].artist.append(artist)
+
+        # Файлами индекса считаются только треки в корне библиотеки
         if with_childs:
             tracks: Sequence[dto.Track] = fill_tracks(
-                self.track_db_helper.get_all_tracks(), None
+                self.track_db_helper.get_directory_tracks(library_path), None
             )
             indexes.tracks.extend(tracks)
 
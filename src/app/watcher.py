@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+import time
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+from watchdog.observers.api import BaseObserver
+from watchdog.observers.polling import PollingObserver
+
+from . import db_loading
+
+logger = logging.getLogger(__name__)
+
+WATCH_LIBRARY = os.environ.get("WATCH_LIBRARY", "0") == "1"
+# Сколько секунд каталог должен "молчать", прежде чем изменения попадут в БД
+WATCH_DEBOUNCE = float(os.environ.get("WATCH_DEBOUNCE", 2.0))
+WATCH_POLLING = os.environ.get("WATCH_POLLING", "0") == "1"
+
+# События, после которых содержимое файла не меняется
+IGNORED_EVENTS = ("opened", "closed_no_write")
+
+
+class LibraryWatcher(FileSystemEventHandler):
+    def __init__(
+        self,
+        directory_path: str = "./tracks/",
+        debounce: float = WATCH_DEBOUNCE,
+        polling: bool = WATCH_POLLING,
+    ):
+        self.directory_path = directory_path
+        self.debounce = debounce
+        self.polling = polling
+        self.pending: set[str] = set()
+        self.last_event = 0.0
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.observer: BaseObserver | None = None
+        self.thread: threading.Thread | None = None
+
+    def on_any_event(self, event: FileSystemEvent) -> None:
+        if event.event_type in IGNORED_EVENTS:
+            return
+        # Изменение каталога сопровождает каждое создание или изменение файла
+        # в нём, а сам файл приходит отдельным событием
+        if event.is_directory and event.event_type == "modified":
+            return
+        with self.condition:
+            for path in (event.src_path, event.dest_path):
+                if path:
+                    self.pending.add(os.fsdecode(path))
+            self.last_event = time.monotonic()
+            self.condition.notify()
+
+    def start_observer(self, observer: BaseObserver) -> BaseObserver:
+        observer.schedule(self, self.directory_path, recursive=True)
+        observer.start()
+        return observer
+
+    def start(self) -> None:
+        if not self.polling:
+            try:
+                self.observer = self.start_observer(Observer())
+            except OSError as e:
+                # Например, закончились inotify watches или ФС их не поддерживает
+                logger.warning(f"Native file watching unavailable, polling: {e}")
+        if self.observer is None:
+            self.observer = self.start_observer(PollingObserver())
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        logger.info(f"Watching {self.directory_path} for changes")
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+        if self.thread is not None:
+            self.thread.join()
+
+    def wait_for_changes(self) -> set[str]:
+        with self.condition:
+            while not self.stopped:
+                if not self.pending:
+                    self.condition.wait()
+                    continue
+                remaining = self.last_event + self.debounce - time.monotonic()
+                if remaining <= 0:
+                    paths, self.pending = self.pending, set()
+                    return paths
+                self.condition.wait(remaining)
+            return set()
+
+    def run(self) -> None:
+        while paths := self.wait_for_changes():
+            try:
+                db_loading.load_changed_paths(paths)
+            except Exception as e:
+                logger.exception(f"Failed to apply library changes: {e}")
@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import update
+from sqlmodel import Session
+
+from src.app import database as db
+from src.app.search_index import create_search_index
+from tests.load.db_benchmark import fill_database
+
+AUTH = {"u": "admin", "p": "admin"}
+
+# Смешанная нагрузка: на каждый запрос выбирается один из путей с этими весами.
+# ping не обращается к БД и показывает, насколько заблокирован цикл событий
+REQUESTS: list[tuple[str, dict[str, str | int], int]] = [
+    ("ping", {}, 2),
+    ("search3", {"query": "track1", **AUTH}, 3),
+    ("getGenres", {}, 2),
+    ("getPlaylists", AUTH, 1),
+    ("stream", {"id": 1}, 2),
+    ("getAlbumList2", {"type": "frequent", "size": 50}, 2),
+]
+
+
+def percentile(latencies: list[float], p: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+
+async def run_clients(clients: int, duration: float) -> dict[str, list[float]]:
+    from src.app.app import app
+
+    latencies: dict[str, list[float]] = {name: [] for name, _, _ in REQUESTS}
+    weights = [weight for _, _, weight in REQUESTS]
+    deadline = time.perf_counter() + duration
+
+    async def client(http: httpx.AsyncClient) -> None:
+        while time.perf_counter() < deadline:
+            name, params, _ = random.choices(REQUESTS, weights)[0]
+            start = time.perf_counter()
+            response = await http.get(f"/rest/{name}", params=params)
+            latencies[name].append(time.perf_counter() - start)
+            assert response.status_code == 200, (name, response.text)
+
+    # Lifespan не запускается, поэтому фоновое сканирование не мешает замеру
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        await asyncio.gather(*(client(http) for _ in range(clients)))
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Задержка запросов к API при одновременных клиентах"
+    )
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as dir:
+        db.engine = db.create_db_engine(f"sqlite:///{os.path.join(dir, 'bench.db')}")
+        fill_database(db.engine, args.files)
+        with db.engine.begin() as connection:
+            create_search_index(connection)
+            db.update_artist_index(connection)
+
+        audio_path = os.path.join(dir, "track.mp3")
+        with open(audio_path, "wb") as file:
+            file.write(bytes(256 * 1024))
+        with Session(db.engine) as session:
+            session.add(db.User(id=1, login="admin", password="admin", avatar=""))
+            session.add(
+                db.Playlist(name="playlist", user_id=1, total_tracks=0, create_date="")
+            )
+            session.execute(
+                update(db.Track)
+                .where(db.Track.id == 1)  # type: ignore[arg-type]
+                .values(file_path=audio_path)
+            )
+            session.commit()
+
+        latencies = asyncio.run(run_clients(args.clients, args.duration))
+        total = sum(len(values) for values in latencies.values())
+        print(f"{total / args.duration:.0f} requests/s, {args.clients} clients")
+        for name, values in latencies.items():
+            print(
+                f"{name:>14}: p50 {statistics.median(values) * 1000:7.1f} ms, "
+                f"p99 {percentile(values, 0.99) * 1000:7.1f} ms ({len(values)})"
+            )
+        db.engine.dispose()
@@ -0,0 +1,67 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from sqlalchemy import Engine
+from sqlmodel import SQLModel, Session, select
+
+from src.app import database as db
+from src.app import service_layer
+from src.app.search_index import create_search_index
+from tests.load.db_benchmark import fill_database
+
+
+def measure(engine: Engine, query: Callable[[Session], Any], repeat: int) -> str:
+    elapsed = 0.0
+    for _ in range(repeat):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            query(session)
+            elapsed = elapsed + time.perf_counter() - start
+    # Память замеряется отдельно: tracemalloc сильно замедляет выполнение
+    with Session(engine) as session:
+        tracemalloc.start()
+        query(session)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return f"{elapsed / repeat * 1000:8.1f} ms, peak {peak / 1024 / 1024:6.1f} MiB"
+
+
+# До выноса обложек в Covers каждый select(db.Track) читал и blob обложки.
+# Соединение с Covers воспроизводит тот же объём данных на строку
+QUERIES: dict[str, Callable[[Session], Any]] = {
+    "tracks": lambda s: s.exec(select(db.Track)).all(),
+    "tracks with cover blob": lambda s: s.exec(
+        select(db.Track, db.Cover.data).join(
+            db.Cover, db.Track.cover_hash == db.Cover.hash  # type: ignore[arg-type]
+        )
+    ).all(),
+    "search3": lambda s: service_layer.SearchService(s).search3(
+        "track", 20, 0, 20, 0, 500, 0
+    ),
+    "getIndexes": lambda s: service_layer.IndexService(s).get_indexes_artists(
+        with_childs=True
+    ),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Время и память запросов списков треков без blob обложек"
+    )
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dir:
+        engine = db.create_db_engine(f"sqlite:///{os.path.join(dir, 'benchmark.db')}")
+        SQLModel.metadata.create_all(engine)
+        with engine.begin() as connection:
+            create_search_index(connection)
+        fill_database(engine, args.files)
+        for name, query in QUERIES.items():
+            print(f"{name:>22}: {measure(engine, query, args.repeat)}")
+        engine.dispose()
@@ -0,0 +1,114 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import Engine, update
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from src.app import database as db
+from src.app import db_loading
+from tests.load.scan_benchmark import make_audio_info
+
+
+def fill_database(engine: Engine, files: int) -> None:
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        loader = db_loading.BulkLoader(session, track_ids={})
+        for i in range(files):
+            loader.load(make_audio_info(i))
+        loader.commit()
+
+
+def read(engine: Engine, files: int) -> None:
+    with Session(engine) as session:
+        album_id = session.exec(
+            select(db.Track.album_id).where(db.Track.id == random.randint(1, files))
+        ).one()
+        session.exec(select(db.Track).where(db.Track.album_id == album_id)).all()
+
+
+def write(engine: Engine, files: int) -> None:
+    # Как scrobble: одна короткая транзакция на запрос
+    with Session(engine) as session:
+        session.execute(
+            update(db.Track)
+            .where(db.Track.id == random.randint(1, files))  # type: ignore[arg-type]
+            .values(plays_count=db.Track.plays_count + 1)
+        )
+        session.commit()
+
+
+def run_workers(
+    engine: Engine,
+    files: int,
+    readers: int,
+    writers: int,
+    duration: float,
+) -> dict[str, int]:
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(operation: Callable[[Engine, int], None], name: str) -> None:
+        done, errors = 0, 0
+        while time.perf_counter() < deadline:
+            try:
+                operation(engine, files)
+                done = done + 1
+            except OperationalError:
+                errors = errors + 1
+        with lock:
+            counts[name] = counts[name] + done
+            counts["errors"] = counts["errors"] + errors
+
+    threads = [
+        threading.Thread(target=worker, args=(read, "reads")) for _ in range(readers)
+    ] + [
+        threading.Thread(target=worker, args=(write, "writes")) for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def run(
+    name: str, make_engine: Callable[[str], Engine], args: argparse.Namespace
+) -> None:
+    with tempfile.TemporaryDirectory() as dir:
+        engine = make_engine(f"sqlite:///{os.path.join(dir, 'benchmark.db')}")
+        fill_database(engine, args.files)
+        counts = run_workers(
+            engine, args.files, args.readers, args.writers, args.duration
+        )
+        engine.dispose()
+
+    print(
+        f"{name:>8}: {counts['reads'] / args.duration:8.1f} reads/s, "
+        f"{counts['writes'] / args.duration:8.1f} writes/s, "
+        f"{counts['errors']} errors"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Конкурентные чтение и запись в БД с настройками SQLite и без"
+    )
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    run(
+        "default",
+        lambda url: create_engine(url, connect_args={"check_same_thread": False}),
+        args,
+    )
+    run("tuned", db.create_db_engine, args)
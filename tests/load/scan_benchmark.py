@@ -0,0 +1,71 @@
+import argparse
+import os
+import tempfile
+import time
+
+from sqlmodel import SQLModel, Session, create_engine
+
+from src.app import db_loading
+
+
+def make_audio_info(i: int) -> db_loading.AudioInfo:
+    audio_info = db_loading.AudioInfo(
+        f"tracks/album{i // 12}/{i}.mp3",
+        os.stat_result((0o100644, 0, 0, 1, 0, 0, 1984500, 0, 0, 0)),
+    )
+    audio_info.type = "audio/mpeg"
+    audio_info.title = f"track{i}"
+    audio_info.artists = [f"artist{i % 500}", f"artist{(i * 7) % 500}"]
+    audio_info.album_artist = f"artist{(i // 12) % 500}"
+    audio_info.album = f"album{i // 12}"
+    audio_info.genres = [f"genre{i % 40}"]
+    audio_info.track_number = i % 12 + 1
+    audio_info.year = str(1970 + i % 50)
+    audio_info.cover = bytes(2048)
+    audio_info.cover_type = "jpeg"
+    audio_info.custom_tags = [("MOOD", f"mood{i % 10}")]
+    audio_info.bit_rate = 320 * 1024
+    audio_info.bits_per_sample = 3
+    audio_info.sample_rate = 44100
+    audio_info.channels = 2
+    audio_info.duration = 180
+    return audio_info
+
+
+def run(files: int, batch_size: int) -> float:
+    with tempfile.TemporaryDirectory() as dir:
+        engine = create_engine(f"sqlite:///{os.path.join(dir, 'benchmark.db')}")
+        SQLModel.metadata.create_all(engine)
+        audio_files = [make_audio_info(i) for i in range(files)]
+
+        start = time.perf_counter()
+        with Session(engine) as session:
+            loader = db_loading.BulkLoader(session, batch_size, track_ids={})
+            for audio_info in audio_files:
+                loader.load(audio_info)
+            loader.commit()
+        elapsed = time.perf_counter() - start
+
+        engine.dispose()
+        return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Скорость загрузки треков в БД")
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="+",
+        default=[1, 50, db_loading.LOAD_BATCH_SIZE],
+    )
+    args = parser.parse_args()
+
+    baseline: float | None = None
+    for batch_size in args.batch_sizes:
+        elapsed = run(args.files, batch_size)
+        baseline = baseline or elapsed
+        print(
+            f"batch_size={batch_size:>5}: {args.files / elapsed:8.1f} files/s "
+            f"({elapsed:.2f} s, x{baseline / elapsed:.1f})"
+        )
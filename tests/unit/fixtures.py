@@ -0,0 +1,75 @@
+import os
+import pytest
+import struct
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+from mutagen.flac import FLAC, Picture
+from PIL import Image
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from src.app import database as db
+
+
+def make_cover(color: str, size: int = 200) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (size, size), color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def make_flac(path: Path, cover: bytes | None = None, **tags: str | list[str]) -> None:
+    # Минимальный FLAC: только STREAMINFO (44100 Гц, 2 канала, 16 бит, 60 секунд)
+    info = (44100 << 44) | (1 << 41) | (15 << 36) | (44100 * 60)
+    stream_info = struct.pack(">HH", 4096, 4096) + bytes(6) + info.to_bytes(8, "big")
+    stream_info += bytes(16)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(
+        b"fLaC" + bytes([0x80]) + len(stream_info).to_bytes(3, "big") + stream_info
+    )
+
+    audio = FLAC(path)
+    audio.add_tags()
+    for name, value in tags.items():
+        audio[name] = value
+    if cover is not None:
+        picture = Picture()
+        picture.type = 3
+        picture.mime = "image/jpeg"
+        picture.data = cover
+        audio.add_picture(picture)
+    audio.save()
+
+
+# Тесты с фикстурой engine запускаются и на PostgreSQL, если задать
+# TEST_DATABASE_URL. Перед каждым тестом эта БД очищается
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+sqlite_only = pytest.mark.skipif(
+    TEST_DATABASE_URL is not None, reason="проверяет поведение SQLite"
+)
+
+
+@pytest.fixture
+def engine(tmp_path: Path):
+    if TEST_DATABASE_URL is not None:
+        engine = db.create_db_engine(TEST_DATABASE_URL)
+        SQLModel.metadata.drop_all(engine)
+    else:
+        engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    with patch.object(db, "engine", engine):
+        db.init_db()
+        yield engine
+    engine.dispose()
+
+
+def get_track_titles(engine) -> list[str]:
+    with Session(engine) as session:
+        return sorted(session.exec(select(db.Track.title)).all())
+
+
+def make_library(dir: Path) -> list[str]:
+    make_flac(dir / "b" / "2.flac", TITLE="b2", ARTIST="artist", ALBUM="b")
+    make_flac(dir / "b" / "1.flac", TITLE="b1", ARTIST="artist", ALBUM="b")
+    make_flac(dir / "a.flac", TITLE="a", ARTIST="artist", ALBUM="a")
+    (dir / "broken.mp3").write_bytes(b"not an mp3")
+    (dir / "cover.txt").write_text("unsupported")
+    return ["a", "b1", "b2"]
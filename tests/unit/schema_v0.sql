@@ -0,0 +1,154 @@
+-- Схема БД версии 0, как её создавал init_db до первой миграции
+CREATE TABLE IF NOT EXISTS "Schema_Version" (
+    id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE IF NOT EXISTS "Users" (
+    id INTEGER NOT NULL,
+    login VARCHAR NOT NULL,
+    password VARCHAR NOT NULL,
+    avatar VARCHAR NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE IF NOT EXISTS "Artists" (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX "ix_Artists_name" ON "Artists" (name);
+CREATE TABLE IF NOT EXISTS "Genres" (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX "ix_Genres_name" ON "Genres" (name);
+CREATE TABLE IF NOT EXISTS "Covers" (
+    hash VARCHAR NOT NULL,
+    data BLOB NOT NULL,
+    type VARCHAR NOT NULL,
+    PRIMARY KEY (hash)
+);
+CREATE TABLE IF NOT EXISTS "CustomTags" (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    value VARCHAR NOT NULL,
+    updated BOOLEAN NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX "ix_CustomTags_name" ON "CustomTags" (name);
+CREATE TABLE IF NOT EXISTS "Favourite_Artists" (
+    user_id INTEGER NOT NULL,
+    artist_id INTEGER NOT NULL,
+    added_at VARCHAR NOT NULL,
+    PRIMARY KEY (user_id, artist_id),
+    FOREIGN KEY(user_id) REFERENCES "Users" (id),
+    FOREIGN KEY(artist_id) REFERENCES "Artists" (id)
+);
+CREATE TABLE IF NOT EXISTS "Albums" (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    album_artist_id INTEGER,
+    total_tracks INTEGER NOT NULL,
+    year VARCHAR,
+    cover_hash VARCHAR,
+    play_count INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(album_artist_id) REFERENCES "Artists" (id),
+    FOREIGN KEY(cover_hash) REFERENCES "Covers" (hash)
+);
+CREATE INDEX "ix_Albums_name" ON "Albums" (name);
+CREATE TABLE IF NOT EXISTS "Playlists" (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    user_id INTEGER NOT NULL,
+    total_tracks INTEGER NOT NULL,
+    create_date VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES "Users" (id)
+);
+CREATE INDEX "ix_Playlists_name" ON "Playlists" (name);
+CREATE TABLE IF NOT EXISTS "Artist_Albums" (
+    artist_id INTEGER NOT NULL,
+    album_id INTEGER NOT NULL,
+    PRIMARY KEY (artist_id, album_id),
+    FOREIGN KEY(artist_id) REFERENCES "Artists" (id),
+    FOREIGN KEY(album_id) REFERENCES "Albums" (id)
+);
+CREATE TABLE IF NOT EXISTS "Favourite_Albums" (
+    user_id INTEGER NOT NULL,
+    album_id INTEGER NOT NULL,
+    added_at VARCHAR NOT NULL,
+    PRIMARY KEY (user_id, album_id),
+    FOREIGN KEY(user_id) REFERENCES "Users" (id),
+    FOREIGN KEY(album_id) REFERENCES "Albums" (id)
+);
+CREATE TABLE IF NOT EXISTS "Favourite_Playlists" (
+    user_id INTEGER NOT NULL,
+    playlist_id INTEGER NOT NULL,
+    added_at VARCHAR NOT NULL,
+    PRIMARY KEY (user_id, playlist_id),
+    FOREIGN KEY(user_id) REFERENCES "Users" (id),
+    FOREIGN KEY(playlist_id) REFERENCES "Playlists" (id)
+);
+CREATE TABLE IF NOT EXISTS "Tracks" (
+    id INTEGER NOT NULL,
+    file_path VARCHAR NOT NULL,
+    file_size INTEGER NOT NULL,
+    file_mtime FLOAT,
+    type VARCHAR NOT NULL,
+    title VARCHAR NOT NULL,
+    album_id INTEGER,
+    album_artist_id INTEGER,
+    album_position INTEGER,
+    year VARCHAR,
+    plays_count INTEGER NOT NULL,
+    cover_hash VARCHAR,
+    bit_rate INTEGER NOT NULL,
+    bits_per_sample INTEGER NOT NULL,
+    sample_rate INTEGER NOT NULL,
+    channels INTEGER NOT NULL,
+    duration INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(album_id) REFERENCES "Albums" (id),
+    FOREIGN KEY(album_artist_id) REFERENCES "Artists" (id),
+    FOREIGN KEY(cover_hash) REFERENCES "Covers" (hash)
+);
+CREATE INDEX "ix_Tracks_title" ON "Tracks" (title);
+CREATE TABLE IF NOT EXISTS "Genre_Tracks" (
+    genre_id INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    PRIMARY KEY (genre_id, track_id),
+    FOREIGN KEY(genre_id) REFERENCES "Genres" (id),
+    FOREIGN KEY(track_id) REFERENCES "Tracks" (id)
+);
+CREATE TABLE IF NOT EXISTS "Artist_Tracks" (
+    artist_id INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    PRIMARY KEY (artist_id, track_id),
+    FOREIGN KEY(artist_id) REFERENCES "Artists" (id),
+    FOREIGN KEY(track_id) REFERENCES "Tracks" (id)
+);
+CREATE TABLE IF NOT EXISTS "CustomTag_Tracks" (
+    custom_tag_id INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    PRIMARY KEY (custom_tag_id, track_id),
+    FOREIGN KEY(custom_tag_id) REFERENCES "CustomTags" (id),
+    FOREIGN KEY(track_id) REFERENCES "Tracks" (id)
+);
+CREATE TABLE IF NOT EXISTS "Playlist_Tracks" (
+    playlist_id INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    added_at VARCHAR NOT NULL,
+    PRIMARY KEY (playlist_id, track_id),
+    FOREIGN KEY(playlist_id) REFERENCES "Playlists" (id),
+    FOREIGN KEY(track_id) REFERENCES "Tracks" (id)
+);
+CREATE TABLE IF NOT EXISTS "Favourite_Tracks" (
+    user_id INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    added_at VARCHAR NOT NULL,
+    PRIMARY KEY (user_id, track_id),
+    FOREIGN KEY(user_id) REFERENCES "Users" (id),
+    FOREIGN KEY(track_id) REFERENCES "Tracks" (id)
+);
@@ -84,7 +84,7 @@ class TestTrackService(unittest.TestCase):
     def test_get_album_list_random_one(self):
         album, _, _ = get_entities(1)
 
-        self.album_service.album_db_helper.get_all_albums = MagicMock(
+        self.album_service.album_db_helper.get_random_albums = MagicMock(
             return_value=[album]
         )
 
@@ -113,8 +113,8 @@ class TestTrackService(unittest.TestCase):
             album, _, _ = get_entities(1)
             albums.append(album)
 
-        self.album_service.album_db_helper.get_all_albums = MagicMock(
-            return_value=albums
+        self.album_service.album_db_helper.get_random_albums = MagicMock(
+            side_effect=lambda size: albums[:size]
         )
 
         result = self.album_service.get_album_list(RequestType.RANDOM, size)
@@ -140,7 +140,7 @@ class TestTrackService(unittest.TestCase):
     def test_get_album_list_by_artist(self):
         album, _, _ = get_entities(1)
 
-        self.album_service.album_db_helper.get_all_albums = MagicMock(
+        self.album_service.album_db_helper.get_albums_by_artist = MagicMock(
             return_value=[album]
         )
 
@@ -148,41 +148,13 @@ class TestTrackService(unittest.TestCase):
             RequestType.BY_ARTIST, size=1, offset=0
         )
 
+        self.album_service.album_db_helper.get_albums_by_artist.assert_called_with(
+            1, 0, None
+        )
         self.assertIsNotNone(result)
         self.assertEqual(len(result), 1)
         self.check_album(result[0], album, with_tracks=False)
 
-    @parameterized.expand(
-        [
-            (0, 0, []),
-            (1, 0, [1]),
-            (1, 1, [2]),
-            (2, 0, [1, 2]),
-        ]
-    )
-    def test_get_album_list_by_artist_size_offset(
-        self, size: int, offset: int, res_ids: list[int]
-    ):
-        album1, _, _ = get_entities(1)
-        album2, _, _ = get_entities(2)
-
-        self.album_service.album_db_helper.get_all_albums = MagicMock(
-            return_value=[album1, album2]
-        )
-
-        self.album_service.album_db_helper.get_album_artist = MagicMock(
-            side_effect=lambda id: dto.Artist(id, name=str(id))
-        )
-
-        result = self.album_service.get_album_list(
-            RequestType.BY_ARTIST, size=size, offset=offset
-        )
-
-        self.assertIsNotNone(result)
-        self.assertEqual(len(result), len(res_ids))
-        for album in result:
-            self.assertIn(album.id, res_ids)
-
     @parameterized.expand(
         [
             ("2000", "2010", ("2000", "2010", False)),
@@ -214,7 +186,7 @@ class TestTrackService(unittest.TestCase):
         )
 
         self.album_service.album_db_helper.get_sorted_by_year_albums.assert_called_with(
-            expected_call[0], expected_call[1], size, offset, expected_call[2]
+            expected_call[0], expected_call[1], size, offset, expected_call[2], None
         )
 
         self.assertIsNotNone(result)
@@ -1,23 +1,27 @@
+import time
 import unittest
+from pathlib import Path
 from unittest.mock import MagicMock
 
 from datetime import datetime
 
+from sqlmodel import Session
+
 import src.app.database as db
 import src.app.dto as dto
+from src.app import db_loading
 from src.app.service_layer import IndexService
+from tests.unit.fixtures import engine, make_flac
 
 
-def get_entities(
-    i: int, artist_name: str = "abc"
-) -> tuple[db.Album, db.Track, db.Artist]:
+def get_track(i: int) -> db.Track:
     album = db.Album(
         id=i,
         name=f"album{i}",
         total_tracks=1,
     )
 
-    track = db.Track(
+    return db.Track(
         id=i,
         file_path=f"./track{i}.mp3",
         file_size=1984500,
@@ -25,8 +29,6 @@ def get_entities(
         title=f"track{i}",
         album=album,
         plays_count=0,
-        cover=b"",
-        cover_type="",
         bit_rate=128,
         bits_per_sample=3,
         sample_rate=44100,
@@ -34,168 +36,186 @@ def get_entities(
         duration=60,
     )
 
-    artist = db.Artist(
-        id=i,
-        name=artist_name,
-        tracks=[track],
-        albums=[album],
-    )
-
-    return (album, track, artist)
-
 
 class TestIndexService(unittest.TestCase):
     def setUp(self):
         self.session_mock = MagicMock()
         self.index_service = IndexService(self.session_mock)
 
-    def check_track(self, received: dto.Track, db_track: db.Track):
-        self.assertEqual(received.id, db_track.id)
-        self.assertEqual(received.title, db_track.title)
-
-    def check_album(self, received: dto.Album, db_album: db.Album):
-        self.assertEqual(received.id, db_album.id)
-        self.assertEqual(received.name, db_album.name)
+    def set_index(self, rows, last_modified: int = 1000):
+        self.index_service.artist_db_helper.get_artist_index = MagicMock(
+            return_value=rows
+        )
+        self.index_service.artist_db_helper.get_library_last_modified = MagicMock(
+            return_value=last_modified
+        )
 
-    def check_artist(self, received: dto.Artist, db_artist: db.Artist):
-        self.assertEqual(received.id, db_artist.id)
-        self.assertEqual(received.name, db_artist.name)
+    def check_artist(self, received: dto.Artist, row):
+        self.assertEqual(received.id, row[0])
+        self.assertEqual(received.name, row[1])
+        self.assertEqual(received.album_count, row[3])
 
     def test_indexes_artist_no_artists(self):
-        self.index_service.artist_db_helper.get_all_artists = MagicMock(return_value=[])
+        self.set_index([])
 
         result: dto.Indexes = self.index_service.get_indexes_artists(with_childs=False)
 
-        self.assertIsInstance(result.last_modified, datetime)
+        self.assertEqual(result.last_modified, datetime.fromtimestamp(1))
         self.assertEqual(len(result.shortcuts), 0)
         self.assertEqual(len(result.tracks), 0)
         self.assertEqual(len(result.artist_index), 0)
 
     def test_indexes_artist_one(self):
-        album, track, artist = get_entities(1)
-
-        self.index_service.artist_db_helper.get_all_artists = MagicMock(
-            return_value=[artist]
-        )
+        row = (1, "abc", "A", 2)
+        self.set_index([row])
 
         result: dto.Indexes = self.index_service.get_indexes_artists(with_childs=False)
 
-        self.assertIsInstance(result.last_modified, datetime)
         self.assertEqual(len(result.shortcuts), 0)
         self.assertEqual(len(result.tracks), 0)
 
         self.assertEqual(len(result.artist_index), 1)
-        artist_index0 = result.artist_index[0]
-        self.assertEqual(artist_index0.name, artist.name[0])
-
-        self.assertEqual(len(artist_index0.artist), 1)
-        artist_index0_artist = artist_index0.artist[0]
-        self.check_artist(artist_index0_artist, artist)
-
-        self.assertEqual(len(artist_index0_artist.albums), 1)
-        artist_index0_artist_album = artist_index0_artist.albums[0]
-        self.check_album(artist_index0_artist_album, album)
+        self.assertEqual(result.artist_index[0].name, "A")
+        self.assertEqual(len(result.artist_index[0].artist), 1)
+        self.check_artist(result.artist_index[0].artist[0], row)
 
     def test_indexes_artist_one_with_childs(self):
-        album, track, artist = get_entities(1)
-
-        self.index_service.artist_db_helper.get_all_artists = MagicMock(
-            return_value=[artist]
-        )
-        self.index_service.track_db_helper.get_all_tracks = MagicMock(
+        track = get_track(1)
+        self.set_index([(1, "abc", "A", 1)])
+        self.index_service.track_db_helper.get_directory_tracks = MagicMock(
             return_value=[track]
         )
 
         result: dto.Indexes = self.index_service.get_indexes_artists(with_childs=True)
 
-        self.assertIsInstance(result.last_modified, datetime)
-        self.assertEqual(len(result.shortcuts), 0)
-
         self.assertEqual(len(result.artist_index), 1)
-        artist_index0 = result.artist_index[0]
-        self.assertEqual(artist_index0.name, artist.name[0])
-
-        self.assertEqual(len(artist_index0.artist), 1)
-        artist_index0_artist = artist_index0.artist[0]
-        self.check_artist(artist_index0_artist, artist)
-
-        self.assertEqual(len(artist_index0_artist.albums), 1)
-        artist_index0_artist_album = artist_index0_artist.albums[0]
-        self.check_album(artist_index0_artist_album, album)
-
         self.assertEqual(len(result.tracks), 1)
-        track0 = result.tracks[0]
-        self.check_track(track0, track)
+        self.assertEqual(result.tracks[0].id, track.id)
+        self.assertEqual(result.tracks[0].title, track.title)
 
     def test_indexes_artist_two_same_letters(self):
-        album1, track1, artist1 = get_entities(1, artist_name="aa")
-        album2, track2, artist2 = get_entities(2, artist_name="az")
+        rows = [(1, "aa", "A", 1), (2, "The az", "A", 3)]
+        self.set_index(rows)
 
-        self.index_service.artist_db_helper.get_all_artists = MagicMock(
-            return_value=[artist1, artist2]
-        )
+        result: dto.Indexes = self.index_service.get_indexes_artists(with_childs=False)
+
+        self.assertEqual(len(result.artist_index), 1)
+        self.assertEqual(result.artist_index[0].name, "A")
+        self.assertEqual(len(result.artist_index[0].artist), 2)
+        for received, row in zip(result.artist_index[0].artist, rows):
+            self.check_artist(received, row)
+
+    def test_indexes_artist_two_different_letters(self):
+        rows = [(1, "aa", "A", 1), (2, "bz", "B", 1)]
+        self.set_index(rows)
 
         result: dto.Indexes = self.index_service.get_indexes_artists(with_childs=False)
 
-        self.assertIsInstance(result.last_modified, datetime)
-        self.assertEqual(len(result.shortcuts), 0)
-        self.assertEqual(len(result.tracks), 0)
+        self.assertEqual([index.name for index in result.artist_index], ["A", "B"])
+        for index, row in zip(result.artist_index, rows):
+            self.assertEqual(len(index.artist), 1)
+            self.check_artist(index.artist[0], row)
 
-        self.assertEqual(len(result.artist_index), 1)
-        artist_index0 = result.artist_index[0]
-        self.assertEqual(artist_index0.name, artist1.name[0])
+    def test_indexes_not_modified(self):
+        self.set_index([(1, "aa", "A", 1)], last_modified=1000)
 
-        self.assertEqual(len(artist_index0.artist), 2)
-        artist_index0_artist1 = artist_index0.artist[0]
-        self.check_artist(artist_index0_artist1, artist1)
+        result = self.index_service.get_indexes_artists(if_modified_since_ms=1000)
+        self.assertEqual(len(result.artist_index), 0)
+        self.index_service.artist_db_helper.get_artist_index.assert_not_called()
 
-        self.assertEqual(len(artist_index0_artist1.albums), 1)
-        artist_index0_artist_album = artist_index0_artist1.albums[0]
-        self.check_album(artist_index0_artist_album, album1)
+        result = self.index_service.get_indexes_artists(if_modified_since_ms=999)
+        self.assertEqual(len(result.artist_index), 1)
 
-        artist_index0_artist2 = artist_index0.artist[1]
-        self.check_artist(artist_index0_artist2, artist2)
 
-        self.assertEqual(len(artist_index0_artist2.albums), 1)
-        artist_index0_artist2_album = artist_index0_artist2.albums[0]
-        self.check_album(artist_index0_artist2_album, album2)
+def test_artist_index_is_built_on_scan(tmp_path: Path, engine):
+    make_flac(tmp_path / "1.flac", TITLE="1", ARTIST="The Beatles", ALBUM="a")
+    make_flac(tmp_path / "2.flac", TITLE="2", ARTIST="The Beatles", ALBUM="b")
+    make_flac(tmp_path / "3.flac", TITLE="3", ARTIST="abba", ALBUM="c")
+    make_flac(tmp_path / "4.flac", TITLE="4", ARTIST="2Pac", ALBUM="d")
+    db_loading.scan_and_load(str(tmp_path), workers=1)
+
+    with Session(engine) as session:
+        indexes = IndexService(session).get_indexes_artists()
+        last_modified = int(indexes.last_modified.timestamp() * 1000)
+
+        assert "The" in indexes.ignored_articles
+        assert [
+            (index.name, [(a.name, a.album_count) for a in index.artist])
+            for index in indexes.artist_index
+        ] == [
+            ("#", [("2Pac", 1)]),
+            ("A", [("abba", 1)]),
+            ("B", [("The Beatles", 2)]),
+        ]
+        assert last_modified > 0
+
+        not_modified = IndexService(session).get_indexes_artists(
+            if_modified_since_ms=last_modified
+        )
+        assert not_modified.artist_index == []
+        assert not_modified.last_modified == indexes.last_modified
 
-    def test_indexes_artist_two_different_letters(self):
-        album1, track1, artist1 = get_entities(1, artist_name="aa")
-        album2, track2, artist2 = get_entities(2, artist_name="bz")
+    time.sleep(0.01)
+    make_flac(tmp_path / "5.flac", TITLE="5", ARTIST="Ce", ALBUM="e")
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
 
-        self.index_service.artist_db_helper.get_all_artists = MagicMock(
-            return_value=[artist1, artist2]
+    with Session(engine) as session:
+        indexes = IndexService(session).get_indexes_artists(
+            if_modified_since_ms=last_modified
         )
+        assert [index.name for index in indexes.artist_index] == ["#", "A", "B", "C"]
 
-        result: dto.Indexes = self.index_service.get_indexes_artists(with_childs=False)
 
-        self.assertIsInstance(result.last_modified, datetime)
-        self.assertEqual(len(result.shortcuts), 0)
-        self.assertEqual(len(result.tracks), 0)
+def get_index(engine) -> tuple[list[tuple[str, int]], int]:
+    with Session(engine) as session:
+        indexes = IndexService(session).get_indexes_artists()
+    artists = [(a.name, a.album_count) for i in indexes.artist_index for a in i.artist]
+    return artists, int(indexes.last_modified.timestamp() * 1000)
+
 
-        self.assertEqual(len(result.artist_index), 2)
-        artist_index0 = result.artist_index[0]
-        self.assertEqual(artist_index0.name, artist1.name[0])
+def test_artist_index_last_modified_changes_with_library(tmp_path: Path, engine):
+    make_flac(tmp_path / "1.flac", TITLE="1", ARTIST="a", ALBUM="a1")
+    make_flac(tmp_path / "2.flac", TITLE="2", ARTIST="a", ALBUM="a2")
+    db_loading.scan_and_load(str(tmp_path), workers=1)
+    artists, last_modified = get_index(engine)
+    assert artists == [("a", 2)]
 
-        self.assertEqual(len(artist_index0.artist), 1)
-        artist_index0_artist1 = artist_index0.artist[0]
-        self.check_artist(artist_index0_artist1, artist1)
+    # Сканирование без изменений не сбрасывает кэш клиентов
+    time.sleep(0.01)
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+    assert get_index(engine) == (artists, last_modified)
 
-        self.assertEqual(len(artist_index0_artist1.albums), 1)
-        artist_index0_artist_album = artist_index0_artist1.albums[0]
-        self.check_album(artist_index0_artist_album, album1)
+    (tmp_path / "2.flac").unlink()
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+    artists, new_last_modified = get_index(engine)
+    assert artists == [("a", 1)]
+    assert new_last_modified > last_modified
 
-        artist_index1 = result.artist_index[1]
-        self.assertEqual(artist_index1.name, artist2.name[0])
 
-        self.assertEqual(len(artist_index1.artist), 1)
-        artist_index1_artist1 = artist_index1.artist[0]
-        self.check_artist(artist_index1_artist1, artist2)
+def test_artist_index_is_updated_with_each_batch(tmp_path: Path, engine):
+    make_flac(tmp_path / "1.flac", TITLE="1", ARTIST="a", ALBUM="a1")
+    make_flac(tmp_path / "2.flac", TITLE="2", ARTIST="b", ALBUM="b1")
 
-        self.assertEqual(len(artist_index1_artist1.albums), 1)
-        artist_index1_artist2_album = artist_index1_artist1.albums[0]
-        self.check_album(artist_index1_artist2_album, album2)
+    with Session(engine) as session:
+        loader = db_loading.BulkLoader(session, batch_size=1)
+        audio_info = db_loading.parse_audio_file(str(tmp_path / "1.flac"))
+        assert audio_info is not None
+        loader.load(audio_info)
+
+        # Первая пачка видна в индексе до окончания сканирования
+        assert get_index(engine)[0] == [("a", 1)]
+
+
+def test_indexes_childs_are_root_tracks(tmp_path: Path, engine):
+    make_flac(tmp_path / "2.flac", TITLE="root", ARTIST="a", ALBUM="a")
+    make_flac(tmp_path / "a" / "1.flac", TITLE="nested", ARTIST="a", ALBUM="a")
+    db_loading.scan_and_load(str(tmp_path), workers=1)
+
+    with Session(engine) as session:
+        indexes = IndexService(session).get_indexes_artists(
+            with_childs=True, library_path=str(tmp_path)
+        )
+    assert [track.title for track in indexes.tracks] == ["root"]
 
 
 if __name__ == "__main__":
@@ -556,6 +556,7 @@ class TestOpenSubsonicFormatter(unittest.TestCase):
             encoded, "artistImageUrl", str, artist.artist_image_url
         )
         self.check_optional_iso8601(encoded, "starred", artist.starred)
+        self.check_optional_strict(encoded, "albumCount", int, artist.album_count)
 
         if len(artist.albums) > 0:
             self.assertIsInstance(encoded.get("album"), list)
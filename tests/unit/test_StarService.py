@@ -1,8 +1,12 @@
+import pytest
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+
+from sqlmodel import Session, select
 
 import src.app.database as db
 from src.app.service_layer import StarService
+from tests.unit.fixtures import engine
 
 
 class TestStarService(unittest.TestCase):
@@ -15,8 +19,8 @@ class TestStarService(unittest.TestCase):
         self._setup_mocks()
 
     def _setup_mocks(self):
-        self.star_service.favourite_db_helper.star_track = MagicMock()
-        self.star_service.favourite_db_helper.unstar_track = MagicMock()
+        self.star_service.favourite_db_helper.star = MagicMock()
+        self.star_service.favourite_db_helper.unstar = MagicMock()
         self.star_service.favourite_db_helper.get_starred_tracks = MagicMock()
         self.star_service.favourite_db_helper.get_starred_albums = MagicMock()
         self.star_service.favourite_db_helper.get_starred_artists = MagicMock()
@@ -25,18 +29,16 @@ class TestStarService(unittest.TestCase):
     def test_star_tracks(self):
         self.star_service.star(self.track_ids, [], [], [], self.user)
 
-        for track_id in self.track_ids:
-            self.star_service.favourite_db_helper.star_track.assert_any_call(
-                track_id, self.user.id
-            )
+        self.star_service.favourite_db_helper.star.assert_called_once_with(
+            self.user.id, self.track_ids, [], [], []
+        )
 
     def test_unstar_tracks(self):
         self.star_service.unstar(self.track_ids, [], [], [], self.user)
 
-        for track_id in self.track_ids:
-            self.star_service.favourite_db_helper.unstar_track.assert_any_call(
-                track_id, self.user.id
-            )
+        self.star_service.favourite_db_helper.unstar.assert_called_once_with(
+            self.user.id, self.track_ids, [], [], []
+        )
 
     @staticmethod
     def _create_mock_track(track_id, title, album):
@@ -222,5 +224,37 @@ class TestStarService(unittest.TestCase):
         self.assertEqual(len(result[3]), 1)
 
 
+def test_star_and_unstar_in_bulk(engine):
+    with Session(engine) as session:
+        user = db.User(id=1, login="user", password="", avatar="")
+        session.add(user)
+        session.add(db.Album(id=1, name="album", total_tracks=3))
+        for i in range(1, 4):
+            session.add(TestStarService._create_mock_track(i, f"track{i}", None))
+        session.commit()
+
+        service = StarService(session)
+        # Повторные и несуществующие id пропускаются без ошибки
+        service.star([1, 2, 2, 99], [1], [5], [], user)
+        service.star([1, 3], [1], [], [], user)
+
+        starred = session.exec(select(db.FavouriteTrack.track_id)).all()
+        assert sorted(starred) == [1, 2, 3]
+        assert session.exec(select(db.FavouriteAlbum.album_id)).all() == [1]
+        assert session.exec(select(db.FavouriteArtist)).all() == []
+
+        service.unstar([2, 99], [1], [], [], user)
+        starred = session.exec(select(db.FavouriteTrack.track_id)).all()
+        assert sorted(starred) == [1, 3]
+        assert session.exec(select(db.FavouriteAlbum)).all() == []
+
+
+def test_star_on_unsupported_dialect(engine):
+    with Session(engine) as session:
+        with patch.object(session.get_bind().dialect, "name", "mysql"):
+            with pytest.raises(NotImplementedError, match="mysql"):
+                StarService(session).star([1], [], [], [], db.User(id=1))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,7 +1,10 @@
+from collections import Counter
 from typing import List
 import random
 import unittest
 from unittest.mock import MagicMock, patch
+from sqlmodel import SQLModel, Session, create_engine, select
+
 import src.app.database as db
 from src.app.service_layer import TrackService, AudioType, USLT
 from src.app import dto
@@ -72,191 +75,143 @@ class TestTrackService(unittest.TestCase):
         for i in result:
             assert isinstance(i, dto.Track)
 
+    def set_songs(self, years: List[str | None], genres: List[str | None] = []):
+        # Случайная выборка и фильтры выполняются в БД
+        engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(engine)
+        self.session = Session(engine)
+        self.addCleanup(self.session.close)
+        for i, year in enumerate(years, 1):
+            track = create_track_entity(i)
+            track.year = year
+            self.session.add(track)
+            genre = genres[i - 1] if i <= len(genres) else None
+            if genre is not None:
+                db_genre = self.session.exec(
+                    select(db.Genre).where(db.Genre.name == genre)
+                ).first() or db.Genre(name=genre)
+                track.genres.append(db_genre)
+        self.session.commit()
+        self.track_service = TrackService(self.session)
+
+    def check_random_songs(self, result: List[dto.Track], ids: List[int]):
+        assert len(result) == len(set(song.id for song in result))
+        for song in result:
+            assert isinstance(song, dto.Track)
+            assert song.id in ids
+
     def test_get_random_songs_empty_list(self):
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(return_value=[])
+        self.set_songs([])
         result = self.track_service.get_random_songs()
         assert len(result) == 0
 
     def test_get_random_songs_just_random(self):
-        songs = []
-        size = 5
-        for i in range(1, 11):
-            songs.append(create_track_entity(i))
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(
-            return_value=songs
-        )
-        result = self.track_service.get_random_songs(size=size)
-        assert len(result) == size
-        size = 3
-        result = self.track_service.get_random_songs(size=size)
-        assert len(result) == size
-        size = 7
-        result = self.track_service.get_random_songs(size=size)
-        assert len(result) == size
+        self.set_songs(["2020"] * 10)
+        for size in [5, 3, 7]:
+            result = self.track_service.get_random_songs(size=size)
+            assert len(result) == size
+            self.check_random_songs(result, list(range(1, 11)))
 
     def test_get_random_songs_size_eq_tracks(self):
-        songs = []
-        size = 10
-        for i in range(1, 11):
-            songs.append(create_track_entity(i))
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(
-            return_value=songs
-        )
-        result = self.track_service.get_random_songs(size=size)
-        assert len(result) == size
+        self.set_songs(["2020"] * 10)
+        result = self.track_service.get_random_songs(size=10)
+        assert sorted(song.id for song in result) == list(range(1, 11))
 
     def test_get_random_songs_size_eq_0(self):
-        songs = []
-        size = 0
-        for i in range(1, 11):
-            songs.append(create_track_entity(i))
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(
-            return_value=songs
-        )
-        result = self.track_service.get_random_songs(size=size)
+        self.set_songs(["2020"] * 10)
+        result = self.track_service.get_random_songs(size=0)
         assert result == []
 
     def test_get_random_songs_negative_size(self):
-        songs = []
-        size = -15
-        for i in range(1, 11):
-            songs.append(create_track_entity(i))
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(
-            return_value=songs
-        )
-        result = self.track_service.get_random_songs(size=size)
+        self.set_songs(["2020"] * 10)
+        result = self.track_service.get_random_songs(size=-15)
         assert result == []
 
     def test_get_random_songs_size_more_than_tracks(self):
-        songs = []
-        size = 15
-        for i in range(1, 11):
-            songs.append(create_track_entity(i))
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(
-            return_value=songs
-        )
-        result = self.track_service.get_random_songs(size=size)
-        assert len(result) == len(songs)
+        self.set_songs(["2020"] * 10)
+        result = self.track_service.get_random_songs(size=15)
+        assert sorted(song.id for song in result) == list(range(1, 11))
 
     def test_get_random_songs_genre(self):
-        songs_with_target_genre = []
-        songs_without_target_genre = []
-        for i in range(1, 11):
-            songs_without_target_genre.append(create_track_entity(i))
-        for i in range(11, 16):
-            songs_with_target_genre.append(create_track_entity(i))
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(
-            return_value=songs_without_target_genre + songs_with_target_genre
-        )
-        self.track_service.track_db_helper.get_tracks_by_genre_name = MagicMock(
-            return_value=songs_with_target_genre
-        )
+        self.set_songs(["2020"] * 15, ["Other"] * 10 + ["Genre"] * 5)
         result = self.track_service.get_random_songs(genre="Genre")
-        assert len(result) == len(songs_with_target_genre)
-        for song in result:
-            assert isinstance(song, dto.Track)
-            assert song.id in [s.id for s in songs_with_target_genre]
+        assert len(result) == 5
+        self.check_random_songs(result, list(range(11, 16)))
 
     def test_get_random_songs_from_year(self):
-        songs = []
-        songs_with_target_year = []
-        target_year = 2021
-        for i in range(1, 11):
-            song = create_track_entity(i)
-            song.year = "2019"
-            songs.append(song)
-        for i in range(11, 16):
-            song = create_track_entity(i)
-            song.year = "2025"
-            songs_with_target_year.append(song)
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(
-            return_value=songs + songs_with_target_year
-        )
-        result = self.track_service.get_random_songs(from_year=str(target_year))
-        assert len(result) == len(songs_with_target_year)
+        self.set_songs(["2019"] * 10 + ["2025"] * 5 + [None])
+        result = self.track_service.get_random_songs(from_year="2021")
+        assert len(result) == 5
+        self.check_random_songs(result, list(range(11, 16)))
         for song in result:
-            assert isinstance(song, dto.Track)
-            assert song.year >= target_year
-            assert song.id in [s.id for s in songs_with_target_year]
+            assert song.year >= 2021
 
     def test_get_random_songs_to_year(self):
-        songs = []
-        songs_with_target_year = []
-        target_year = 2021
-        for i in range(1, 11):
-            song = create_track_entity(i)
-            song.year = "2025"
-            songs.append(song)
-        for i in range(11, 16):
-            song = create_track_entity(i)
-            song.year = "2019"
-            songs_with_target_year.append(song)
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(
-            return_value=songs + songs_with_target_year
-        )
-        result = self.track_service.get_random_songs(to_year=str(target_year))
-        assert len(result) == len(songs_with_target_year)
+        self.set_songs(["2025"] * 10 + ["2019"] * 5 + [None])
+        result = self.track_service.get_random_songs(to_year="2021")
+        assert len(result) == 5
+        self.check_random_songs(result, list(range(11, 16)))
         for song in result:
-            assert isinstance(song, dto.Track)
-            assert song.year <= target_year
-            assert song.id in [s.id for s in songs_with_target_year]
+            assert song.year <= 2021
 
     def test_get_random_songs_from_year_to_year(self):
-        songs = []
-        songs_with_target_year = []
-        from_year = 2015
-        to_year = 2025
-        for i in range(1, 11):
-            song = create_track_entity(i)
-            song.year = f"{random.randint(1900, 2014)}"
-            songs.append(song)
-
-        for i in range(16, 26):
-            song = create_track_entity(i)
-            song.year = f"{random.randint(2026, 2100)}"
-            songs.append(song)
-
-        for i in range(11, 16):
-            song = create_track_entity(i)
-            song.year = f"{random.randint(2015, 2025)}"
-            songs_with_target_year.append(song)
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(
-            return_value=songs + songs_with_target_year
-        )
-        result = self.track_service.get_random_songs(
-            from_year=str(from_year), to_year=str(to_year)
-        )
-        assert len(result) == len(songs_with_target_year)
+        years = [f"{random.randint(1900, 2014)}" for _ in range(10)]
+        years += [f"{random.randint(2015, 2025)}" for _ in range(5)]
+        years += [f"{random.randint(2026, 2100)}" for _ in range(10)]
+        self.set_songs(years)
+        result = self.track_service.get_random_songs(from_year="2015", to_year="2025")
+        assert len(result) == 5
+        self.check_random_songs(result, list(range(11, 16)))
         for song in result:
-            assert isinstance(song, dto.Track)
-            assert song.year <= to_year
-            assert song.year >= from_year
-            assert song.id in [s.id for s in songs_with_target_year]
+            assert 2015 <= song.year <= 2025
 
     def test_get_random_songs_from_year_eaual_to_year(self):
-        songs = []
-        songs_with_target_year = []
-        target_year = 2025
-        for i in range(1, 11):
-            song = create_track_entity(i)
-            song.year = "2021"
-            songs.append(song)
-
-        for i in range(11, 16):
-            song = create_track_entity(i)
-            song.year = "2025"
-            songs_with_target_year.append(song)
-        self.track_service.track_db_helper.get_all_tracks = MagicMock(
-            return_value=songs + songs_with_target_year
-        )
+        self.set_songs(["2021"] * 10 + ["2025"] * 5, [None] * 12 + ["Genre"] * 3)
+        result = self.track_service.get_random_songs(from_year="2025", to_year="2025")
+        assert len(result) == 5
+        self.check_random_songs(result, list(range(11, 16)))
+
         result = self.track_service.get_random_songs(
-            from_year=str(target_year), to_year=str(target_year)
+            genre="Genre", from_year="2025", to_year="2025"
         )
-        assert len(result) == len(songs_with_target_year)
-        for song in result:
-            assert isinstance(song, dto.Track)
-            assert song.year == target_year
-            assert song.id in [s.id for s in songs_with_target_year]
+        self.check_random_songs(result, list(range(13, 16)))
+        assert len(result) == 3
+
+    def test_get_random_songs_is_proportional_to_size(self):
+        self.set_songs(["2020"] * 300)
+        with patch.object(
+            self.session, "execute", wraps=self.session.execute
+        ) as execute:
+            result = self.track_service.get_random_songs(size=3)
+        assert len(result) == 3
+        # Границы id и поиски от случайных id, без ORDER BY random() по таблице
+        statements = [str(call.args[0]) for call in execute.call_args_list]
+        assert not any("random()" in statement for statement in statements)
+
+    def test_get_random_songs_with_filter_is_uniform(self):
+        # 100 альбомов по 10 треков с идущими подряд id, подходит каждый десятый
+        albums = 100
+        self.set_songs(
+            [("2000" if i // 10 % 10 == 0 else "2010") for i in range(albums * 10)],
+            [("Rock" if i // 10 % 10 == 0 else "Pop") for i in range(albums * 10)],
+        )
+        for track in self.session.exec(select(db.Track)).all():
+            track.album_position = (track.id - 1) % 10 + 1
+        self.session.commit()
+
+        for filters in [
+            {"genre": "Rock"},
+            {"from_year": "2000", "to_year": "2000"},
+        ]:
+            positions = Counter()
+            for _ in range(100):
+                result = self.track_service.get_random_songs(size=10, **filters)
+                assert len(result) == 10
+                tracks = [self.session.get(db.Track, song.id) for song in result]
+                positions.update(track.album_position for track in tracks)
+            # Около 100 на каждую позицию в альбоме, а не чаще первый трек альбома
+            assert sorted(positions) == list(range(1, 11))
+            assert all(50 < count < 150 for count in positions.values()), positions
 
     def test_extract_lyrics_no_track(self):
         self.track_service.track_db_helper.get_track_by_id = MagicMock(
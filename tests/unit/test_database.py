@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import inspect, text
+from sqlmodel import Session, create_engine, select
+
+from src.app import database as db
+
+
+def add_user(engine, login: str) -> None:
+    with Session(engine) as session:
+        session.add(db.User(login=login, password="", avatar=""))
+        session.commit()
+
+
+def get_logins(engine) -> list[str]:
+    with Session(engine) as session:
+        return list(session.exec(select(db.User.login)).all())
+
+
+def get_schema_version(engine) -> int:
+    with Session(engine) as session:
+        return session.exec(select(db.SchemaVersion.version)).one()
+
+
+def test_init_db_keeps_data(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    with patch.object(db, "engine", engine):
+        db.init_db()
+        add_user(engine, "admin")
+        db.init_db()
+
+    assert get_logins(engine) == ["admin"]
+    assert get_schema_version(engine) == len(db.MIGRATIONS)
+
+
+def test_init_db_reset(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    with patch.object(db, "engine", engine):
+        db.init_db()
+        add_user(engine, "admin")
+        with patch.object(db, "RESET_DATABASE", True):
+            db.init_db()
+
+    assert get_logins(engine) == []
+
+
+def test_init_db_recreates_unversioned_database(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE "Tracks" (id INTEGER PRIMARY KEY)'))
+
+    with patch.object(db, "engine", engine):
+        db.init_db()
+
+    columns = [column["name"] for column in inspect(engine).get_columns("Tracks")]
+    assert "cover_hash" in columns
+    assert get_schema_version(engine) == len(db.MIGRATIONS)
+
+
+def test_init_db_applies_pending_migrations(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    applied, pending = MagicMock(), MagicMock()
+    with patch.object(db, "engine", engine):
+        with patch.object(db, "MIGRATIONS", [applied]):
+            db.init_db()
+            add_user(engine, "admin")
+        with patch.object(db, "MIGRATIONS", [applied, pending]):
+            db.init_db()
+
+    applied.assert_not_called()
+    pending.assert_called_once()
+    assert get_logins(engine) == ["admin"]
+    assert get_schema_version(engine) == 2
+
+
+def test_create_db_engine_pragmas(tmp_path: Path):
+    engine = db.create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    with engine.connect() as connection:
+        pragmas = {
+            name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in ["journal_mode", "synchronous", "temp_store", "busy_timeout"]
+        }
+    assert pragmas == {
+        "journal_mode": "wal",
+        "synchronous": 1,
+        "temp_store": 2,
+        "busy_timeout": 5000,
+    }
+
+
+def test_create_db_engine_threads(tmp_path: Path):
+    engine = db.create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    db.SQLModel.metadata.create_all(engine)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: add_user(engine, f"user{i}"), range(32)))
+
+    assert len(get_logins(engine)) == 32
+
+
+def test_init_db_upgrades_version_0(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    schema = (Path(__file__).parent / "schema_v0.sql").read_text()
+    with engine.begin() as connection:
+        connection.connection.executescript(schema)
+        for statement in [
+            'INSERT INTO "Schema_Version" VALUES (1, 0)',
+            "INSERT INTO \"Artists\" (id, name) VALUES (7, 'artist')",
+            "INSERT INTO \"Genres\" (id, name) VALUES (1, 'rock')",
+            """INSERT INTO "Albums" (id, name, album_artist_id, total_tracks,
+            play_count) VALUES (1, 'album', NULL, 2, 0)""",
+            'INSERT INTO "Artist_Albums" VALUES (7, 1)',
+            """INSERT INTO "Tracks" (id, file_path, file_size, type, title,
+            album_id, plays_count, bit_rate, bits_per_sample, sample_rate,
+            channels, duration, year) VALUES (1, '1', 1, '', '', 1, 0, 1, 1, 1,
+            2, 30, '2001'), (2, '2', 1, '', '', 1, 0, 1, 1, 1, 2, 40, '1999')""",
+            'INSERT INTO "Genre_Tracks" VALUES (1, 1)',
+        ]:
+            connection.execute(text(statement))
+
+    with patch.object(db, "engine", engine):
+        db.init_db()
+
+    assert get_schema_version(engine) == len(db.MIGRATIONS)
+    indexes = {
+        index["name"]
+        for table in inspect(engine).get_table_names()
+        for index in inspect(engine).get_indexes(table)
+    }
+    expected = {
+        str(index.name)
+        for table in db.SQLModel.metadata.sorted_tables
+        for index in table.indexes
+    }
+    assert expected <= indexes
+
+    with Session(engine) as session:
+        album = session.exec(select(db.Album)).one()
+        assert (album.duration, album.year, album.artist_id, album.artist_name) == (
+            70,
+            "1999",
+            7,
+            "artist",
+        )
+        assert [genre.name for genre in album.genres] == ["rock"]
+        index = session.exec(select(db.ArtistIndexEntry)).one()
+        assert (index.artist_id, index.album_count) == (7, 1)
+
+
+def test_init_db_adds_album_aggregates(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    with patch.object(db, "engine", engine):
+        db.init_db()
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """INSERT INTO "Albums" (id, name, album_artist_id, total_tracks,
+                play_count, duration, artist_name) VALUES (1, 'album', NULL, 2, 0, 0, '')"""
+            )
+        )
+        connection.execute(text("INSERT INTO \"Artists\" (id, name) VALUES (7, 'a')"))
+        connection.execute(text('INSERT INTO "Artist_Albums" VALUES (7, 1)'))
+        for id, year in [(1, "2001"), (2, "1999")]:
+            connection.execute(
+                text(
+                    f"""INSERT INTO "Tracks" (id, file_path, file_size, type, title,
+                    album_id, plays_count, bit_rate, bits_per_sample, sample_rate,
+                    channels, duration, year) VALUES ({id}, '{id}', 1, '', '', 1,
+                    0, 1, 1, 1, 2, 30, '{year}')"""
+                )
+            )
+        # Схема версии 2: альбомы ещё без сводных данных
+        connection.execute(text('ALTER TABLE "Albums" RENAME TO "Old_Albums"'))
+        connection.execute(
+            text(
+                'CREATE TABLE "Albums" AS SELECT id, name, album_artist_id, '
+                'total_tracks, year, cover_hash, play_count FROM "Old_Albums"'
+            )
+        )
+        connection.execute(text('DROP TABLE "Old_Albums"'))
+        connection.execute(text('UPDATE "Schema_Version" SET version = 2'))
+
+    with patch.object(db, "engine", engine):
+        db.init_db()
+
+    with Session(engine) as session:
+        album = session.exec(select(db.Album)).one()
+        assert (album.duration, album.year, album.artist_id) == (60, "1999", 7)
+        assert album.artist_name == "a"
+    assert get_schema_version(engine) == len(db.MIGRATIONS)
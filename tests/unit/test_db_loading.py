@@ -1,9 +1,27 @@
+import hashlib
+import os
 import pytest
+from pathlib import Path
+from unittest.mock import patch
 from mutagen.flac import FLAC
 from mutagen.mp3 import MP3
 from mutagen.id3 import TIT2, TPE1, TPE2, TALB, TCON, TRCK, TDRC  # type: ignore[attr-defined]
+from sqlmodel import Session, select
 
+from src.app import database as db
+from src.app import db_helpers
 from src.app import db_loading
+from src.app import open_subsonic_api
+from src.app import utils
+
+from tests.unit.fixtures import (
+    engine,
+    get_track_titles,
+    make_cover,
+    make_flac,
+    make_library,
+    sqlite_only,
+)
 
 
 TEST_MP3_FILE = "tracks/MACAN_-_I_AM_78125758.mp3"
@@ -321,3 +339,406 @@ def test_extract_metadata_flac(
     assert audio_info.genres == exp_genres
     assert audio_info.track_number == exp_track_number
     assert audio_info.year == exp_year
+
+
+@pytest.mark.parametrize("workers", [1, 2, 4])
+def test_scan_directory_for_audio_files(tmp_path: Path, workers: int):
+    expected_titles = make_library(tmp_path)
+
+    audio_files = db_loading.scan_directory_for_audio_files(str(tmp_path), workers)
+
+    assert [audio_info.title for audio_info in audio_files] == expected_titles
+    assert all(audio_info.type == "audio/flac" for audio_info in audio_files)
+    assert all(audio_info.duration == 60 for audio_info in audio_files)
+    assert all(len(audio_info.cover) > 0 for audio_info in audio_files)
+
+
+def test_scan_workers_are_not_forked():
+    # fork из многопоточного процесса может унаследовать чужие блокировки
+    assert db_loading.SCAN_MP_CONTEXT.get_start_method() != "fork"
+
+
+def test_scan_directory_for_audio_files_is_lazy(tmp_path: Path):
+    make_library(tmp_path)
+
+    with patch.object(
+        db_loading, "parse_audio_file", wraps=db_loading.parse_audio_file
+    ) as parse_mock:
+        audio_files = db_loading.scan_directory_for_audio_files(str(tmp_path), 1)
+        assert parse_mock.call_count == 0
+
+        assert next(audio_files).title == "a"
+        assert parse_mock.call_count == 1
+
+
+@pytest.mark.parametrize(
+    "batch_size, expected_counts",
+    [
+        (1, [0, 1, 2]),
+        (2, [0, 0, 2]),
+        (200, [0, 0, 0]),
+    ],
+)
+def test_scan_and_load_streams_into_db(
+    tmp_path: Path, engine, batch_size: int, expected_counts: list[int]
+):
+    library = tmp_path / "tracks"
+    make_library(library)
+
+    loaded_counts = []
+    load = db_loading.BulkLoader.load
+
+    def load_and_count(loader, audio_info):
+        with Session(engine) as other_session:
+            loaded_counts.append(len(other_session.exec(select(db.Track)).all()))
+        load(loader, audio_info)
+
+    with patch.object(
+        db_loading.BulkLoader, "load", autospec=True, side_effect=load_and_count
+    ):
+        db_loading.scan_and_load(str(library), workers=2, batch_size=batch_size)
+
+    assert loaded_counts == expected_counts
+    assert get_track_titles(engine) == ["a", "b1", "b2"]
+
+
+def test_parse_audio_file_unsupported(tmp_path: Path):
+    make_library(tmp_path)
+
+    assert db_loading.parse_audio_file(str(tmp_path / "broken.mp3")) is None
+    assert db_loading.parse_audio_file(str(tmp_path / "cover.txt")) is None
+
+
+def test_incremental_scan(tmp_path: Path, engine):
+    library = tmp_path / "tracks"
+    make_library(library)
+
+    db_loading.scan_and_load(str(library), workers=1, incremental=True)
+    assert get_track_titles(engine) == ["a", "b1", "b2"]
+
+    with patch.object(
+        db_loading, "parse_audio_files", wraps=db_loading.parse_audio_files
+    ) as parse_mock:
+        db_loading.scan_and_load(str(library), workers=1, incremental=True)
+        parse_mock.assert_called_once_with([], 1)
+    assert get_track_titles(engine) == ["a", "b1", "b2"]
+
+    make_flac(library / "b" / "1.flac", TITLE="b1 (edit)", ARTIST="artist", ALBUM="b")
+    os.utime(library / "b" / "1.flac", (1, 1))
+    make_flac(library / "c.flac", TITLE="c", ARTIST="artist", ALBUM="c")
+    os.remove(library / "a.flac")
+
+    with patch.object(
+        db_loading, "parse_audio_files", wraps=db_loading.parse_audio_files
+    ) as parse_mock:
+        db_loading.scan_and_load(str(library), workers=1, incremental=True)
+        parse_mock.assert_called_once_with(
+            [str(library / "c.flac"), str(library / "b" / "1.flac")], 1
+        )
+    assert get_track_titles(engine) == ["b1 (edit)", "b2", "c"]
+
+    with Session(engine) as session:
+        albums = {
+            album.name: album.total_tracks
+            for album in session.exec(select(db.Album)).all()
+        }
+        assert albums == {"b": 2, "c": 1}
+        assert session.exec(select(db.ArtistTrack)).all() != []
+        assert all(
+            link.track_id != 1 for link in session.exec(select(db.ArtistTrack)).all()
+        )
+
+
+def test_scan_of_missing_library_keeps_tracks(tmp_path: Path, engine):
+    library = tmp_path / "tracks"
+    make_library(library)
+    db_loading.scan_and_load(str(library), workers=1, incremental=True)
+
+    # Каталог не смонтирован: библиотека в БД не меняется
+    library.rename(tmp_path / "unmounted")
+    db_loading.scan_and_load(str(library), workers=1, incremental=True)
+    library.write_text("not a directory")
+    db_loading.scan_and_load(str(library), workers=1, full=True)
+
+    assert get_track_titles(engine) == ["a", "b1", "b2"]
+    assert db_loading.scanStatus["scanning"] is False
+
+
+def test_full_scan(tmp_path: Path, engine):
+    make_library(tmp_path)
+    db_loading.scan_and_load(str(tmp_path), workers=1)
+    os.remove(tmp_path / "a.flac")
+
+    with patch.object(
+        db_loading, "parse_audio_files", wraps=db_loading.parse_audio_files
+    ) as parse_mock:
+        db_loading.scan_and_load(str(tmp_path), workers=1, full=True)
+        parsed = parse_mock.call_args.args[0]
+    # Неизменённые файлы перечитываются, исчезнувшие удаляются
+    assert {str(tmp_path / "b" / "1.flac"), str(tmp_path / "b" / "2.flac")} <= set(
+        parsed
+    )
+    assert get_track_titles(engine) == ["b1", "b2"]
+
+
+def test_rebuild_library_without_sqlite(tmp_path: Path, engine):
+    with patch.object(engine.dialect, "name", "postgresql"), patch.object(
+        db_loading, "scan_and_load"
+    ) as scan_mock:
+        db_loading.rebuild_library(str(tmp_path), workers=1)
+    scan_mock.assert_called_once_with(
+        str(tmp_path), 1, full=True, batch_size=db_loading.LOAD_BATCH_SIZE
+    )
+
+
+def get_album_aggregates(engine, name: str) -> tuple[int, str | None, str, list[str]]:
+    with Session(engine) as session:
+        album = session.exec(select(db.Album).where(db.Album.name == name)).one()
+        artist = session.get(db.Artist, album.artist_id)
+        assert artist is not None
+        return (
+            album.duration,
+            album.year,
+            artist.name,
+            sorted(genre.name for genre in album.genres),
+        )
+
+
+def test_album_aggregates(tmp_path: Path, engine):
+    make_flac(tmp_path / "b" / "1.flac", TITLE="1", ARTIST="x", ALBUM="b", DATE="2001")
+    make_flac(
+        tmp_path / "b" / "2.flac",
+        TITLE="2",
+        ARTIST="y",
+        ALBUM="b",
+        DATE="1999",
+        GENRE=["rock", "pop"],
+    )
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+    assert get_album_aggregates(engine, "b") == (120, "1999", "x", ["pop", "rock"])
+
+    # Исполнитель альбома из тегов важнее исполнителей треков
+    make_flac(
+        tmp_path / "b" / "3.flac",
+        TITLE="3",
+        ARTIST="x",
+        ALBUMARTIST="z",
+        ALBUM="b",
+        DATE="2005",
+        GENRE="jazz",
+    )
+    (tmp_path / "b" / "2.flac").unlink()
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+    assert get_album_aggregates(engine, "b") == (120, "2001", "z", ["jazz"])
+
+    # Трек переносится в другой альбом
+    make_flac(tmp_path / "b" / "1.flac", TITLE="1", ARTIST="x", ALBUM="c")
+    os.utime(tmp_path / "b" / "1.flac", (1, 1))
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+    assert get_album_aggregates(engine, "b") == (60, "2005", "z", ["jazz"])
+    assert get_album_aggregates(engine, "c") == (60, None, "x", [])
+
+
+def test_retagged_album_is_deleted_when_empty(tmp_path: Path, engine):
+    make_flac(tmp_path / "1.flac", TITLE="1", ARTIST="x", ALBUM="old")
+    make_flac(tmp_path / "2.flac", TITLE="2", ARTIST="x", ALBUM="old")
+    make_flac(tmp_path / "3.flac", TITLE="3", ARTIST="y", ALBUM="other")
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+    with Session(engine) as session:
+        old_id = session.exec(select(db.Album.id).where(db.Album.name == "old")).one()
+        user = db.User(login="user", password="", avatar="")
+        session.add(db.FavouriteAlbum(user=user, album_id=old_id, added_at=""))
+        session.commit()
+
+    # Все треки альбома переносятся к другому исполнителю в новый альбом
+    for name in ["1.flac", "2.flac"]:
+        make_flac(tmp_path / name, TITLE=name, ARTIST="y", ALBUM="new")
+        os.utime(tmp_path / name, (1, 1))
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+
+    with Session(engine) as session:
+        albums = session.exec(select(db.Album.name, db.Album.total_tracks)).all()
+        assert sorted(albums) == [("new", 2), ("other", 1)]
+        for link_table in [db.ArtistAlbum, db.GenreAlbum, db.FavouriteAlbum]:
+            assert (
+                session.exec(
+                    select(link_table).where(link_table.album_id == old_id)  # type: ignore[attr-defined]
+                ).all()
+                == []
+            )
+
+        album_counts = session.exec(
+            select(db.Artist.name, db.ArtistIndexEntry.album_count).join(
+                db.Artist, db.Artist.id == db.ArtistIndexEntry.artist_id  # type: ignore[arg-type]
+            )
+        ).all()
+        # Исполнитель без треков и альбомов удаляется
+        assert sorted(album_counts) == [("y", 2)]
+        assert session.exec(select(db.Artist.name)).all() == ["y"]
+
+
+def test_unlinked_catalog_is_deleted(tmp_path: Path, engine):
+    make_flac(tmp_path / "1.flac", TITLE="1", ARTIST="stay", ALBUM="a", GENRE="rock")
+    make_flac(
+        tmp_path / "2.flac",
+        TITLE="2",
+        ARTIST=["stay", "gone"],
+        ALBUM="b",
+        GENRE=["rock", "jazz"],
+        **{"TXXX:mood": "mood; calm"},
+    )
+    make_flac(tmp_path / "3.flac", TITLE="3", ARTIST="retagged", ALBUM="c")
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+    with Session(engine) as session:
+        gone_id = session.exec(
+            select(db.Artist.id).where(db.Artist.name == "gone")
+        ).one()
+        user = db.User(login="user", password="", avatar="")
+        session.add(db.FavouriteArtist(user=user, artist_id=gone_id, added_at=""))
+        session.commit()
+
+    (tmp_path / "2.flac").unlink()
+    make_flac(tmp_path / "3.flac", TITLE="3", ARTIST="stay", ALBUM="a")
+    os.utime(tmp_path / "3.flac", (1, 1))
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+
+    with Session(engine) as session:
+        assert session.exec(select(db.Artist.name)).all() == ["stay"]
+        assert session.exec(select(db.Genre.name)).all() == ["rock"]
+        assert session.exec(select(db.CustomTag)).all() == []
+        assert session.exec(select(db.FavouriteArtist)).all() == []
+        index_ids = session.exec(select(db.ArtistIndexEntry.artist_id)).all()
+        assert gone_id not in index_ids
+        assert len(index_ids) == 1
+
+        artist_helper = db_helpers.ArtistDBHelper(session)
+        assert artist_helper.search_artists('"gone"*', 10, 0) == []
+
+
+def test_covers_are_deduplicated(tmp_path: Path, engine):
+    red, blue = make_cover("red"), make_cover("blue")
+    make_flac(tmp_path / "a" / "1.flac", cover=red, TITLE="a1", ALBUM="a")
+    make_flac(tmp_path / "a" / "2.flac", cover=red, TITLE="a2", ALBUM="a")
+    make_flac(tmp_path / "b" / "1.flac", cover=blue, TITLE="b1", ALBUM="b")
+    make_flac(tmp_path / "c.flac", TITLE="c", ALBUM="c")
+    db_loading.scan_and_load(str(tmp_path), workers=1)
+
+    # Треки без обложки ссылаются на одну общую обложку по умолчанию
+    default_hash = hashlib.sha256(utils.get_cover_preview(None)[0]).hexdigest()
+
+    with Session(engine) as session:
+        assert len(session.exec(select(db.Cover)).all()) == 3
+
+        track_hashes = dict(
+            session.exec(select(db.Track.title, db.Track.cover_hash)).all()
+        )
+        album_hashes = dict(
+            session.exec(select(db.Album.name, db.Album.cover_hash)).all()
+        )
+        assert track_hashes["a1"] == track_hashes["a2"] == album_hashes["a"]
+        assert track_hashes["b1"] == album_hashes["b"] != album_hashes["a"]
+        assert track_hashes["c"] == album_hashes["c"] == default_hash
+
+        album_id = session.exec(select(db.Album.id).where(db.Album.name == "a")).one()
+        response = open_subsonic_api.get_cover_art(
+            id=f"al-{album_id}", size=64, session=session
+        )
+        assert response.headers["ETag"] == f'"{album_hashes["a"]}-64"'
+        assert utils.bytes_to_image(response.body).size == (64, 64)
+
+    (tmp_path / "b" / "1.flac").unlink()
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+
+    with Session(engine) as session:
+        hashes = session.exec(select(db.Cover.hash)).all()
+    assert sorted(hashes) == sorted([album_hashes["a"], default_hash])
+
+
+@sqlite_only
+def test_rebuild_library(tmp_path: Path, engine):
+    make_library(tmp_path)
+    db_loading.scan_and_load(str(tmp_path), workers=1)
+    with Session(engine) as session:
+        tracks = {t.title: t for t in session.exec(select(db.Track)).all()}
+        album = session.exec(select(db.Album).where(db.Album.name == "b")).one()
+        artist = session.exec(select(db.Artist)).one()
+        user = db.User(login="user", password="", avatar="")
+        playlist = db.Playlist(name="p", user=user, total_tracks=2, create_date="")
+        session.add_all(
+            [
+                db.PlaylistTrack(playlist=playlist, track=tracks["b1"], added_at=""),
+                db.PlaylistTrack(playlist=playlist, track=tracks["b2"], added_at=""),
+                db.FavouriteTrack(user=user, track=tracks["a"], added_at="t"),
+                db.FavouriteAlbum(user=user, album=album, added_at="al"),
+                db.FavouriteArtist(user=user, artist=artist, added_at="ar"),
+                db.FavouritePlaylist(user=user, playlist=playlist, added_at="p"),
+            ]
+        )
+        tracks["a"].plays_count = 5
+        session.commit()
+        old_ids = {title: track.id for title, track in tracks.items()}
+        album_id = album.id
+
+    (tmp_path / "b" / "2.flac").unlink()
+    make_flac(tmp_path / "0.flac", TITLE="c", ARTIST="artist", ALBUM="c")
+
+    def swap_library(connection):
+        # До переключения запросы видят прежний каталог
+        assert get_track_titles(engine) == ["a", "b1", "b2"]
+        real_swap_library(connection)
+
+    real_swap_library = db_loading.swap_library
+    with patch.object(db_loading, "swap_library", side_effect=swap_library) as swap:
+        db_loading.rebuild_library(str(tmp_path), workers=1)
+    swap.assert_called_once()
+
+    assert get_track_titles(engine) == ["a", "b1", "c"]
+    with Session(engine) as session:
+        tracks = {t.title: t for t in session.exec(select(db.Track)).all()}
+        assert tracks["a"].id == old_ids["a"]
+        assert tracks["b1"].id == old_ids["b1"]
+        assert tracks["c"].id > max(old_ids.values())
+        assert tracks["a"].plays_count == 5
+        assert session.exec(select(db.Album.id).where(db.Album.name == "b")).one() == (
+            album_id
+        )
+
+        playlist = session.exec(select(db.Playlist)).one()
+        assert playlist.total_tracks == 1
+        assert [t.track.title for t in playlist.playlist_tracks] == ["b1"]
+
+        user = session.exec(select(db.User)).one()
+        assert [f.track.title for f in user.favourite_tracks] == ["a"]
+        assert [f.album.name for f in user.favourite_albums] == ["b"]
+        assert [f.artist.name for f in user.favourite_artists] == ["artist"]
+        assert [f.playlist.name for f in user.favourite_playlists] == ["p"]
+
+        # Поисковый индекс следует за подменой каталога
+        track_helper = db_helpers.TrackDBHelper(session)
+        assert [t.title for t in track_helper.search_tracks('"b"*', 10, 0)] == ["b1"]
+        assert [t.title for t in track_helper.search_tracks('"c"*', 10, 0)] == ["c"]
+
+
+def test_rebuild_library_of_missing_library(tmp_path: Path, engine):
+    library = tmp_path / "tracks"
+    titles = make_library(library)
+    db_loading.scan_and_load(str(library), workers=1)
+    library.rename(tmp_path / "unmounted")
+
+    with patch.object(db_loading, "swap_library") as swap:
+        db_loading.rebuild_library(str(library), workers=1)
+    swap.assert_not_called()
+
+    assert get_track_titles(engine) == titles
+    assert db_loading.scanStatus["scanning"] is False
+
+
+def test_rebuild_library_stopped(tmp_path: Path, engine):
+    titles = make_library(tmp_path)
+    db_loading.scan_and_load(str(tmp_path), workers=1)
+    make_flac(tmp_path / "c.flac", TITLE="c", ALBUM="c")
+
+    with patch.object(db_loading.scan_stop, "is_set", return_value=True):
+        db_loading.rebuild_library(str(tmp_path), workers=1)
+
+    assert get_track_titles(engine) == titles
@@ -0,0 +1,85 @@
+import logging
+import pytest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, text
+
+from src.app import db_metrics
+from src.app.app import app
+from tests.unit.fixtures import engine
+
+
+@pytest.fixture
+def client(engine):
+    db_metrics.instrument(engine)
+    with patch.dict(db_metrics.endpoint_stats, clear=True):
+        yield TestClient(app)
+
+
+def test_server_timing(client):
+    with patch.object(db_metrics, "SERVER_TIMING", True):
+        response = client.get("/rest/getGenres")
+    assert response.status_code == 200
+    assert 'desc="1 queries"' in response.headers["Server-Timing"]
+
+    response = client.get("/rest/getGenres")
+    assert "Server-Timing" not in response.headers
+
+
+def test_metrics_endpoint(client):
+    client.get("/rest/getGenres")
+    client.get("/rest/getGenres")
+    client.get("/rest/unknown")
+
+    with patch.object(db_metrics, "SERVER_TIMING", True):
+        metrics = client.get("/metrics/db").json()
+    assert list(metrics.keys()) == ["/rest/getGenres"]
+    genres = metrics["/rest/getGenres"]
+    assert genres["requests"] == 2
+    assert genres["queries"] == 2
+    assert genres["maxQueries"] == 1
+    assert "slowest" not in genres
+
+    with patch.object(db_metrics, "SERVER_TIMING", True), patch.object(
+        db_metrics, "METRICS_SQL", True
+    ):
+        metrics = client.get("/metrics/db").json()
+    assert '"Genres"' in metrics["/rest/getGenres"]["slowest"]
+
+
+def test_metrics_endpoint_is_disabled_by_default(client):
+    client.get("/rest/getGenres")
+    assert client.get("/metrics/db").status_code == 404
+
+
+def test_queries_outside_requests_are_not_counted(client, engine):
+    with Session(engine) as session:
+        session.execute(text("SELECT 1"))
+    with patch.object(db_metrics, "SERVER_TIMING", True):
+        assert client.get("/metrics/db").json() == {}
+
+
+def test_slow_query_log(client, engine, caplog):
+    with Session(engine) as session:
+        with patch.object(db_metrics, "SLOW_QUERY_MS", 1e-6):
+            with caplog.at_level(logging.WARNING, logger=db_metrics.__name__):
+                session.execute(text("SELECT :value"), {"value": 42})
+    assert "Slow query" in caplog.text
+    assert "42" in caplog.text
+
+    caplog.clear()
+    with Session(engine) as session:
+        with patch.object(db_metrics, "SLOW_QUERY_MS", 0):
+            session.execute(text("SELECT 1"))
+    assert "Slow query" not in caplog.text
+
+
+def test_failed_query_does_not_break_timing(engine):
+    db_metrics.instrument(engine)
+    with Session(engine) as session:
+        with pytest.raises(Exception):
+            session.execute(text("SELECT * FROM missing_table"))
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert connection.info.get("query_start") == []
@@ -14,8 +14,6 @@ from src.app.service_layer import (
     fill_genre_items,
     fill_track,
     fill_tracks,
-    fill_genre,
-    fill_genres,
     fill_artists,
     fill_playlist,
     fill_playlists,
@@ -76,8 +74,6 @@ class TestMusicFunctions(unittest.TestCase):
         self.assertIsNone(artist.starred)
         self.assertEqual(artist.albums, [])
 
-    @patch("src.app.service_layer.get_album_genres")
-    @patch("src.app.service_layer.get_tracklist_duration")
     @patch("src.app.service_layer.join_artist_names")
     @patch("src.app.service_layer.get_album_artist_id_by_album")
     @patch("src.app.service_layer.join_genre_names")
@@ -90,12 +86,10 @@ class TestMusicFunctions(unittest.TestCase):
         mock_join_genre_names,
         mock_get_album_artist_id_by_album,
         mock_join_artist_names,
-        mock_get_tracklist_duration,
-        mock_get_album_genres,
     ):
         mock_db_album = self.create_mock_album()
-        mock_get_album_genres.return_value = []
-        mock_get_tracklist_duration.return_value = 3600
+        mock_db_album.genres = []
+        mock_db_album.duration = 3600
         mock_join_artist_names.return_value = "Test Artist"
         mock_get_album_artist_id_by_album.return_value = 2
         mock_join_genre_names.return_value = ""
@@ -233,24 +227,6 @@ class TestMusicFunctions(unittest.TestCase):
         result = fill_tracks(mock_db_tracks, db.User(id=1, name="Test User"))
         self.assertEqual(len(result), 2)
 
-    def test_fill_genre(self):
-        mock_db_track = self.create_mock_track()
-        mock_genre = MagicMock()
-        mock_genre.name = "Rock"
-        mock_genre.tracks = [mock_db_track, mock_db_track]
-        result = fill_genre(mock_genre)
-        self.assertEqual(result.name, "Rock")
-        self.assertEqual(result.albumCount, 1)
-        self.assertEqual(result.songCount, 2)
-
-    def test_fill_genres(self):
-        mock_genre = MagicMock()
-        mock_genre.name = "Rock"
-        db_genres = [mock_genre]
-        result = fill_genres(db_genres)
-        self.assertEqual(len(result), 1)
-        self.assertEqual(result[0].name, "Rock")
-
     def test_fill_artists(self):
         db_artists = [self.create_mock_artist()]
         result = fill_artists(db_artists, db.User(id=1, name="Test User"))
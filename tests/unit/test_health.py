@@ -0,0 +1,54 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from src.app import db_loading
+from src.app import health
+from src.app.app import app
+
+
+def test_live():
+    response = TestClient(app).get("/health/live")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_ready():
+    session = MagicMock()
+    with patch.dict(db_loading.scanStatus, {"scanning": True, "count": 42}):
+        response = health.ready(session=session)
+    assert response.status_code == 200
+    assert b'"scanning":true' in response.body
+    assert b'"count":42' in response.body
+
+
+def test_ready_database_unavailable():
+    session = MagicMock()
+    session.execute.side_effect = Exception("database is locked")
+    response = health.ready(session=session)
+    assert response.status_code == 503
+
+
+@patch("src.app.app.create_default_user")
+@patch("src.app.app.init_db")
+def test_lifespan_runs_scan_in_background(mock_init_db, mock_create_default_user):
+    scan_started = threading.Event()
+    scan_stopped = threading.Event()
+
+    def scan_and_load(incremental: bool) -> None:
+        scan_started.set()
+        # Сканирование продолжается, пока приложение не остановят
+        if db_loading.scan_stop.wait(timeout=10):
+            scan_stopped.set()
+
+    with patch.object(db_loading, "scan_and_load", side_effect=scan_and_load):
+        with TestClient(app) as client:
+            assert scan_started.wait(timeout=10)
+            assert client.get("/health/live").status_code == 200
+            assert not scan_stopped.is_set()
+
+    mock_init_db.assert_called_once()
+    mock_create_default_user.assert_called_once()
+    assert scan_stopped.is_set()
+    assert not db_loading.scan_stop.is_set()
@@ -0,0 +1,126 @@
+import pytest
+from typing import Any
+
+from sqlmodel import Session
+
+from src.app import database as db
+from src.app.service_layer import AlbumService, RequestType, encode_cursor
+from tests.unit.fixtures import engine
+
+
+def fill_albums(engine) -> None:
+    genre = db.Genre(id=1, name="rock")
+    with Session(engine) as session:
+        session.add(genre)
+        session.add_all([db.Artist(id=i, name=f"artist{i % 2}") for i in range(1, 4)])
+        for i in range(1, 12):
+            session.add_all(
+                [
+                    # Повторяющиеся имена, годы и счётчики проверяют порядок по id
+                    db.Album(
+                        id=i,
+                        name=f"album{i % 4}",
+                        total_tracks=1,
+                        year=str(2000 + i % 3),
+                        play_count=i % 2,
+                    ),
+                    db.Track(
+                        id=i,
+                        file_path=f"tracks/{i}.mp3",
+                        file_size=1,
+                        type="audio/mpeg",
+                        title=f"track{i}",
+                        album_id=i,
+                        album_artist_id=None,
+                        album_position=1,
+                        year=str(2000 + i % 3),
+                        plays_count=0,
+                        bit_rate=1,
+                        bits_per_sample=1,
+                        sample_rate=1,
+                        channels=2,
+                        duration=1,
+                    ),
+                    db.GenreTrack(genre_id=1, track_id=i),
+                    db.ArtistAlbum(artist_id=1 + i % 3, album_id=i),
+                ]
+            )
+        session.flush()
+        db.update_album_aggregates(session.connection())
+        session.commit()
+
+
+LISTS: dict[str, dict[str, Any]] = {
+    "alphabeticalByName": {"type": RequestType.BY_NAME},
+    "alphabeticalByArtist": {"type": RequestType.BY_ARTIST},
+    "byYear": {"type": RequestType.BY_YEAR, "from_year": "2000", "to_year": "2002"},
+    "byYear reversed": {
+        "type": RequestType.BY_YEAR,
+        "from_year": "2002",
+        "to_year": "2000",
+    },
+    "byGenre": {"type": RequestType.BY_GENRE, "genre": "rock"},
+    "frequent": {"type": RequestType.FREQUENT},
+}
+
+
+@pytest.mark.parametrize("name", LISTS.keys())
+def test_cursor_pages_match_offset_pages(engine, name: str):
+    fill_albums(engine)
+    with Session(engine) as session:
+        service = AlbumService(session)
+        expected = []
+        for offset in range(0, 11, 3):
+            page = service.get_album_list_page(size=3, offset=offset, **LISTS[name])
+            assert page is not None
+            expected.append([album.id for album in page[0]])
+
+        pages = []
+        cursor = None
+        while True:
+            page = service.get_album_list_page(size=3, cursor=cursor, **LISTS[name])
+            assert page is not None
+            albums, cursor = page
+            pages.append([album.id for album in albums])
+            if cursor is None:
+                break
+
+    assert pages == expected
+    assert sorted(sum(pages, [])) == list(range(1, 12))
+
+
+@pytest.mark.parametrize("size, offset", [(11, 0), (3, 0), (3, 4), (5, 9), (3, 11)])
+def test_albums_by_artist_order(engine, size: int, offset: int):
+    fill_albums(engine)
+    # Порядок (artist_name, name, id): исполнители "artist0" у альбомов
+    # с i % 3 == 1, "artist1" у остальных
+    expected = [4, 1, 10, 7, 8, 5, 9, 2, 6, 3, 11]
+    with Session(engine) as session:
+        albums = AlbumService(session).get_album_list(
+            RequestType.BY_ARTIST, size=size, offset=offset
+        )
+    assert albums is not None
+    assert [album.id for album in albums] == expected[offset : offset + size]
+
+
+def test_cursor_is_rejected_for_other_list(engine):
+    fill_albums(engine)
+    with Session(engine) as session:
+        service = AlbumService(session)
+        page = service.get_album_list_page(RequestType.BY_NAME, size=3)
+        assert page is not None and page[1] is not None
+
+        assert service.get_album_list_page(RequestType.FREQUENT, cursor=page[1]) is None
+        assert service.get_album_list_page(RequestType.RANDOM, cursor=page[1]) is None
+        assert service.get_album_list_page(RequestType.BY_NAME, cursor="!") is None
+        for key in [["a"], ["a", 1, 2], [{"x": 1}, 1], [["a"], 1]]:
+            cursor = encode_cursor(RequestType.BY_NAME, key)
+            assert (
+                service.get_album_list_page(RequestType.BY_NAME, cursor=cursor) is None
+            )
+        assert (
+            service.get_album_list_page(
+                RequestType.BY_NAME, cursor=encode_cursor(RequestType.BY_YEAR, [])
+            )
+            is None
+        )
@@ -0,0 +1,168 @@
+import gc
+import pytest
+from pathlib import Path
+from typing import Any, Callable
+from unittest.mock import patch
+
+from sqlalchemy import event
+from sqlmodel import Session, create_engine
+
+from src.app import database as db
+from src.app import service_layer
+
+# Число запросов каждого метода не должно зависеть от размера ответа
+SMALL_LIBRARY = 2
+LARGE_LIBRARY = 8
+
+
+def fill_database(session: Session, albums: int) -> None:
+    user = db.User(id=1, login="admin", password="", avatar="")
+    genre = db.Genre(id=1, name="rock")
+    playlist = db.Playlist(
+        id=1, name="playlist", user_id=1, total_tracks=2 * albums, create_date=""
+    )
+    session.add_all([user, genre, playlist])
+    for i in range(1, albums + 1):
+        session.add_all(
+            [
+                db.Artist(id=i, name=f"artist{i}"),
+                db.Album(
+                    id=i,
+                    name=f"album{i}",
+                    album_artist_id=i,
+                    total_tracks=2,
+                    year="2020",
+                    play_count=i,
+                ),
+                db.ArtistAlbum(artist_id=i, album_id=i),
+                db.FavouriteAlbum(user_id=1, album_id=i, added_at="2020-01-01"),
+                db.FavouriteArtist(user_id=1, artist_id=i, added_at="2020-01-01"),
+            ]
+        )
+        for track_id in [2 * i - 1, 2 * i]:
+            session.add_all(
+                [
+                    db.Track(
+                        id=track_id,
+                        file_path=f"tracks/{track_id}.mp3",
+                        file_size=1,
+                        type="audio/mpeg",
+                        title=f"track{track_id}",
+                        album_id=i,
+                        album_artist_id=i,
+                        album_position=track_id,
+                        year="2020",
+                        plays_count=0,
+                        bit_rate=1,
+                        bits_per_sample=1,
+                        sample_rate=1,
+                        channels=2,
+                        duration=1,
+                    ),
+                    db.ArtistTrack(artist_id=i, track_id=track_id),
+                    db.GenreTrack(genre_id=1, track_id=track_id),
+                    db.PlaylistTrack(playlist_id=1, track_id=track_id, added_at=""),
+                    db.FavouriteTrack(
+                        user_id=1, track_id=track_id, added_at="2020-01-01"
+                    ),
+                ]
+            )
+    session.flush()
+    db.update_album_aggregates(session.connection())
+    db.update_artist_index(session.connection())
+    session.commit()
+
+
+def get_user(session: Session) -> db.User:
+    user = session.get(db.User, 1)
+    assert user is not None
+    return user
+
+
+AlbumList = service_layer.RequestType
+
+ENDPOINTS: dict[str, Callable[[Session], Any]] = {
+    "getAlbum": lambda s: service_layer.AlbumService(s).get_album_by_id(1),
+    "getAlbumList random": lambda s: service_layer.AlbumService(s).get_album_list(
+        AlbumList.RANDOM, size=100
+    ),
+    "getAlbumList alphabeticalByName": lambda s: service_layer.AlbumService(
+        s
+    ).get_album_list(AlbumList.BY_NAME, size=100),
+    "getAlbumList alphabeticalByArtist": lambda s: service_layer.AlbumService(
+        s
+    ).get_album_list(AlbumList.BY_ARTIST, size=100),
+    "getAlbumList byYear": lambda s: service_layer.AlbumService(s).get_album_list(
+        AlbumList.BY_YEAR, size=100, from_year="2000", to_year="2030"
+    ),
+    "getAlbumList byGenre": lambda s: service_layer.AlbumService(s).get_album_list(
+        AlbumList.BY_GENRE, size=100, genre="rock"
+    ),
+    "getAlbumList frequent": lambda s: service_layer.AlbumService(s).get_album_list(
+        AlbumList.FREQUENT, size=100
+    ),
+    "getSongsByGenre": lambda s: service_layer.TrackService(s).get_songs_by_genre(
+        "rock", count=100, db_user=get_user(s)
+    ),
+    "getRandomSongs": lambda s: service_layer.TrackService(s).get_random_songs(
+        size=100, db_user=get_user(s)
+    ),
+    "getGenres": lambda s: service_layer.GenreService(s).get_genres(),
+    "getStarred": lambda s: service_layer.StarService(s).get_starred(get_user(s)),
+    "getPlaylist": lambda s: service_layer.PlaylistService(s).get_playlist(
+        1, get_user(s)
+    ),
+    "getPlaylists": lambda s: service_layer.PlaylistService(s).get_playlists(
+        get_user(s)
+    ),
+    "getIndexes": lambda s: service_layer.IndexService(s).get_indexes_artists(),
+    "getIndexes with childs": lambda s: service_layer.IndexService(
+        s
+    ).get_indexes_artists(with_childs=True),
+    "search3": lambda s: service_layer.SearchService(s).search3(
+        "", 100, 0, 100, 0, 100, 0, get_user(s)
+    ),
+}
+
+
+def get_queries(tmp_path: Path, albums: int, endpoint: str) -> list[str]:
+    engine = create_engine(f"sqlite:///{tmp_path / f'{albums}.db'}")
+    with patch.object(db, "engine", engine):
+        db.init_db()
+    with Session(engine) as session:
+        fill_database(session, albums)
+
+    queries: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith("SELECT"):
+            queries.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    # Сборка мусора посреди запроса может освободить уже загруженные объекты
+    # сессии, и они загрузятся повторно, поэтому на время замера она отключена
+    gc.disable()
+    try:
+        with Session(engine) as session:
+            assert ENDPOINTS[endpoint](session)
+    finally:
+        gc.enable()
+    engine.dispose()
+    return queries
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS.keys())
+def test_query_count_does_not_grow(tmp_path: Path, endpoint: str):
+    assert len(get_queries(tmp_path, SMALL_LIBRARY, endpoint)) == len(
+        get_queries(tmp_path, LARGE_LIBRARY, endpoint)
+    )
+
+
+@pytest.mark.parametrize(
+    "endpoint",
+    [endpoint for endpoint in ENDPOINTS.keys() if endpoint.startswith("getAlbumList")],
+)
+def test_album_list_does_not_read_tracks(tmp_path: Path, endpoint: str):
+    # Длительность, жанры и исполнитель альбома хранятся в самом альбоме
+    for query in get_queries(tmp_path, SMALL_LIBRARY, endpoint):
+        assert '"Tracks"' not in query, query
@@ -0,0 +1,168 @@
+import pytest
+from typing import Any, Callable
+
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine
+
+from src.app import database as db
+from src.app import db_helpers
+
+# Запросы, которые по смыслу читают все треки
+FULL_SCAN_ALLOWED = ["get_all_tracks", "get_tracks"]
+
+
+def fill_database(session: Session) -> None:
+    user = db.User(id=1, login="admin", password="", avatar="")
+    artist = db.Artist(id=1, name="artist")
+    genre = db.Genre(id=1, name="rock")
+    album = db.Album(id=1, name="album", album_artist_id=1, total_tracks=1, year="2020")
+    track = db.Track(
+        id=1,
+        file_path="tracks/1.mp3",
+        file_size=1,
+        type="audio/mpeg",
+        title="track",
+        album_id=1,
+        album_artist_id=1,
+        album_position=1,
+        year="2020",
+        plays_count=0,
+        bit_rate=1,
+        bits_per_sample=1,
+        sample_rate=1,
+        channels=2,
+        duration=1,
+    )
+    playlist = db.Playlist(
+        id=1, name="playlist", user_id=1, total_tracks=1, create_date=""
+    )
+    session.add_all(
+        [
+            user,
+            artist,
+            genre,
+            album,
+            track,
+            playlist,
+            db.ArtistTrack(artist_id=1, track_id=1),
+            db.ArtistAlbum(artist_id=1, album_id=1),
+            db.GenreTrack(genre_id=1, track_id=1),
+            db.PlaylistTrack(playlist_id=1, track_id=1, added_at=""),
+            db.FavouriteTrack(user_id=1, track_id=1, added_at=""),
+            db.FavouriteAlbum(user_id=1, album_id=1, added_at=""),
+            db.FavouriteArtist(user_id=1, artist_id=1, added_at=""),
+            db.FavouritePlaylist(user_id=1, playlist_id=1, added_at=""),
+        ]
+    )
+    session.commit()
+
+
+QUERIES: dict[str, Callable[[Session], Any]] = {
+    "get_all_artists": lambda s: db_helpers.ArtistDBHelper(s).get_all_artists(),
+    "get_artists": lambda s: db_helpers.ArtistDBHelper(s).get_artists(10, 0),
+    "get_artist_by_id": lambda s: db_helpers.ArtistDBHelper(s).get_artist_by_id(1),
+    "get_artist_index": lambda s: db_helpers.ArtistDBHelper(s).get_artist_index(),
+    "get_all_albums": lambda s: db_helpers.AlbumDBHelper(s).get_all_albums(),
+    "get_albums": lambda s: db_helpers.AlbumDBHelper(s).get_albums(10, 0),
+    "get_album_by_id": lambda s: db_helpers.AlbumDBHelper(s).get_album_by_id(1),
+    "get_albums_by_name": lambda s: db_helpers.AlbumDBHelper(s).get_albums_by_name(
+        10, 0
+    ),
+    "get_albums_by_artist": lambda s: db_helpers.AlbumDBHelper(s).get_albums_by_artist(
+        10, 0
+    ),
+    "get_albums_by_artist after": lambda s: db_helpers.AlbumDBHelper(
+        s
+    ).get_albums_by_artist(10, 0, ["artist", "album", 1]),
+    "get_first_track": lambda s: db_helpers.AlbumDBHelper(s).get_first_track(1),
+    "get_album_album_artist": lambda s: db_helpers.AlbumDBHelper(s).get_album_artist(1),
+    "get_sorted_artist_albums": lambda s: db_helpers.AlbumDBHelper(
+        s
+    ).get_sorted_artist_albums(1, 10, 0),
+    "get_sorted_by_year_albums": lambda s: db_helpers.AlbumDBHelper(
+        s
+    ).get_sorted_by_year_albums("2000", "2030", 10, 0),
+    "get_albums_by_name after": lambda s: db_helpers.AlbumDBHelper(
+        s
+    ).get_albums_by_name(10, 0, ["album", 1]),
+    "get_sorted_by_year_albums after": lambda s: db_helpers.AlbumDBHelper(
+        s
+    ).get_sorted_by_year_albums("2000", "2030", 10, 0, True, ["2020", "album", 1]),
+    "get_sorted_albums_by_frequency after": lambda s: db_helpers.AlbumDBHelper(
+        s
+    ).get_sorted_albums_by_frequency(10, 0, [0, "album", 1]),
+    "get_albums_by_genre": lambda s: db_helpers.AlbumDBHelper(s).get_albums_by_genre(
+        "rock", 10, 0
+    ),
+    "get_sorted_albums_by_frequency": lambda s: db_helpers.AlbumDBHelper(
+        s
+    ).get_sorted_albums_by_frequency(10, 0),
+    "get_all_tracks": lambda s: db_helpers.TrackDBHelper(s).get_all_tracks(),
+    "get_tracks": lambda s: db_helpers.TrackDBHelper(s).get_tracks(10, 0, "tr"),
+    "get_track_by_id": lambda s: db_helpers.TrackDBHelper(s).get_track_by_id(1),
+    "get_track_album_artist": lambda s: db_helpers.TrackDBHelper(s).get_album_artist(1),
+    "get_tracks_by_genre_name": lambda s: db_helpers.TrackDBHelper(
+        s
+    ).get_tracks_by_genre_name("rock", 10),
+    "get_random_tracks": lambda s: db_helpers.TrackDBHelper(s).get_random_tracks(
+        1, "rock", "2000", "2030"
+    ),
+    "get_random_albums": lambda s: db_helpers.AlbumDBHelper(s).get_random_albums(1),
+    "get_all_genres": lambda s: db_helpers.GenresDBHelper(s).get_all_genres(),
+    "get_genre_stats": lambda s: db_helpers.GenresDBHelper(s).get_genre_stats(),
+    "get_starred_tracks": lambda s: db_helpers.FavouriteDBHelper(s).get_starred_tracks(
+        1
+    ),
+    "get_starred_artists": lambda s: db_helpers.FavouriteDBHelper(
+        s
+    ).get_starred_artists(1),
+    "get_starred_albums": lambda s: db_helpers.FavouriteDBHelper(s).get_starred_albums(
+        1
+    ),
+    "get_starred_playlists": lambda s: db_helpers.FavouriteDBHelper(
+        s
+    ).get_starred_playlists(1),
+    "get_playlist": lambda s: db_helpers.PlaylistDBHelper(s).get_playlist(1),
+    "get_all_playlists": lambda s: db_helpers.PlaylistDBHelper(s).get_all_playlists(
+        db.User(id=1, login="admin", password="", avatar="")
+    ),
+    "get_user_by_username": lambda s: db_helpers.UserDBHelper(s).get_user_by_username(
+        "admin"
+    ),
+    "get_cover_by_hash": lambda s: db_helpers.CoverDBHelper(s).get_cover_by_hash(
+        "hash"
+    ),
+}
+
+
+@pytest.mark.parametrize("name", QUERIES.keys())
+def test_query_plan_has_no_track_scan(name: str):
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        fill_database(session)
+
+    statements: list[tuple[str, Any]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    with Session(engine) as session:
+        QUERIES[name](session)
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert len(statements) > 0
+
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            plan = [
+                row[3]
+                for row in connection.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+            ]
+            track_scans = [step for step in plan if step.startswith("SCAN Tracks")]
+            if name not in FULL_SCAN_ALLOWED:
+                # Допустим только проход по индексу, а не по всей таблице
+                assert all("INDEX" in step for step in track_scans), (statement, plan)
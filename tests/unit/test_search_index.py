@@ -0,0 +1,111 @@
+import os
+import pytest
+from unittest.mock import patch
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from src.app import database as db
+from src.app import db_helpers
+from src.app import db_loading
+from src.app import search_index
+from src.app import service_layer
+from tests.load.scan_benchmark import make_audio_info
+
+
+def make_track(i: int, title: str, album: str, artists: list[str], genres: list[str]):
+    audio_info = make_audio_info(i)
+    audio_info.title = title
+    audio_info.album = album
+    audio_info.album_artist = None
+    audio_info.artists = artists
+    audio_info.genres = genres
+    return audio_info
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        search_index.create_search_index(connection)
+
+    with Session(engine) as session:
+        loader = db_loading.BulkLoader(session)
+        loader.load(
+            make_track(0, "Arlekino", "Atomic Heart", ["Geoffrey Day"], ["Electronic"])
+        )
+        loader.load(make_track(1, "Heartbeat", "Pulse", ["Мумий Тролль"], ["Rock"]))
+        loader.load(
+            make_track(2, "Владивосток 2000", "Морская", ["Мумий Тролль"], ["Rock"])
+        )
+        loader.commit()
+        yield session
+
+
+def search_tracks(session: Session, query: str) -> list[str]:
+    match_query = search_index.make_match_query(query)
+    assert match_query is not None
+    tracks = db_helpers.TrackDBHelper(session).search_tracks(match_query, 10, 0)
+    return [track.title for track in tracks]
+
+
+def test_make_match_query():
+    assert search_index.make_match_query('ark "hea') == '"ark"* "hea"*'
+    assert search_index.make_match_query(" ?! ") is None
+
+
+def test_search_tracks(session: Session):
+    # Совпадение в названии выше совпадения в названии альбома
+    assert search_tracks(session, "heart") == ["Heartbeat", "Arlekino"]
+    assert search_tracks(session, "мум") == ["Heartbeat", "Владивосток 2000"]
+    assert search_tracks(session, "ВЛАДИВ") == ["Владивосток 2000"]
+    assert search_tracks(session, "rock морск") == ["Владивосток 2000"]
+    assert search_tracks(session, "electronic") == ["Arlekino"]
+
+
+def test_search_artists_and_albums(session: Session):
+    artists = db_helpers.ArtistDBHelper(session).search_artists('"мум"*', 10, 0)
+    albums = db_helpers.AlbumDBHelper(session).search_albums('"atom"*', 10, 0)
+    assert [artist.name for artist in artists] == ["Мумий Тролль"]
+    assert [album.name for album in albums] == ["Atomic Heart"]
+
+
+def test_search_index_follows_updates(session: Session):
+    db_loading.load_audio_data(
+        make_track(0, "Nora", "Atomic Heart", ["Geoffrey Day"], ["Jazz"]), session
+    )
+    assert search_tracks(session, "arlek") == []
+    assert search_tracks(session, "nora jazz") == ["Nora"]
+
+    track_ids = session.exec(select(db.Track.id)).all()
+    db_loading.delete_tracks(list(track_ids), session)
+    assert search_tracks(session, "rock") == []
+    albums = db_helpers.AlbumDBHelper(session).search_albums('"atom"*', 10, 0)
+    assert albums == []
+
+
+def test_init_db_builds_search_index(tmp_path):
+    engine = create_engine(f"sqlite:///{os.path.join(tmp_path, 'database.db')}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        loader = db_loading.BulkLoader(session)
+        loader.load(make_track(0, "Arlekino", "Atomic Heart", ["Geoffrey Day"], []))
+        loader.commit()
+        session.add(db.SchemaVersion(version=len(db.MIGRATIONS)))
+        session.commit()
+
+    with patch.object(db, "engine", engine):
+        db.init_db()
+
+    with Session(engine) as session:
+        assert search_tracks(session, "geoff") == ["Arlekino"]
+
+
+def test_search_without_full_text_index(session: Session):
+    # Так ищет PostgreSQL: по вхождению подстроки без учёта регистра
+    with patch.object(search_index, "is_available", return_value=False):
+        artists, albums, tracks = service_layer.SearchService(session).search2(
+            "HEART", 10, 0, 10, 0, 10, 0
+        )
+    assert [artist.name for artist in artists] == []
+    assert [album.name for album in albums] == ["Atomic Heart"]
+    assert [track.title for track in tracks] == ["Heartbeat"]
@@ -0,0 +1,104 @@
+import time
+from pathlib import Path
+from typing import Callable
+from unittest.mock import patch
+
+from sqlmodel import Session, select
+from watchdog.events import DirModifiedEvent, FileCreatedEvent
+
+from src.app import database as db
+from src.app import db_loading
+from src.app.watcher import LibraryWatcher
+
+from tests.unit.fixtures import engine, get_track_titles, make_flac, make_library
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return condition()
+
+
+def get_file_paths(engine) -> list[str]:
+    with Session(engine) as session:
+        return sorted(session.exec(select(db.Track.file_path)).all())
+
+
+def test_load_changed_paths(engine, tmp_path: Path):
+    titles = make_library(tmp_path)
+    db_loading.scan_and_load(str(tmp_path), workers=1)
+    assert get_track_titles(engine) == titles
+
+    make_flac(tmp_path / "c" / "1.flac", TITLE="c1", ARTIST="artist", ALBUM="c")
+    make_flac(tmp_path / "a.flac", TITLE="a2", ARTIST="artist", ALBUM="a")
+    (tmp_path / "b" / "1.flac").unlink()
+    (tmp_path / "b" / "2.flac").unlink()
+    (tmp_path / "b").rmdir()
+    db_loading.load_changed_paths(
+        [str(tmp_path / "c"), str(tmp_path / "a.flac"), str(tmp_path / "b")]
+    )
+
+    assert get_track_titles(engine) == ["a2", "c1"]
+    with Session(engine) as session:
+        albums = session.exec(select(db.Album.name)).all()
+    assert sorted(albums) == ["a", "c"]
+
+
+def test_load_changed_paths_keeps_similar_prefix(engine, tmp_path: Path):
+    make_flac(tmp_path / "b" / "1.flac", TITLE="b1", ALBUM="b")
+    make_flac(tmp_path / "b2" / "1.flac", TITLE="b21", ALBUM="b2")
+    db_loading.scan_and_load(str(tmp_path), workers=1)
+
+    (tmp_path / "b" / "1.flac").unlink()
+    (tmp_path / "b").rmdir()
+    db_loading.load_changed_paths([str(tmp_path / "b")])
+
+    assert get_track_titles(engine) == ["b21"]
+
+
+def test_load_changed_paths_skips_unchanged_files(engine, tmp_path: Path):
+    make_library(tmp_path)
+    db_loading.scan_and_load(str(tmp_path), workers=1, incremental=True)
+
+    make_flac(tmp_path / "b" / "3.flac", TITLE="b3", ARTIST="artist", ALBUM="b")
+    with patch.object(
+        db_loading, "parse_audio_files", wraps=db_loading.parse_audio_files
+    ) as parse_audio_files:
+        db_loading.load_changed_paths([str(tmp_path / "b")])
+        db_loading.load_changed_paths([str(tmp_path)])
+
+    assert [list(call.args[0]) for call in parse_audio_files.call_args_list] == [
+        [str(tmp_path / "b" / "3.flac")],
+        [],
+    ]
+    assert get_track_titles(engine) == ["a", "b1", "b2", "b3"]
+
+
+def test_watcher_ignores_directory_modifications(tmp_path: Path):
+    watcher = LibraryWatcher(str(tmp_path))
+    watcher.on_any_event(DirModifiedEvent(str(tmp_path / "b")))
+    watcher.on_any_event(FileCreatedEvent(str(tmp_path / "b" / "3.flac")))
+    assert watcher.pending == {str(tmp_path / "b" / "3.flac")}
+
+
+def test_watcher(engine, tmp_path: Path):
+    db_loading.scan_and_load(str(tmp_path), workers=1)
+    watcher = LibraryWatcher(str(tmp_path), debounce=0.2, polling=True)
+    watcher.start()
+    try:
+        make_flac(tmp_path / "a" / "1.flac", TITLE="a1", ALBUM="a")
+        assert wait_for(lambda: get_track_titles(engine) == ["a1"])
+
+        (tmp_path / "a" / "1.flac").rename(tmp_path / "a" / "2.flac")
+        assert wait_for(
+            lambda: get_file_paths(engine) == [str(tmp_path / "a" / "2.flac")]
+        )
+        assert get_track_titles(engine) == ["a1"]
+
+        (tmp_path / "a" / "2.flac").unlink()
+        assert wait_for(lambda: get_track_titles(engine) == [])
+    finally:
+        watcher.stop()